@@ -0,0 +1,204 @@
+"""Aggregate AirPi sensor readings over an averaging period.
+
+When 'averageFreq' is set in settings.cfg, readings are aggregated over
+each averaging period before being output. Rather than keeping every
+individual reading until the end of the period, running statistics
+(count, sum, min, max, mean and variance, the last two using Welford's
+method) are updated as each reading arrives, so the memory used does not
+depend on how many readings are taken in each period.
+
+"""
+
+from collections import OrderedDict
+from math import isnan, sqrt
+
+# Statistics which outputs can ask for (using the 'statistic' option in
+# outputs.cfg).
+STATISTICS = ["mean", "sum", "min", "max", "count", "variance", "stdev"]
+
+class RunningStats(object):
+    """Running statistics for a single sensor property.
+
+    Hold the properties (name, units, etc.) of the first reading in the
+    current period, and keep running statistics of the values of all
+    readings added since. Readings which have no value ('None', '-' or
+    NaN) are counted in 'readings' but otherwise ignored.
+
+    """
+
+    def __init__(self):
+        """Initialise.
+
+        Args:
+            self: self.
+
+        """
+        self.reset()
+
+    def reset(self):
+        """Clear the statistics, ready for a new period.
+
+        Args:
+            self: self.
+
+        """
+        self.properties = {}
+        self.readings = 0
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.mean = 0.0
+        self.sumsquares = 0.0
+
+    def add(self, datadict):
+        """Add a reading to the statistics.
+
+        Args:
+            self: self.
+            datadict: The reading (a dict, or SampleFrame.view()).
+
+        """
+        if not self.readings:
+            self.properties = datadict.copy()
+            self.properties.pop("value", None)
+        self.readings += 1
+        value = datadict["value"]
+        if value == "-" or value is None or isnan(value):
+            return
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.sumsquares += delta * (value - self.mean)
+
+    def statistics(self):
+        """Get all of the statistics.
+
+        Args:
+            self: self.
+
+        Returns:
+            dict The value of each statistic in STATISTICS. If no values
+                 have been added, everything except 'count' and 'sum' is
+                 None.
+
+        """
+        stats = {"count": self.count, "sum": self.total,
+                    "min": self.minimum, "max": self.maximum,
+                    "mean": None, "variance": None, "stdev": None}
+        if self.count:
+            stats["mean"] = self.mean
+            stats["variance"] = self.sumsquares / self.count
+            stats["stdev"] = sqrt(stats["variance"])
+        return stats
+
+class Aggregator(object):
+    """Aggregate readings from all sensors over an averaging period.
+
+    Keep one RunningStats for each sensor property, in the order in
+    which they were first ever read (so that the order doesn't change
+    from one period to the next). At the end of each period, results()
+    gives one datapoint for each; its 'value' depends on the type of
+    reading:
+    - 'sample' readings are averaged (the mean is used).
+    - 'pulseCount' readings (e.g. rain gauge bucket tips) are summed.
+    Every datapoint also has a 'statistics' dict containing all of the
+    STATISTICS, so outputs can use a different one if they prefer.
+
+    """
+
+    def __init__(self):
+        """Initialise.
+
+        Args:
+            self: self.
+
+        """
+        self.stats = OrderedDict()
+
+    def __contains__(self, identifier):
+        """Check whether a sensor property has been read this period."""
+        return identifier in self.stats and self.stats[identifier].readings > 0
+
+    @staticmethod
+    def identifier(datadict):
+        """Get the identifier used for a reading.
+
+        Args:
+            datadict: The reading (a dict, or SampleFrame.view()).
+
+        Returns:
+            string The unique identifier for the sensor and property.
+
+        """
+        return datadict['sensor'] + "-" + datadict['name']
+
+    def add(self, datadict):
+        """Add a reading.
+
+        Args:
+            self: self.
+            datadict: The reading (a dict, or SampleFrame.view()).
+
+        """
+        identifier = Aggregator.identifier(datadict)
+        if identifier not in self.stats:
+            self.stats[identifier] = RunningStats()
+        self.stats[identifier].add(datadict)
+
+    def results(self):
+        """Get the aggregated data for the period, and start a new one.
+
+        Args:
+            self: self.
+
+        Returns:
+            list The aggregated data, in the format expected by the
+                 output_data() methods of the output plugins.
+
+        """
+        formatted = []
+        for identifier, stats in self.stats.iteritems():
+            if not stats.readings:
+                continue
+            datapoint = stats.properties.copy()
+            datapoint['statistics'] = stats.statistics()
+            if datapoint.get('readingtype') == "pulseCount":
+                datapoint['value'] = datapoint['statistics']['sum']
+            else:
+                datapoint['value'] = datapoint['statistics']['mean']
+                datapoint['readingtype'] = "average"
+            datapoint['identifier'] = identifier
+            formatted.append(datapoint)
+            stats.reset()
+        return formatted
+
+def select_statistic(datapoints, statistic):
+    """Use a particular statistic as the value of aggregated data.
+
+    Make a copy of aggregated data in which the 'value' of each
+    datapoint is the requested statistic rather than the default (mean
+    or sum). Datapoints without statistics (e.g. GPS) are left as-is.
+
+    Args:
+        datapoints: The aggregated data (as returned by
+                    Aggregator.results()).
+        statistic: The statistic to use (one of STATISTICS).
+
+    Returns:
+        list The data to be output.
+
+    """
+    selected = []
+    for datapoint in datapoints:
+        if 'statistics' in datapoint:
+            datapoint = datapoint.copy()
+            datapoint['value'] = datapoint['statistics'][statistic]
+            datapoint['readingtype'] = statistic
+        selected.append(datapoint)
+    return selected
@@ -14,27 +14,60 @@ See: http://airpi.es
 """
 
 import sys
+import time
+# How long startup takes is logged (see report_startup())
+IMPORTSTARTED = time.time()
+import argparse
 sys.dont_write_bytecode = True
 
 # We don't import individual sensors classes etc.
 # here because they are imported dynamically below.
-import socket
-import RPi.GPIO as GPIO
+# Simulated hardware (if requested) must be installed before the real
+# hardware modules are imported.
+import simulation
+simulation.install_if_requested()
+try:
+    import RPi.GPIO as GPIO
+except (ImportError, RuntimeError):
+    # Replaying a log doesn't need any hardware (except the LEDs, if
+    # there are any), so it can be done on any computer.
+    if not [arg for arg in sys.argv[1:] if arg.startswith("--replay")]:
+        raise
+    simulation.install()
+    import RPi.GPIO as GPIO
 import ConfigParser
 import datetime
-import time
-import inspect
 import os
 import signal
-import urllib2
 import logging
+import functools
 import subprocess
+import threading
+import multiprocessing
+import atexit
+import Queue
 from logging import handlers
 from math import isnan
 from sensors import sensor
 from outputs import output
 from supports import support
 from notifications import notification
+import sensorpool
+import scheduler
+import outputqueue
+import outputbatch
+import aggregator
+import sampleframe
+import metrics
+import profiler
+import replay
+import network
+import initpool
+import asynclog
+import ringbuffer
+import history
+import control
+import tracer
 
 class MissingField(Exception):
     """Exception to raise when an imported plugin is missing a required
@@ -65,28 +98,34 @@ def format_msg(msg, msgtype):
     else:
         return(msgtype.title() + ":").ljust(8, ' ') + " " + msg
 
-def logthis(kind, msg):
+def logthis(kind, msg, *args):
     """ Add spaces to align debug output.
 
     Add spaces to LOGGER messages, so that debug output is nicely
-    aligned and therefore more readable.
+    aligned and therefore more readable. Any 'args' are merged into
+    'msg' %-style, but only if the message is actually going to be
+    logged, so expensive values can be passed without converting them
+    to strings first.
 
     Args:
         kind: The kind of message to be processed.
         msg: The message to be processed.
+        args: Values to be merged into the message.
 
     """
-    if kind == "debug" or kind == "error":
-        LOGGER.debug(" " + msg)
+    if kind == "debug":
+        LOGGER.debug(" " + msg, *args)
+    elif kind == "error":
+        LOGGER.error(" " + msg, *args)
     else:
-        LOGGER.info("  " + msg)
+        LOGGER.info("  " + msg, *args)
 
 def get_subclasses(mod, cls):
     """Load subclasses for a module.
 
-    Load the named subclasses for a specified module. Keys are named
-    'dummy' because they are not used, and calling them this means that
-    Pylint doesn't throw a message about them not being used.
+    Find the subclass of 'cls' in a plugin module. Classes which have
+    been found are kept in PLUGINCLASSES, so that modules which are used
+    by several plugins (e.g. analogue sensors) are only searched once.
 
     Args:
         mod: Module from which subclass should be loaded.
@@ -96,14 +135,46 @@ def get_subclasses(mod, cls):
         The subclass.
 
     """
-    for dummy, obj in inspect.getmembers(mod):
-        if hasattr(obj, "__bases__") and cls in obj.__bases__:
-            return obj
+    key = (mod.__name__, cls)
+    if key not in PLUGINCLASSES:
+        PLUGINCLASSES[key] = None
+        members = vars(mod)
+        for name in sorted(members):
+            obj = members[name]
+            # Check it's a class first: anything else (e.g. a LazyModule)
+            # shouldn't be touched, in case that imports it
+            if isinstance(obj, type) and cls in obj.__bases__:
+                PLUGINCLASSES[key] = obj
+                break
+    return PLUGINCLASSES[key]
+
+def import_plugin(name):
+    """Import a plugin module.
+
+    Import a plugin module (if it hasn't already been imported), and
+    record how long that took in PLUGINIMPORTS.
+
+    Args:
+        name: The full name of the module, e.g. 'sensors.bmp085'.
+
+    Returns:
+        The module.
+
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    started = time.time()
+    # 'a' means nothing below, but argument must be non-null
+    mod = __import__(name, fromlist=['a'])
+    PLUGINIMPORTS[name] = time.time() - started
+    return mod
 
 def check_conn():
     """Check internet connectivity.
 
     Check for internet connectivity by trying to connect to a website.
+    This is only done once per run, and the result is shared with the
+    plugins (see network.py).
 
     Returns:
         boolean True if successfully connects to the site within five
@@ -112,12 +183,7 @@ def check_conn():
                 seconds.
 
     """
-    try:
-        urllib2.urlopen("http://www.google.com", timeout=5)
-        return True
-    except urllib2.URLError:
-        pass
-    return False
+    return network.check_conn()
 
 def led_setup(redpin, greenpin):
     """Set up AirPi LEDs.
@@ -144,7 +210,9 @@ def led_on(pin):
         pin: Pin number of the LED to turn on.
 
     """
+    start = scheduler.monotonic()
     GPIO.output(pin, GPIO.HIGH)
+    metrics.REGISTRY.observe("leds", scheduler.monotonic() - start)
 
 def led_off(pin):
     """Turn LED off.
@@ -157,6 +225,35 @@ def led_off(pin):
     """
     GPIO.output(pin, GPIO.LOW)
 
+def leds_off_later(delay):
+    """Turn LEDs off after a delay.
+
+    Turn the green LED (and the red LED, unless it is meant to stay lit
+    constantly) off after a given delay. This happens on a timer thread,
+    so that the sampling loop doesn't have to sleep while the LEDs are
+    lit. Any timer already waiting to turn the LEDs off is replaced.
+
+    Args:
+        delay: How long to wait before turning the LEDs off (seconds).
+
+    """
+    global ledtimer
+
+    def leds_off():
+        if SETTINGS['GREENPIN']:
+            led_off(SETTINGS['GREENPIN'])
+        if (SETTINGS['REDPIN'] and
+                SETTINGS['FAILLED'] != "constant"):
+            led_off(SETTINGS['REDPIN'])
+
+    start = scheduler.monotonic()
+    if ledtimer is not None:
+        ledtimer.cancel()
+    ledtimer = threading.Timer(delay, leds_off)
+    ledtimer.daemon = True
+    ledtimer.start()
+    metrics.REGISTRY.observe("leds", scheduler.monotonic() - start)
+
 def get_serial():
     """Get Raspberry Pi serial no.
 
@@ -182,16 +279,31 @@ def get_serial():
 def get_hostname():
     """Get current hostname.
 
-    Get the current hostname of the Raspberry Pi.
+    Get the current hostname of the Raspberry Pi (looked up once per
+    run; see network.py).
 
     Returns:
         string The hostname.
 
     """
-    if socket.gethostname().find('.') >= 0:
-        return socket.gethostname()
-    else:
-        return socket.gethostbyaddr(socket.gethostname())[0]
+    return network.gethostname()
+
+def log_git_commit():
+    """Log the Git commit ref of this copy of the software.
+
+    Run on a background thread at startup, so that sampling isn't held
+    up while Git runs.
+
+    """
+    try:
+        process = subprocess.Popen(["git", "log", "-1", "--format=commit %H"],
+                    cwd=os.path.dirname(os.path.abspath(__file__)),
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        commit, dummy = process.communicate()
+    except OSError:
+        # Git isn't installed
+        commit = "not available"
+    logthis('debug', "Git " + commit)
 
 def set_cfg_paths():
     """Set paths to cfg files.
@@ -218,19 +330,144 @@ def set_cfg_paths():
     cfgpaths['log'] = os.path.join(logdir, 'airpi.log')
     return cfgpaths
 
-def set_up_logger():
+def get_args():
+    """Get command line arguments.
+
+    Get the arguments given on the command line. These are all optional;
+    the settings in cfg/settings.cfg are used for anything which isn't
+    given.
+
+    Returns:
+        argparse.Namespace The arguments.
+
+    """
+    parser = argparse.ArgumentParser(description="Run AirPi sampling.")
+    parser.add_argument("--profile", type=int, metavar="TICKS",
+        help="profile setup and the first TICKS samples, writing the"
+            " results to the log directory (overrides 'profile' and"
+            " 'profileticks' in settings.cfg)")
+    parser.add_argument("--trace", type=int, metavar="TICKS",
+        help="trace where the time goes in the slowest TICKS samples,"
+            " writing the trace to the log directory (overrides 'trace' and"
+            " 'traceticks' in settings.cfg)")
+    parser.add_argument("--replay", metavar="FILE",
+        help="instead of sampling, replay a log written by the CSVOutput or"
+            " JSONOutput plugin through calibration, limits and the enabled"
+            " output plugins")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+        metavar="SPEED",
+        help="how fast to replay: 1 (the default) replays samples at the"
+            " times they were recorded, 10 replays ten times faster and 0"
+            " replays as fast as possible")
+    parser.add_argument("--control", nargs="+", metavar="COMMAND",
+        help="send a command (e.g. 'stats', 'reload calibration',"
+            " 'disable Xively' or 'help') to the AirPi which is already"
+            " sampling, print its reply and exit")
+    return parser.parse_args()
+
+def control_socket_path():
+    """Get the file name of the control socket.
+
+    This is read here, rather than in set_settings(), because it is also
+    needed by 'airpi.py --control', which doesn't load the settings.
+
+    Returns:
+        string The file name, or None if the control socket is switched
+               off.
+
+    """
+    path = os.path.join(os.path.dirname(CFGPATHS['log']), "airpi.sock")
+    mainconfig = ConfigParser.SafeConfigParser()
+    mainconfig.read(CFGPATHS['settings'])
+    if mainconfig.has_option("Misc", "controlsocket"):
+        path = mainconfig.get("Misc", "controlsocket").strip()
+        if path.lower() in ["", "no", "off", "false"]:
+            return None
+    return path
+
+def send_control(command):
+    """Send a command to the AirPi which is already sampling.
+
+    Args:
+        command: string The command.
+
+    Returns:
+        int The exit status: 0 if the command worked, 1 if not.
+
+    """
+    path = control_socket_path()
+    if path is None:
+        print("[AirPi] The control socket is switched off in settings.cfg.")
+        return 1
+    try:
+        reply = control.send(path, command)
+    except EnvironmentError as excep:
+        print("[AirPi] Could not contact AirPi at " + path + " (" + str(excep)
+            + "). Is it sampling?")
+        return 1
+    print(reply.rstrip("\n"))
+    if reply.startswith("ERROR:"):
+        return 1
+    return 0
+
+def set_up_logger(suffix=None):
     """Set up a logger.
 
-    Set up a logger to be used for this main script.
+    Set up a logger to be used for this main script. Messages are
+    written to the log file by a background thread (see asynclog.py), so
+    that logging never holds up sampling. Debug messages are only logged
+    (and echoed to the screen) if 'debug' is switched on in
+    settings.cfg. The size and number of log files are set using
+    'logmaxbytes' and 'logbackups'; these are read here, rather than in
+    set_settings(), because the logger is needed before then.
+
+    Args:
+        suffix: Added to the name of the log file, for processes other
+                than the main one (see run_output_process()), or None to
+                use the main log file.
+
+    Returns:
+        The logger.
 
     """
-    thislogger = logging.getLogger(__name__)
-    thislogger.setLevel(logging.DEBUG)
-    handler = logging.handlers.RotatingFileHandler(CFGPATHS['log'],
-                maxBytes=40960, backupCount=5)
-    thislogger.addHandler(handler)
+    global LOGLISTENER
+    debug = False
+    maxbytes = 1048576
+    backups = 5
+    mainconfig = ConfigParser.SafeConfigParser()
+    mainconfig.read(CFGPATHS['settings'])
+    if mainconfig.has_option("Debug", "debug"):
+        debug = mainconfig.getboolean("Debug", "debug")
+    if mainconfig.has_option("Debug", "logmaxbytes"):
+        maxbytes = mainconfig.getint("Debug", "logmaxbytes")
+    if mainconfig.has_option("Debug", "logbackups"):
+        backups = mainconfig.getint("Debug", "logbackups")
+
+    logfile = CFGPATHS['log']
+    if suffix is not None:
+        base, ext = os.path.splitext(logfile)
+        logfile = base + "-" + suffix + ext
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handler = logging.handlers.RotatingFileHandler(logfile,
+                maxBytes=maxbytes, backupCount=backups)
     handler.setFormatter(formatter)
+    handlers = [handler]
+    if debug:
+        echo = logging.StreamHandler()
+        echo.setFormatter(logging.Formatter('%(levelname)s:%(name)s:%(message)s'))
+        handlers.append(echo)
+
+    thislogger = logging.getLogger(__name__)
+    thislogger.setLevel(logging.DEBUG if debug else logging.INFO)
+    for oldhandler in list(thislogger.handlers):
+        thislogger.removeHandler(oldhandler)
+    queue = Queue.Queue(10000)
+    queuehandler = asynclog.QueueHandler(queue)
+    thislogger.addHandler(queuehandler)
+    LOGLISTENER = asynclog.QueueListener(queue, handlers, queuehandler)
+    LOGLISTENER.start()
+    # Make sure everything is written before the script exits
+    atexit.register(LOGLISTENER.stop)
     return thislogger
 
 def check_cfg_file(filetocheck):
@@ -317,9 +554,7 @@ def set_up_supports():
             #if enabled, load the plugin
             if enabled:
                 try:
-                    # 'a' means nothing below, but argument must be non-null
-                    
-                    mod = __import__('supports.' + filename, fromlist=['a'])
+                    mod = import_plugin('supports.' + filename)
                     msg = "Successfully imported support module: " + filename
                     msg = format_msg(msg, 'success')
                     logthis("info", msg)
@@ -349,7 +584,7 @@ def set_up_supports():
                 try:
                     logthis("info", "Starting to set instclass for " + filename)
                     instclass = supportclass(SUPPORTCONFIG)
-                    logthis("info", "Support plugin params are: " + str(instclass.params))
+                    logthis("info", "Support plugin params are: %s", instclass.params)
                     msg = "Successfully set instclass for " + filename
                     msg = format_msg(msg, 'success')
                     logthis("info", msg)
@@ -402,6 +637,8 @@ def set_up_sensors():
     SENSORNAMES = SENSORCONFIG.sections()
 
     sensorplugins = []
+    jobs = []
+    filenames = {}
 
     GPIO.setwarnings(False)
     GPIO.setmode(GPIO.BCM) #Use BCM GPIO numbers.
@@ -430,9 +667,8 @@ def set_up_sensors():
                     raise
 
                 try:
-                    # 'a' means nothing below, but argument must be non-null
                     logthis("info", "Trying to import sensors." + filename)
-                    mod = __import__('sensors.' + filename, fromlist=['a'])
+                    mod = import_plugin('sensors.' + filename)
                     logthis("info", "Successfully imported sensors." + filename)
                 except Exception as excep:
                     msg = "Could not import sensor module " + filename
@@ -474,31 +710,54 @@ def set_up_sensors():
                 plugindata = define_plugin_params(SENSORCONFIG,
                                 i, reqd, opt, common)
 
-                try:
-                    instclass = sensorclass(plugindata)
-                except Exception:
-                    if "serial_gps" not in filename:
-                        msg = "Unable to set instclass for sensor using plugindata."
-                    else:
-                        msg = " GPS instance not created - socket not set up?"
-                    msg = format_msg(msg, 'error')
-                    LOGGER.error(msg)
-                    raise
+                # Sensors on the same bus are set up one after another
+                jobs.append(initpool.InitJob(i,
+                                functools.partial(sensorclass, plugindata),
+                                getattr(sensorclass, "bus", None),
+                                init_timeout(SENSORCONFIG, i)))
+                filenames[i] = filename
+        except Exception as excep:
+            # TODO: add specific exception for missing module
+            msg = "Did not import sensor plugin " + str(i) + ": " + str(excep)
+            msg = format_msg(msg, 'error')
+            print(msg)
+            continue
 
-                # Check for a getval() method
-                if callable(getattr(instclass, "getval", None)):
-                    sensorplugins.append(instclass)
-                    # Store sensorplugins array length for GPS plugin
-                    if "serial_gps" in filename:
-                        global gpsplugininstance
-                        gpsplugininstance = instclass
-                    msg = "Loaded sensor plugin " + str(i)
-                    msg = format_msg(msg, 'success')
-                    print(msg)
+    for job in init_plugins(jobs, "sensor"):
+        i = job.name
+        filename = filenames[i]
+        try:
+            if job.error is not None:
+                if "serial_gps" not in filename:
+                    msg = "Unable to set instclass for sensor using plugindata."
                 else:
-                    msg = "Loaded sensor support plugin " + str(i)
-                    msg = format_msg(msg, 'success')
-                    print(msg)
+                    msg = " GPS instance not created - socket not set up?"
+                msg = format_msg(msg, 'error')
+                LOGGER.error(msg)
+                raise job.error
+            instclass = job.result
+
+            # Check for a getval() method
+            if callable(getattr(instclass, "getval", None)):
+                if SENSORCONFIG.has_option(i, "interval"):
+                    instclass.interval = SENSORCONFIG.getfloat(i,
+                                            "interval")
+                    if instclass.interval <= 0:
+                        raise ValueError("interval must be more than zero")
+                    logthis("info", str(i) + " will be read every "
+                        + str(instclass.interval) + " seconds.")
+                sensorplugins.append(instclass)
+                # Store sensorplugins array length for GPS plugin
+                if "serial_gps" in filename:
+                    global gpsplugininstance
+                    gpsplugininstance = instclass
+                msg = "Loaded sensor plugin " + str(i)
+                msg = format_msg(msg, 'success')
+                print(msg)
+            else:
+                msg = "Loaded sensor support plugin " + str(i)
+                msg = format_msg(msg, 'success')
+                print(msg)
         except Exception as excep:
             # TODO: add specific exception for missing module
             msg = "Did not import sensor plugin " + str(i) + ": " + str(excep)
@@ -508,17 +767,21 @@ def set_up_sensors():
 
         LOGGER.info("*******************")
 
-
     if any_plugins_enabled(sensorplugins, 'sensor'):
         return sensorplugins
 
-def set_up_outputs():
+def set_up_outputs(names=None, required=True):
     """Set up AirPi output plugins.
 
     Set up AirPi output plugins by reading outputs.cfg to determine
     which should be enabled, then checking that all required fields are
     present in outputs.cfg.
 
+    Args:
+        names: List of the names of the plugins to set up (e.g. for one
+               output process), or None to set up all enabled plugins.
+        required: Whether to exit if none of the plugins can be set up.
+
     Returns:
         list A list containing the enabled 'output' objects.
 
@@ -536,8 +799,12 @@ def set_up_outputs():
     OUTPUTNAMES = OUTPUTCONFIG.sections()
     if "Notes" in OUTPUTNAMES:
         OUTPUTNAMES.remove("Notes")
+    if names is not None:
+        OUTPUTNAMES = [plugin for plugin in OUTPUTNAMES if plugin in names]
 
     outputplugins = []
+    jobs = []
+    filenames = {}
 
     for plugin in OUTPUTNAMES:
         try:
@@ -557,9 +824,7 @@ def set_up_outputs():
             #if enabled, load the plugin
             if enabled:
                 try:
-                    # 'a' means nothing below, but argument must be non-null
-                    
-                    mod = __import__('outputs.' + filename, fromlist=['a'])
+                    mod = import_plugin('outputs.' + filename)
                     msg = "Successfully imported output module: " + filename
                     msg = format_msg(msg, 'success')
                     logthis("info", msg)
@@ -586,25 +851,12 @@ def set_up_outputs():
                     print(msg)
                     raise
 
-                try:
-                    logthis("info", "Starting to set instclass for " + filename)
-                    instclass = outputclass(OUTPUTCONFIG)
-                    logthis("info", "Output plugin params are: " + str(instclass.params))
-                    msg = "Successfully set instclass for " + filename
-                    msg = format_msg(msg, 'success')
-                    logthis("info", msg)
-
-                    outputplugins.append(instclass)
-                    msg = "Loaded output plugin " + instclass.name
-                    msg = format_msg(msg, 'success')
-                    print(msg)
-                    LOGGER.info("*******************")
-
-                except Exception as excep:
-                    msg = "Failed to import plugin " + plugin + ": " + str(excep)
-                    msg = format_msg(msg, 'error')
-                    print(msg)
-                    logthis("info", msg)
+                logthis("info", "Starting to set instclass for " + filename)
+                # Outputs don't depend on each other, so each gets a group
+                jobs.append(initpool.InitJob(plugin,
+                                functools.partial(outputclass, OUTPUTCONFIG),
+                                plugin, init_timeout(OUTPUTCONFIG, plugin)))
+                filenames[plugin] = filename
 
         except Exception as excep: #add specific exception for missing module
             msg = "Did not import output plugin " + str(plugin) + ": " + str(excep)
@@ -612,11 +864,89 @@ def set_up_outputs():
             print(msg)
             raise excep
 
+    for job in init_plugins(jobs, "output"):
+        plugin = job.name
+        filename = filenames[plugin]
+        try:
+            if job.error is not None:
+                raise job.error
+            instclass = job.result
+            logthis("info", "Output plugin params are: %s", instclass.params)
+            if instclass.params.get("statistic"):
+                statistic = instclass.params["statistic"].lower()
+                if statistic not in aggregator.STATISTICS:
+                    msg = "Unknown statistic '" + statistic
+                    msg += "'. Use one of: "
+                    msg += ", ".join(aggregator.STATISTICS)
+                    raise ValueError(msg)
+                instclass.params["statistic"] = statistic
+            instclass.params["priority"] = output_priority(instclass)
+            msg = "Successfully set instclass for " + filename
+            msg = format_msg(msg, 'success')
+            logthis("info", msg)
+
+            outputplugins.append(instclass)
+            msg = "Loaded output plugin " + instclass.name
+            msg = format_msg(msg, 'success')
+            print(msg)
+            LOGGER.info("*******************")
+
+        except Exception as excep:
+            msg = "Failed to import plugin " + plugin + ": " + str(excep)
+            msg = format_msg(msg, 'error')
+            print(msg)
+            logthis("info", msg)
+
+    outputplugins = by_priority(outputplugins)
+    if not required:
+        return outputplugins
     if any_plugins_enabled(outputplugins, 'output'):
         # TODO: Fix this to look at plugin.params["target"]
         #return fix_duplicate_outputs(outputplugins)
         return outputplugins
 
+def output_priority(plugin):
+    """Get the priority of an output plugin.
+
+    The priority is set by 'priority' in outputs.cfg; if it isn't set,
+    it depends on the plugin's 'target': plugins which write to a file
+    come first, then those which send data over the internet, then those
+    which only show it on screen.
+
+    Args:
+        plugin: The output plugin object.
+
+    Returns:
+        int The priority; plugins with higher priorities are served
+            first.
+
+    Raises:
+        ValueError: 'priority' is not a whole number.
+
+    """
+    priority = plugin.params.get("priority")
+    if priority:
+        try:
+            return int(priority)
+        except ValueError:
+            raise ValueError("'priority' must be a whole number.")
+    defaults = {"file": 3, "internet": 2, "screen": 1}
+    return defaults.get(plugin.params["target"], 2)
+
+def by_priority(plugins):
+    """Sort output plugins so that the most important are served first.
+
+    Plugins with the same priority are kept in the order they were in.
+
+    Args:
+        plugins: List of output plugin objects.
+
+    Returns:
+        list The plugins, highest priority first.
+
+    """
+    return sorted(plugins, key=lambda plugin: -plugin.params["priority"])
+
 def fix_duplicate_outputs(plugins):
     """Ensure only one output plugin for stdout is enabled.
 
@@ -681,10 +1011,10 @@ def define_plugin_params(config, name, reqd, opt, common):
         dict A dict containing the various parameters.
 
     """
-    LOGGER.debug(" Defining plugin params for " + name)
-    LOGGER.debug(" - reqd:   " + str(reqd))
-    LOGGER.debug(" - opt:    " + str(opt))
-    LOGGER.debug(" - common: " + str(common))
+    LOGGER.debug(" Defining plugin params for %s", name)
+    LOGGER.debug(" - reqd:   %s", reqd)
+    LOGGER.debug(" - opt:    %s", opt)
+    LOGGER.debug(" - common: %s", common)
     params = {}
     # Defaults:
     params["metadata"] = False
@@ -715,8 +1045,9 @@ def define_plugin_params(config, name, reqd, opt, common):
             if config.has_option("Common", commonfield):
                 params[commonfield] = config.get("Common", commonfield)
 
-    LOGGER.debug(" Final combined params to be used to create " + name + " instance are:")
-    LOGGER.debug(" " + str(params))
+    LOGGER.debug(" Final combined params to be used to create %s instance are:",
+        name)
+    LOGGER.debug(" %s", params)
     return params
 
 def set_up_notifications():
@@ -746,6 +1077,7 @@ def set_up_notifications():
     NOTIFICATIONNAMES.remove("Common")
 
     notificationPlugins = []
+    jobs = []
 
     for i in NOTIFICATIONNAMES:
         try:
@@ -766,9 +1098,7 @@ def set_up_notifications():
             #if enabled, load the plugin
             if enabled:
                 try:
-                    # 'a' means nothing below, but argument must be non-null
-                    mod = __import__('notifications.' + filename,
-                            fromlist=['a'])
+                    mod = import_plugin('notifications.' + filename)
                 except Exception:
                     msg = "Could not import notification module " + filename
                     msg = format_msg(msg, 'error')
@@ -805,29 +1135,11 @@ def set_up_notifications():
                 plugindata = define_plugin_params(NOTIFICATIONCONFIG, i,
                                 reqd, opt, common)
 
-                if NOTIFICATIONCONFIG.get(i, "target") == "internet" and not check_conn():
-                    msg = "Skipping notification plugin " + i
-                    msg += " because no internet connectivity."
-                    msg = format_msg(msg, 'error')
-                    print(msg)
-                    logthis("info", msg)
-                else:
-                    instclass = notificationclass(plugindata)
-                    instclass.async = plugindata['async']
-
-                # check for a sendnotification function
-                if callable(getattr(instclass, "sendnotification", None)):
-                    notificationPlugins.append(instclass)
-                    msg = "Loaded notification plugin " + str(i)
-                    msg = format_msg(msg, 'success')
-                    print(msg)
-                    logthis("info", msg)
-                else:
-                    msg = "No callable sendnotification() function"
-                    msg += " for notification plugin " + str(i)
-                    msg = format_msg(msg, 'error')
-                    print(msg)
-                    logthis("info", msg)
+                internet = NOTIFICATIONCONFIG.get(i, "target") == "internet"
+                jobs.append(initpool.InitJob(i,
+                                functools.partial(start_notification, i,
+                                    notificationclass, plugindata, internet),
+                                i, init_timeout(NOTIFICATIONCONFIG, i)))
 
         except Exception as excep:
             msg = "Did not import notification plugin " + str(i) + ": "
@@ -837,6 +1149,40 @@ def set_up_notifications():
             logthis("error", msg)
             raise excep
 
+    for job in init_plugins(jobs, "notification"):
+        i = job.name
+        if isinstance(job.error, initpool.InitTimeout):
+            msg = "Skipping notification plugin " + i + ": " + str(job.error)
+            msg = format_msg(msg, 'error')
+            print(msg)
+            logthis("info", msg)
+            continue
+        elif job.error is not None:
+            msg = "Did not import notification plugin " + str(i) + ": "
+            msg += str(job.error)
+            msg = format_msg(msg, 'error')
+            print(msg)
+            logthis("error", msg)
+            raise job.error
+        instclass = job.result
+        if instclass is None:
+            # Skipped because there's no internet connectivity
+            continue
+
+        # check for a sendnotification function
+        if callable(getattr(instclass, "sendnotification", None)):
+            notificationPlugins.append(instclass)
+            msg = "Loaded notification plugin " + str(i)
+            msg = format_msg(msg, 'success')
+            print(msg)
+            logthis("info", msg)
+        else:
+            msg = "No callable sendnotification() function"
+            msg += " for notification plugin " + str(i)
+            msg = format_msg(msg, 'error')
+            print(msg)
+            logthis("info", msg)
+
     # Don't run any_plugins_enabled() here, because it's OK to NOT have any
     # notifications enabled (unlike sensors and outputs).
     if not notificationPlugins:
@@ -845,6 +1191,74 @@ def set_up_notifications():
         print(msg)
     return notificationPlugins
 
+def start_notification(name, notificationclass, plugindata, internet):
+    """Create a notification plugin object.
+
+    Run by initpool (see set_up_notifications()), so it may be run at
+    the same time as other plugins are set up.
+
+    Args:
+        name: The name of the plugin in notifications.cfg.
+        notificationclass: The plugin class.
+        plugindata: dict The parameters for the plugin.
+        internet: boolean Whether the plugin needs internet connectivity.
+
+    Returns:
+        The plugin object, or None if it was skipped because there is no
+        internet connectivity.
+
+    """
+    if internet and not check_conn():
+        msg = "Skipping notification plugin " + name
+        msg += " because no internet connectivity."
+        msg = format_msg(msg, 'error')
+        print(msg)
+        logthis("info", msg)
+        return None
+    instclass = notificationclass(plugindata)
+    instclass.async = plugindata['async']
+    return instclass
+
+def init_timeout(config, name):
+    """Get how long to wait for a plugin to initialise.
+
+    Args:
+        config: The ConfigParser for the plugin's cfg file.
+        name: The name of the plugin's section.
+
+    Returns:
+        float The timeout (seconds): the plugin's own 'inittimeout' if it
+              has one, otherwise the one in settings.cfg.
+
+    """
+    if config.has_option(name, "inittimeout"):
+        return config.getfloat(name, "inittimeout")
+    return SETTINGS['INITTIMEOUT']
+
+def init_plugins(jobs, plugintype):
+    """Initialise plugins concurrently.
+
+    Run the jobs (see initpool.py), and record how long each took (and
+    whether it timed out) in PLUGININITS for the setup report.
+
+    Args:
+        jobs: List of initpool.InitJob objects, one per plugin.
+        plugintype: The type of plugin, e.g. 'sensor'.
+
+    Returns:
+        list The jobs, in the same order, with their results.
+
+    """
+    for job in initpool.run(jobs):
+        timedout = isinstance(job.error, initpool.InitTimeout)
+        PLUGININITS[plugintype + " " + job.name] = (job.seconds, timedout)
+        if timedout:
+            msg = "Gave up setting up " + plugintype + " plugin " + job.name
+            msg += ": " + str(job.error)
+            msg = format_msg(msg, 'warning')
+            logthis("info", msg)
+    return jobs
+
 def set_settings():
     """Set up settings.
 
@@ -862,10 +1276,6 @@ def set_settings():
     mainconfig = ConfigParser.SafeConfigParser()
     mainconfig.read(CFGPATHS['settings'])
 
-    if mainconfig.has_option("Debug", "debug"):
-        if mainconfig.getboolean("Debug", "debug"):
-            logging.basicConfig(level=logging.DEBUG)
-
     settingslist = {}
 
     settingslist['SAMPLEFREQ'] = mainconfig.getfloat("Sampling", "sampleFreq")
@@ -894,6 +1304,33 @@ def set_settings():
     if mainconfig.has_option("Sampling", "dummyduration"):
         settingslist['DUMMYDURATION'] = mainconfig.getint("Sampling",
             "dummyduration")
+    settingslist['ASYNCOUTPUTS'] = False # Default
+    if mainconfig.has_option("Sampling", "asyncoutputs"):
+        settingslist['ASYNCOUTPUTS'] = mainconfig.getboolean("Sampling",
+            "asyncoutputs")
+    settingslist['PARALLELREADS'] = False # Default
+    if mainconfig.has_option("Sampling", "parallelreads"):
+        settingslist['PARALLELREADS'] = mainconfig.getboolean("Sampling",
+            "parallelreads")
+    settingslist['READTHREADS'] = 3 # Default
+    if mainconfig.has_option("Sampling", "readthreads"):
+        settingslist['READTHREADS'] = mainconfig.getint("Sampling",
+            "readthreads")
+    settingslist['OUTPUTPROCESSES'] = 0 # Default
+    if mainconfig.has_option("Sampling", "outputprocesses"):
+        settingslist['OUTPUTPROCESSES'] = mainconfig.getint("Sampling",
+            "outputprocesses")
+    settingslist['RINGSIZE'] = 64 # Default
+    if mainconfig.has_option("Sampling", "ringsize"):
+        settingslist['RINGSIZE'] = mainconfig.getint("Sampling", "ringsize")
+    settingslist['TICKBUDGET'] = settingslist['SAMPLEFREQ'] # Default
+    if mainconfig.has_option("Sampling", "tickbudget"):
+        settingslist['TICKBUDGET'] = mainconfig.getfloat("Sampling",
+            "tickbudget")
+    settingslist['HISTORYSIZE'] = 17280 # Default
+    if mainconfig.has_option("Sampling", "historysize"):
+        settingslist['HISTORYSIZE'] = mainconfig.getint("Sampling",
+            "historysize")
     # LEDs
     settingslist['REDPIN'] = mainconfig.getint("LEDs", "redPin")
     settingslist['GREENPIN'] = mainconfig.getint("LEDs", "greenPin")
@@ -903,8 +1340,25 @@ def set_settings():
     settingslist['OPERATOR'] = mainconfig.get("Misc", "operator")
     settingslist['HELP'] = mainconfig.getboolean("Misc", "help")
     settingslist['PRINTERRORS'] = mainconfig.getboolean("Misc", "printErrors")
+    settingslist['INITTIMEOUT'] = 30 # Default
+    if mainconfig.has_option("Misc", "inittimeout"):
+        settingslist['INITTIMEOUT'] = mainconfig.getfloat("Misc",
+            "inittimeout")
     # Debug
     settingslist['WAITTOSTART'] = mainconfig.getboolean("Debug", "waittostart")
+    settingslist['PROFILE'] = False # Default
+    if mainconfig.has_option("Debug", "profile"):
+        settingslist['PROFILE'] = mainconfig.getboolean("Debug", "profile")
+    settingslist['PROFILETICKS'] = 100 # Default
+    if mainconfig.has_option("Debug", "profileticks"):
+        settingslist['PROFILETICKS'] = mainconfig.getint("Debug",
+            "profileticks")
+    settingslist['TRACE'] = False # Default
+    if mainconfig.has_option("Debug", "trace"):
+        settingslist['TRACE'] = mainconfig.getboolean("Debug", "trace")
+    settingslist['TRACETICKS'] = 10 # Default
+    if mainconfig.has_option("Debug", "traceticks"):
+        settingslist['TRACETICKS'] = mainconfig.getint("Debug", "traceticks")
 
     msg = "Loaded settings."
     msg = format_msg(msg, 'success')
@@ -1010,52 +1464,88 @@ def dummy_runs(dummyduration):
     msg = "Doing initialising runs for " + str(dummyduration) + " seconds."
     msg = format_msg(msg, 'info')
     print(msg)
-    startdummy = time.time()
+    frame = sampleframe.SampleFrame(FRAMESCHEMA)
+    startdummy = scheduler.monotonic()
     diff = 0
     while diff < dummyduration:
         # Note there is no sleep() here, so they will read as quickly as
         # possible for 15 seconds.
-        for i in PLUGINSSENSORS:
-            if i == gpsplugininstance:
-                read_gps(i)
-            else:
-                read_sensor(i, None)
-        diff = time.time() - startdummy
+        read_sensors(frame, None)
+        diff = scheduler.monotonic() - startdummy
     return True
 
-def read_sensor(sensorplugin, limit):
-    """Read from a non-GPS sensor.
+def read_sensors(frame, limit, indices=None):
+    """Read from enabled sensors.
 
-    Read info from a sensor. Note this is not just the value, but also the
-    sensor name, units, symbol, etc. N.B. GPS data is read using `read_gps()`.
+    Read from all of the enabled sensors (or just some of them), GPS or
+    otherwise, into a SampleFrame. If 'parallelreads' is switched on in
+    settings.cfg then sensors which don't share a bus are read at the
+    same time via SENSORPOOL; otherwise they are read one after another.
+    The name, units, symbol, etc. of each reading are not read here;
+    they are in the frame's schema (FRAMESCHEMA), which is built once
+    when sampling starts.
 
     Args:
-        sensorplugin: The sensor plugin which should be read.
-
-    Returns:
-        dict The sensor data.
+        frame: The SampleFrame in which the readings should be stored.
+        limit: The 'limits' support plugin, or None/False if limits
+               should not be checked.
+        indices: Positions in PLUGINSSENSORS of the sensors to read, or
+                 None to read all of them.
 
     """
-    reading = {}
-    reading["value"] = sensorplugin.getval()
-    reading["unit"] = sensorplugin.valunit
-    reading["symbol"] = sensorplugin.valsymbol
-    reading["name"] = sensorplugin.valname
-    reading["sensor"] = sensorplugin.sensorname
-    reading["description"] = sensorplugin.description
-    reading["readingtype"] = sensorplugin.readingtype
-    if limit is not None and limit is not False:
-        reading["breach"] = limit.isbreach(reading["name"], reading["value"], reading["unit"])
+    def read_one(sensorplugin):
+        start = scheduler.monotonic()
+        if sensorplugin == gpsplugininstance:
+            reading = read_gps(sensorplugin)
+        else:
+            reading = sensorplugin.getval()
+        metrics.REGISTRY.observe("sensor " + sensorplugin.sensorname,
+            scheduler.monotonic() - start)
+        return reading
+
+    if indices is None:
+        indices = range(len(PLUGINSSENSORS))
+    if SENSORPOOL is not None:
+        readings = SENSORPOOL.read(read_one, indices)
     else:
-        reading["breach"] = False
-    return reading
+        readings = [None] * len(PLUGINSSENSORS)
+        for index in indices:
+            readings[index] = read_one(PLUGINSSENSORS[index])
+    store_readings(frame, readings, limit, indices)
+
+def store_readings(frame, readings, limit, indices=None):
+    """Store readings in a SampleFrame, checking them against limits.
+
+    Args:
+        frame: The SampleFrame in which the readings should be stored.
+        readings: List of readings, in the same order as the frame's
+                  schema.
+        limit: The 'limits' support plugin, or None/False if limits
+               should not be checked.
+        indices: Positions in the schema of the readings to store, or
+                 None to store all of them.
+
+    """
+    if indices is None:
+        indices = range(frame.schema.size)
+    fields = frame.schema.fields
+    extras = frame.schema.extras
+    for index in indices:
+        if index in extras:
+            frame.setextra(index, readings[index])
+        elif limit is not None and limit is not False:
+            frame.set(index, readings[index],
+                limit.isbreach(fields[index]["name"], readings[index],
+                    fields[index]["unit"]))
+        else:
+            frame.set(index, readings[index])
 
 def read_gps(sensorplugin):
     """Read from a GPS sensor.
 
     Read info from a GPS sensor. Note this is not just one value, but
-    multiple values for latitude, longitude, etc. N.B. Non-GPS data is
-    read using `read_sensor()`.
+    multiple values for latitude, longitude, etc. N.B. Non-GPS sensors
+    just return a value from getval().
 
     Args:
         sensorplugin: The sensor plugin which should be read.
@@ -1066,7 +1556,7 @@ def read_gps(sensorplugin):
     """
     reading = {}
     val = sensorplugin.getval()
-    LOGGER.debug(" GPS output %s" % (val,))
+    LOGGER.debug(" GPS output %s", val)
     reading["latitude"] = val[0]
     reading["longitude"] = val[1]
     if not isnan(val[2]):
@@ -1084,6 +1574,13 @@ def sample():
     writing to enabled 'output' plugins. Will continue until forceably
     stopped with Ctrl+C, or it reaches the number of samples requested
     using 'stopafter' in the settings.cfg file.
+    Ticks are timed by SCHEDULER at fixed intervals from the start of
+    sampling; if a tick overruns so badly that the next one(s) can't
+    happen on time, they are skipped and counted rather than run late.
+    Sensors with their own 'interval' in sensors.cfg are read on their
+    own schedule (SENSORSCHEDULE), between ticks if necessary. At each
+    tick, outputs get the latest reading from every sensor.
+    Timings for each part of each tick are recorded in metrics.REGISTRY.
 
     """
     msg = "Starting sampling..."
@@ -1093,308 +1590,1285 @@ def sample():
     global samples
     greenhaslit = False
     redhaslit = False
-    lastupdated = 0
     alreadysentsensornotifications = False
     alreadysentoutputnotifications = False
+    aggregate = aggregator.Aggregator()
     if 'AVERAGEFREQ' in SETTINGS:
         countcurrent = 0
         counttarget = SETTINGS['AVERAGECOUNT']
-        dataset = {}
+    latest = sampleframe.SampleFrame(FRAMESCHEMA)
+    # Don't include timings from the dummy runs
+    metrics.REGISTRY.reset()
+    if PROFILER is not None:
+        PROFILER.start("sample")
+
+    def record(indices):
+        """Read sensors into the latest frame, and add them to any average."""
+        read_sensors(latest, PLUGINSSUPPORTS["limits"], indices)
+        if 'AVERAGEFREQ' in SETTINGS:
+            start = scheduler.monotonic()
+            for index in indices:
+                if PLUGINSSENSORS[index] != gpsplugininstance:
+                    aggregate.add(latest.view(index))
+            metrics.REGISTRY.observe("averaging",
+                scheduler.monotonic() - start)
+
     while True:
         try:
-            curtime = time.time()
-            timesincelast = curtime - lastupdated
-            sampletime = None
-            if timesincelast > (SETTINGS['SAMPLEFREQ'] - 0.01):
-                if (timesincelast > (SETTINGS['SAMPLEFREQ'] + 0.02)) and (samples is not 0):
-                    print(format_msg("Can't keep up - requested sample frequency is too fast!", "warning"))
-                lastupdated = curtime
-                data = []
-                # Read the sensors
-                failedsensors = []
-                sampletime = datetime.datetime.now()
-                for sensor in PLUGINSSENSORS:
-                    datadict = {}
-                    if sensor == gpsplugininstance:
-                        datadict = read_gps(sensor)
-                    else:
-                        datadict = read_sensor(sensor, PLUGINSSUPPORTS["limits"])
-                        # TODO: Ensure this is robust
-                        if (datadict["value"] is None or
-                                isnan(float(datadict["value"])) or
-                                datadict["value"] == 0):
-                            failedsensors.append(sensor.sensorname)
-                    # Average the data if required
-                    if (('AVERAGEFREQ' in SETTINGS) and
-                            (sensor != gpsplugininstance)):
-                        identifier = datadict['sensor'] + "-"
-                        identifier += datadict['name']
-                        if identifier not in dataset:
-                            dataset[identifier] = {}
-                            temp = datadict.copy()
-                            temp.pop("value", None)
-                            for thekey, thevalue in temp.iteritems():
-                                if thekey not in dataset[identifier]:
-                                    dataset[identifier][thekey] = thevalue
-                            dataset[identifier]['values'] = []
-                        dataset[identifier]['values'].append(datadict["value"])
-                    # Always record raw values for every sensor
-                    data.append(datadict)
-                # Record the outcome of reading sensors
-                if 'AVERAGEFREQ' in SETTINGS:
-                    countcurrent += 1
-                if failedsensors:
-                    if not alreadysentsensornotifications:
-                        for j in PLUGINSNOTIFICATIONS:
-                            j.sendnotification("alertsensor")
-                        alreadysentsensornotifications = True
-                    msg = "Failed to obtain data from these sensors: " + ", ".join(failedsensors)
-                    msg = format_msg(msg, 'error')
-                    logthis("error", msg)
-                    if SETTINGS['PRINTERRORS']:
-                        print(msg)
-                else:
-                    msg = "Data successfully obtained from all sensors."
-                    msg = format_msg(msg, 'success')
-                    logthis("info", msg)
-
-                # Output data
-                try:
-                    # Averaging
-                    if 'AVERAGEFREQ' in SETTINGS:
-                        if countcurrent == counttarget:
-                            data = average_dataset(identifier, dataset)
-                            dataset = {}
-                    if (('AVERAGEFREQ' in SETTINGS and
-                        countcurrent == counttarget) or
-                            ('AVERAGEFREQ' not in SETTINGS)):
-                        if 'AVERAGEFREQ' in SETTINGS:
-                            countcurrent = 0
-                        # Output the data
-                        outputsworking = True
-                        for i in PLUGINSOUTPUTS:
-                            LOGGER.debug(" Dataset to output to " + str(i) + ":")
-                            LOGGER.debug(" " + str(data))
-                            if i.output_data(data, sampletime) == False:
-                                outputsworking = False
-                        # Record the outcome of outputting data
-                        if outputsworking:
-                            msg = "Data output in all requested formats."
-                            msg = format_msg(msg, 'success')
-                            logthis("info", msg)
-                            if (SETTINGS['GREENPIN'] and
-                                    (SETTINGS['SUCCESSLED'] == "all" or
-                                    (SETTINGS['SUCCESSLED'] == "first" and
-                                        not greenhaslit))):
-                                led_on(SETTINGS['GREENPIN'])
-                                greenhaslit = True
-                        else:
-                            if not alreadysentoutputnotifications:
-                                for j in PLUGINSNOTIFICATIONS:
-                                    j.sendnotification("alertoutput")
-                                alreadysentoutputnotifications = True
-                            msg = "Failed to output in all requested formats."
-                            msg = format_msg(msg, 'error')
-                            logthis("error", msg)
-                            if SETTINGS['PRINTERRORS']:
-                                print(msg)
-                            if (SETTINGS['REDPIN'] and
-                                    (SETTINGS['FAILLED'] in ["all", "constant"] or
-                                    (SETTINGS['FAILLED'] == "first" and
-                                        not redhaslit))):
-                                led_on(SETTINGS['REDPIN'])
-                                redhaslit = True
-
-                except KeyboardInterrupt:
-                    raise
-                except Exception as excep:
-                    msg = "Exception during output: %s" % excep
-                    msg = format_msg(msg, 'error')
-                    logthis("error", msg)
-                else:
-                    # Delay before turning off LED
-                    time.sleep(1)
-                    if SETTINGS['GREENPIN']:
-                        led_off(SETTINGS['GREENPIN'])
-                    if (SETTINGS['REDPIN'] and
-                            SETTINGS['FAILLED'] != "constant"):
-                        led_off(SETTINGS['REDPIN'])
-                samples += 1
-                if samples == SETTINGS['STOPAFTER']:
-                    msg = "Reached requested number of samples - stopping run."
-                    msg = format_msg(msg, 'sys')
+            if (SENSORSCHEDULE.start is not None and
+                    SENSORSCHEDULE.nextdue() < SCHEDULER.nextdeadline() - 0.001):
+                # Read any sensors which are due before the next tick
+                pause = SENSORSCHEDULE.nextdue() - scheduler.monotonic()
+                if pause > 0:
+                    time.sleep(pause)
+                record(SENSORSCHEDULE.popdue(scheduler.monotonic()))
+                continue
+            SCHEDULER.wait()
+            report_requested()
+            if SENSORSCHEDULE.start is None:
+                SENSORSCHEDULE.begin(SCHEDULER.start)
+            if TRACER is not None:
+                TRACER.begin_tick(samples + 1, SCHEDULER.deadline())
+            # Read the sensors
+            failedsensors = []
+            sampletime = datetime.datetime.now()
+            record(SENSORSCHEDULE.popdue(scheduler.monotonic()))
+            # Always record the latest raw values for every sensor
+            data = latest.copy()
+            record_history(data, sampletime)
+            for index in data.failed():
+                failedsensors.append(PLUGINSSENSORS[index].sensorname)
+            # Record the outcome of reading sensors
+            if 'AVERAGEFREQ' in SETTINGS:
+                countcurrent += 1
+            if failedsensors:
+                if not alreadysentsensornotifications:
+                    send_notifications("alertsensor")
+                    alreadysentsensornotifications = True
+                msg = "Failed to obtain data from these sensors: " + ", ".join(failedsensors)
+                msg = format_msg(msg, 'error')
+                logthis("error", msg)
+                if SETTINGS['PRINTERRORS']:
                     print(msg)
-                    logthis("info", msg)
-                    stop_sampling(None, None)
+            else:
+                msg = "Data successfully obtained from all sensors."
+                msg = format_msg(msg, 'success')
+                logthis("info", msg)
+
+            # Output data
             try:
-                time.sleep(SETTINGS['SAMPLEFREQ'] - (time.time() - curtime))
+                # Averaging
+                if 'AVERAGEFREQ' in SETTINGS:
+                    if countcurrent == counttarget:
+                        start = scheduler.monotonic()
+                        # Sensors which haven't been read since the last
+                        # average just carry on with their latest reading,
+                        # except those which count pulses (e.g. the rain
+                        # gauge): their latest reading has already been
+                        # counted, so they get a reading of 0 instead
+                        for index, sensor in enumerate(PLUGINSSENSORS):
+                            datadict = latest.view(index)
+                            if (sensor != gpsplugininstance and
+                                    aggregate.identifier(datadict) not in aggregate):
+                                if datadict['readingtype'] == "pulseCount":
+                                    datadict = datadict.copy()
+                                    datadict['value'] = 0
+                                aggregate.add(datadict)
+                        data = aggregate.results()
+                        metrics.REGISTRY.observe("averaging",
+                            scheduler.monotonic() - start)
+                if (('AVERAGEFREQ' in SETTINGS and
+                    countcurrent == counttarget) or
+                        ('AVERAGEFREQ' not in SETTINGS)):
+                    if 'AVERAGEFREQ' in SETTINGS:
+                        countcurrent = 0
+                    # Output the data
+                    outputsworking = send_to_outputs(data, sampletime,
+                        SCHEDULER.deadline() + SETTINGS['TICKBUDGET'])
+                    # Record the outcome of outputting data
+                    if outputsworking:
+                        msg = "Data output in all requested formats."
+                        msg = format_msg(msg, 'success')
+                        logthis("info", msg)
+                        if (SETTINGS['GREENPIN'] and
+                                (SETTINGS['SUCCESSLED'] == "all" or
+                                (SETTINGS['SUCCESSLED'] == "first" and
+                                    not greenhaslit))):
+                            led_on(SETTINGS['GREENPIN'])
+                            greenhaslit = True
+                    else:
+                        if not alreadysentoutputnotifications:
+                            send_notifications("alertoutput")
+                            alreadysentoutputnotifications = True
+                        msg = "Failed to output in all requested formats."
+                        msg = format_msg(msg, 'error')
+                        logthis("error", msg)
+                        if SETTINGS['PRINTERRORS']:
+                            print(msg)
+                        if (SETTINGS['REDPIN'] and
+                                (SETTINGS['FAILLED'] in ["all", "constant"] or
+                                (SETTINGS['FAILLED'] == "first" and
+                                    not redhaslit))):
+                            led_on(SETTINGS['REDPIN'])
+                            redhaslit = True
+
             except KeyboardInterrupt:
                 raise
-            except Exception:
-                pass # fall back on old method...
+            except Exception as excep:
+                msg = "Exception during output: %s" % excep
+                msg = format_msg(msg, 'error')
+                logthis("error", msg)
+            else:
+                # Turn the LEDs off again after a short delay, without
+                # holding up the next tick
+                leds_off_later(min(1, SETTINGS['SAMPLEFREQ'] / 2))
+            ticktime = scheduler.monotonic() - SCHEDULER.deadline()
+            metrics.REGISTRY.observe("tick", ticktime)
+            metrics.REGISTRY.increment("ticks")
+            if ticktime > SETTINGS['TICKBUDGET']:
+                metrics.REGISTRY.increment("ticks over budget")
+            if TRACER is not None:
+                TRACER.end_tick()
+            samples += 1
+            if PROFILER is not None:
+                report_profile(PROFILER.tick())
+            if samples == SETTINGS['STOPAFTER']:
+                msg = "Reached requested number of samples - stopping run."
+                msg = format_msg(msg, 'sys')
+                print(msg)
+                logthis("info", msg)
+                stop_sampling(None, None)
         except KeyboardInterrupt:
             stop_sampling(None, None)
 
-def average_dataset(identifier, dataset):
-    """Average a dataset.
+def replay_log(filename, speed):
+    """Replay a data log through the output plugins.
 
-    Take a dataset consisting of 'n' separate readings, and calculate
-    the mean across those readings. The dataset will be a dict of dicts;
-    each element in the first dict is a single time point in the set to
-    be averaged. Each of these single time points is a dict which
-    contains one reading for each of the enabled sensors.
+    Read each sample in turn from a log written by the CSVOutput or
+    JSONOutput plugin, check it against limits and send it to the
+    enabled output plugins (which calibrate it, if they're set up to),
+    with the time at which it was originally recorded. The log is read
+    as a stream, so it can be as large as necessary. Stops at the end of
+    the log, or after 'stopafter' samples.
 
     Args:
-        identifier: The unique identifier for the sensor and property
-            being averaged.
-        dataset: The list of 'n' separate time points to be averaged.
-
-    Returns:
-        list The averaged data.
-
-    """
-    totals = {}
-    numberofsamples = {}
-    # For each identifier, sum the indidivual values in the
-    # dataset[identifier]['values'] list.
-    # Count the number of samples as we go along, in case one sensor has
-    # missed any readings.
-    for identifier, properties in dataset.iteritems():
-        totals[identifier] = 0
-        numberofsamples[identifier] = 0
-        for value in properties['values']:
-            if value != "-" and value is not None and not isnan(value):
-                totals[identifier] += value
-                numberofsamples[identifier] += 1
-    # For each identifier, divide the sum by the number of samples
-    for identifier, total in totals.iteritems():
-        dataset[identifier]['value'] = total / numberofsamples[identifier]
-        dataset[identifier]['readingtype'] = "average"
-    # Re-format to that expected by output_data() methods of the output
-    # plugins
-    formatted = []
-    for identifier in dataset:
-        dataset[identifier]['identifier'] = identifier
-        formatted.append(dataset[identifier])
-    return formatted
-
-def stop_sampling(dummy, _):
-    """Stop a run.
-
-    Stop a run by shutting down the GPS controller, turning off LEDs and
-    then printing a summary of the run statistics. Note that this can be
-    run either programatically because we have completed the requested
-    number of samples, or manually because the user pressed Ctrl+C
-    (KeyboardInterrupt). If it is a KeyboardInterrupt, then the
-    two parameters are passed to this method automatically (see
-    https://docs.python.org/3/library/signal.html#signal.signal). They
-    are not actually used by our code; they're named 'dummy' and '_' so
-    that pylint ignores the fact that we don't ever use them (see Q4.5
-    on http://docs.pylint.org/faq.html)
+        filename: The name of the log file.
+        speed: How fast to replay the log: 1 to replay samples at the
+               same intervals as they were recorded, 2 for twice as
+               fast, etc., or 0 for as fast as possible.
 
     """
-    print("")
-    msg = "Sampling stopping..."
-    msg = format_msg(msg, 'sys')
+    global samples
+    log = replay.ReplayLog(filename)
+    msg = "Replaying " + log.format.upper() + " log " + filename
+    if speed:
+        msg += " at " + str(speed) + "x speed..."
+    else:
+        msg += " as fast as possible..."
+    msg = format_msg(msg, "info")
     print(msg)
     logthis("info", msg)
+    print("==========================================================")
+    limit = PLUGINSSUPPORTS["limits"]
+    metrics.REGISTRY.reset()
+    if PROFILER is not None:
+        PROFILER.start("sample")
+    firsttime = None
+    started = None
     try:
-        if gpsplugininstance:
-            gpsplugininstance.stopcontroller()
-    except NameError:
-        # If GPS socket isn't set, gpsplugininstance won't exist. It
-        # raises it's own error and quits before here, but quit again
-        # just in case.
-        sys.exit(1)
-    led_off(SETTINGS['GREENPIN'])
-    led_off(SETTINGS['REDPIN'])
-    timedelta = datetime.datetime.utcnow() - STARTTIME
-    hours, remainder = divmod(timedelta.seconds, 3600)
-    minutes, seconds = divmod(remainder, 60)
-    msg = "This run lasted " + str(hours) + "h " + str(minutes) + "m "
-    msg += str(seconds)  + "s, and consisted of " + str(samples) + " samples."
-    msg = format_msg(msg, 'sys')
-    print(msg)
-    logthis("info", msg)
-    msg = "Sampling stopped."
-    msg = format_msg(msg, 'sys')
-    print(msg)
-    logthis("info", msg)
+        for sampletime, schema, readings in log.samples():
+            if firsttime is None:
+                firsttime = sampletime
+                started = scheduler.monotonic()
+            elif speed:
+                elapsed = sampletime - firsttime
+                elapsed = (elapsed.days * 86400 + elapsed.seconds +
+                            elapsed.microseconds / 1e6)
+                pause = started + elapsed / speed - scheduler.monotonic()
+                if pause > 0:
+                    time.sleep(pause)
+            report_requested()
+            start = scheduler.monotonic()
+            frame = sampleframe.SampleFrame(schema)
+            store_readings(frame, readings, limit)
+            record_history(frame, sampletime)
+            if send_to_outputs(frame, sampletime):
+                msg = "Data output in all requested formats."
+                msg = format_msg(msg, 'success')
+                logthis("info", msg)
+            else:
+                msg = "Failed to output in all requested formats."
+                msg = format_msg(msg, 'error')
+                logthis("error", msg)
+                if SETTINGS['PRINTERRORS']:
+                    print(msg)
+            metrics.REGISTRY.observe("tick", scheduler.monotonic() - start)
+            metrics.REGISTRY.increment("ticks")
+            samples += 1
+            if PROFILER is not None:
+                report_profile(PROFILER.tick())
+            if samples == SETTINGS['STOPAFTER']:
+                msg = "Reached requested number of samples - stopping run."
+                msg = format_msg(msg, 'sys')
+                print(msg)
+                logthis("info", msg)
+                break
+        else:
+            msg = "Reached the end of the log - stopping run."
+            msg = format_msg(msg, 'sys')
+            print(msg)
+            logthis("info", msg)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        log.close()
+    stop_sampling(None, None)
+
+def record_history(frame, sampletime):
+    """Add a sample to the shared history of readings.
+
+    Add the sample to history.STORE, for output plugins which show
+    readings over time. If the sample has different sensors from those
+    already in the history (which can happen when replaying a log), the
+    history is started afresh.
+
+    Args:
+        frame: SampleFrame The sample.
+        sampletime: datetime representing the time the sample was taken.
+
+    """
+    store = history.STORE
+    if store is None:
+        return
+    start = scheduler.monotonic()
+    if frame.schema is not store.schema:
+        store = history.History(frame.schema, store.size)
+        history.STORE = store
+    store.add(frame, sampletime)
+    metrics.REGISTRY.observe("history", scheduler.monotonic() - start)
+
+def send_notifications(event):
+    """Send a notification from all enabled notification plugins.
+
+    Args:
+        event: string The event to notify about (e.g. "alertsensor").
+
+    """
+    start = scheduler.monotonic()
+    for j in PLUGINSNOTIFICATIONS:
+        j.sendnotification(event)
+    metrics.REGISTRY.observe("notifications", scheduler.monotonic() - start)
+
+def send_to_outputs(data, sampletime, deadline=None):
+    """Send data to all enabled output plugins.
+
+    Send one set of data to each of the enabled output plugins, in order
+    of priority (see output_priority()). Plugins which have an
+    OutputWorker (because 'asyncoutputs' is switched on in settings.cfg)
+    just have the data queued; the outcome reported for them is that of
+    the last data they actually finished outputting.
+    Plugins with an output_frame() method are given a SampleFrame
+    directly; others get dict-like views of its readings. If the data
+    has been averaged, plugins with a 'statistic' option in outputs.cfg
+    get that statistic instead of the usual value.
+    Once 'deadline' has passed, the remaining plugins are skipped, unless
+    they write to a file or are queued; they get the next set of data
+    instead. Skips are counted in metrics.REGISTRY.
+
+    Args:
+        data: SampleFrame or list The data to be output (a list when it
+              has been averaged).
+        sampletime: datetime representing the time the sample was taken.
+        deadline: The scheduler.monotonic() time by which outputting
+                  should be finished, or None to never skip outputs.
+
+    Returns:
+        boolean True if all outputs are working.
+
+    """
+    outputsworking = True
+    if OUTPUTRING is not None:
+        outputsworking = write_to_ring(data, sampletime)
+    selected = {}
+    skipped = []
+    for i in PLUGINSOUTPUTS:
+        if i.name in DISABLEDOUTPUTS:
+            # Switched off using the control socket
+            continue
+        if (deadline is not None and i.name not in OUTPUTWORKERS and
+                i.params["target"] != "file" and
+                scheduler.monotonic() > deadline):
+            metrics.REGISTRY.increment("output " + i.name + " skipped")
+            skipped.append(i.name)
+            continue
+        statistic = i.params.get("statistic")
+        if statistic and isinstance(data, list):
+            if statistic not in selected:
+                selected[statistic] = aggregator.select_statistic(data,
+                                        statistic)
+            outputdata = selected[statistic]
+        else:
+            outputdata = data
+        if i.name in OUTPUTWORKERS:
+            worker = OUTPUTWORKERS[i.name]
+            worker.put(outputdata, sampletime)
+            if not worker.lastresult:
+                outputsworking = False
+        else:
+            LOGGER.debug(" Dataset to output to %s:", i)
+            LOGGER.debug(" %s", outputdata)
+            start = scheduler.monotonic()
+            if i.name in OUTPUTBATCHES:
+                result = OUTPUTBATCHES[i.name].add(outputdata, sampletime)
+            else:
+                result = sampleframe.deliver(i, outputdata, sampletime)
+            metrics.REGISTRY.observe("output " + i.name,
+                scheduler.monotonic() - start)
+            if result == False:
+                outputsworking = False
+    if skipped:
+        msg = "Tick over budget; skipped output(s): " + ", ".join(skipped)
+        msg = format_msg(msg, 'warning')
+        logthis("info", msg)
+    return outputsworking
+
+def set_up_output_batches(plugins):
+    """Set up batching for output plugins which ask for it.
+
+    Samples for plugins with 'batchsize' or 'batchage' set in
+    outputs.cfg are collected in an OutputBatch, and output a batch at a
+    time (see outputbatch.py).
+
+    Args:
+        plugins: List of enabled 'output' plugins.
+
+    Returns:
+        dict The OutputBatch for each plugin which has one, keyed by
+             plugin name.
+
+    """
+    batches = {}
+    for plugin in plugins:
+        size = plugin.params.get("batchsize")
+        age = plugin.params.get("batchage")
+        if not size and not age:
+            continue
+        try:
+            size = int(size or 0)
+            age = float(age or 0)
+        except ValueError:
+            msg = "Output plugin " + plugin.name + ": 'batchsize' must be a"
+            msg += " whole number and 'batchage' a number of seconds."
+            msg = format_msg(msg, 'error')
+            print(msg)
+            logthis("error", msg)
+            sys.exit(1)
+        if size == 1 or (size <= 0 and age <= 0):
+            continue
+        batches[plugin.name] = outputbatch.OutputBatch(plugin, size, age)
+        msg = "Output plugin " + plugin.name + " will output in batches ("
+        if size > 0:
+            msg += "up to " + str(size) + " samples"
+            if age > 0:
+                msg += " or "
+        if age > 0:
+            msg += "every " + str(age) + " seconds"
+        if not callable(getattr(plugin, "output_batch", None)):
+            msg += ", given to the plugin one at a time"
+        msg += ")."
+        msg = format_msg(msg, 'info')
+        print(msg)
+        logthis("info", msg)
+    return batches
+
+def stop_output_batches():
+    """Output whatever is left in each OutputBatch and report their
+    statistics.
+
+    Batches used by an OutputWorker have already been output by the
+    worker when it stopped (see stop_output_workers()).
+
+    """
+    for name in sorted(OUTPUTBATCHES):
+        batch = OUTPUTBATCHES[name]
+        if name not in OUTPUTWORKERS:
+            try:
+                batch.flush()
+            except Exception as excep:
+                msg = "Exception during output: %s" % excep
+                msg = format_msg(msg, 'error')
+                print(msg)
+                logthis("error", msg)
+        msg = format_msg("Output batches " + batch.stats(), 'sys')
+        print(msg)
+        logthis("info", msg)
+
+def set_up_output_workers(plugins):
+    """Set up a queue and worker thread for each output plugin.
+
+    Wrap each of the enabled output plugins in an OutputWorker, so that
+    sample() only has to queue data for them. The size of each queue and
+    what happens when it is full are set using the 'queuesize' and
+    'overflow' options for the plugin in outputs.cfg. Plugins with an
+    OutputBatch (see set_up_output_batches()) have their data batched by
+    the worker.
+
+    Args:
+        plugins: List of enabled 'output' plugins.
+
+    Returns:
+        dict The OutputWorker for each plugin, keyed by plugin name.
+
+    """
+    workers = {}
+    for plugin in plugins:
+        size = plugin.params.get("queuesize") or 10
+        policy = plugin.params.get("overflow") or "dropoldest"
+        try:
+            workers[plugin.name] = outputqueue.OutputWorker(plugin, size,
+                                        policy.lower(), LOGGER,
+                                        OUTPUTBATCHES.get(plugin.name))
+        except ValueError as excep:
+            msg = "Output plugin " + plugin.name + ": " + str(excep)
+            msg += ". Use one of: " + ", ".join(outputqueue.OutputWorker.policies)
+            msg = format_msg(msg, 'error')
+            print(msg)
+            logthis("error", msg)
+            sys.exit(1)
+        msg = "Output plugin " + plugin.name + " will run in the background"
+        msg += " (queue size " + str(size) + ", " + policy + ")."
+        logthis("info", msg)
+    return workers
+
+def stop_output_workers(timeout):
+    """Stop output workers and report their statistics.
+
+    Give each OutputWorker the chance to finish outputting whatever is
+    still in its queue, then print and log its counters.
+
+    Args:
+        timeout: The maximum total time to wait for all of the workers
+                 to finish (seconds).
+
+    """
+    deadline = scheduler.monotonic() + timeout
+    for name in sorted(OUTPUTWORKERS):
+        worker = OUTPUTWORKERS[name]
+        if not worker.stop(max(0, deadline - scheduler.monotonic())):
+            msg = "Output plugin " + name + " did not finish in time."
+            msg = format_msg(msg, 'warning')
+            print(msg)
+            logthis("info", msg)
+        msg = format_msg("Output queue " + worker.stats(), 'sys')
+        print(msg)
+        logthis("info", msg)
+
+def enabled_outputs():
+    """Get the names of the enabled output plugins.
+
+    Returns:
+        list The names of the enabled plugins' sections in outputs.cfg.
+
+    """
+    check_cfg_file(CFGPATHS['outputs'])
+    outputconfig = ConfigParser.SafeConfigParser()
+    outputconfig.read(CFGPATHS['outputs'])
+    names = []
+    for plugin in outputconfig.sections():
+        if plugin == "Notes":
+            continue
+        if (not outputconfig.has_option(plugin, "enabled") or
+                outputconfig.getboolean(plugin, "enabled")):
+            names.append(plugin)
+    return names
+
+def start_output_processes(count):
+    """Start output plugins in separate processes.
+
+    Share the enabled output plugins out between 'count' processes (or
+    fewer, if there aren't that many plugins). Each process sets up its
+    plugins and then outputs every sample written to the ring buffer
+    (see run_output_process()). The processes are started one at a
+    time, waiting for each to finish setting up, so that their messages
+    don't get mixed up.
+
+    Args:
+        count: The number of output processes requested.
+
+    Returns:
+        tuple The RingBuffer, and a list of (process, plugin names)
+              tuples.
+
+    """
+    names = enabled_outputs()
+    any_plugins_enabled(names, 'output')
+    count = min(count, len(names))
+    ring = ringbuffer.RingBuffer(FRAMESCHEMA, SETTINGS['RINGSIZE'], count)
+    processes = []
+    for number in range(count):
+        group = names[number::count]
+        process = multiprocessing.Process(target=run_output_process,
+                    args=(ring, number, group),
+                    name="output" + str(number + 1))
+        process.daemon = True
+        process.start()
+        while (process.is_alive() and
+                ring.status(number)["state"] == ringbuffer.STARTING):
+            time.sleep(0.05)
+        if ring.status(number)["state"] != ringbuffer.READY:
+            msg = "Output process " + str(number + 1) + " ("
+            msg += ", ".join(group) + ") failed to start."
+            msg = format_msg(msg, 'error')
+            print(msg)
+            logthis("error", msg)
+            sys.exit(1)
+        msg = "Output process " + str(number + 1) + " (pid "
+        msg += str(process.pid) + ") is running: " + ", ".join(group)
+        msg = format_msg(msg, 'info')
+        print(msg)
+        logthis("info", msg)
+        processes.append((process, group))
+    return ring, processes
+
+def run_output_process(ring, number, names):
+    """Output samples from the ring buffer.
+
+    Run in each output process (see start_output_processes()). Set up
+    this process's output plugins, then pass each sample written to the
+    ring buffer to them until the ring buffer is closed, or the sampling
+    process goes away. The process logs to its own log file.
+
+    Args:
+        ring: The RingBuffer.
+        number: The number of this process (from 0).
+        names: List of the names of the output plugins to run.
+
+    """
+    global LOGGER, OUTPUTRING, PLUGINSOUTPUTS, OUTPUTBATCHES, OUTPUTWORKERS
+    # The sampling process deals with Ctrl+C, and closes the ring buffer
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    parent = os.getppid()
+    LOGGER = set_up_logger("output" + str(number + 1))
+    OUTPUTRING = None
+    metrics.REGISTRY.reset()
+    reader = ring.reader(number)
+    try:
+        PLUGINSOUTPUTS = set_up_outputs(names)
+        output_metadata(PLUGINSOUTPUTS, set_metadata())
+        OUTPUTBATCHES = set_up_output_batches(PLUGINSOUTPUTS)
+        OUTPUTWORKERS = {}
+        if SETTINGS['ASYNCOUTPUTS']:
+            OUTPUTWORKERS = set_up_output_workers(PLUGINSOUTPUTS)
+    except BaseException as excep:
+        msg = "Output process " + str(number + 1) + " failed: " + str(excep)
+        logthis("error", msg)
+        reader.set_state(ringbuffer.FAILED)
+        LOGLISTENER.stop()
+        return
+    reader.set_state(ringbuffer.READY)
+    poll = min(0.05, SETTINGS['SAMPLEFREQ'] / 4)
+    while True:
+        item = reader.read()
+        if item is None:
+            if os.getppid() != parent:
+                break
+            if ring.closed():
+                # Anything written just before closing has been read
+                item = reader.read()
+                if item is None:
+                    break
+            else:
+                time.sleep(poll)
+                continue
+        frame, sampletime = item
+        record_history(frame, sampletime)
+        try:
+            result = send_to_outputs(frame, sampletime)
+        except Exception as excep:
+            msg = "Exception during output: %s" % excep
+            msg = format_msg(msg, 'error')
+            logthis("error", msg)
+            result = False
+        reader.set_state(ringbuffer.READY, result)
+    stop_output_workers(10)
+    stop_output_batches()
+    msg = "Output process " + str(number + 1) + " (" + ", ".join(names)
+    msg += ") stopped."
+    msg = format_msg(msg, 'sys')
+    print(msg)
+    logthis("info", msg)
+    report_metrics()
+    reader.set_state(ringbuffer.STOPPED)
+    LOGLISTENER.stop()
+
+def write_to_ring(data, sampletime):
+    """Pass a sample to the output processes.
+
+    Args:
+        data: The SampleFrame to output.
+        sampletime: datetime representing the time the sample was taken.
+
+    Returns:
+        boolean True if all of the output processes are running, and the
+                last sample each of them output was output successfully.
+
+    """
+    start = scheduler.monotonic()
+    OUTPUTRING.write(data, sampletime)
+    metrics.REGISTRY.observe("output ring", scheduler.monotonic() - start)
+    for number, (process, dummy) in enumerate(OUTPUTPROCESSES):
+        if not process.is_alive() or not OUTPUTRING.status(number)["ok"]:
+            return False
+    return True
+
+def stop_output_processes(timeout):
+    """Stop the output processes and report their statistics.
+
+    Close the ring buffer, so that each output process stops once it has
+    output everything in it, then print and log how many samples each
+    process dropped.
+
+    Args:
+        timeout: The maximum total time to wait for all of the processes
+                 to finish (seconds).
+
+    """
+    if OUTPUTRING is None:
+        return
+    OUTPUTRING.close()
+    deadline = scheduler.monotonic() + timeout
+    for number, (process, names) in enumerate(OUTPUTPROCESSES):
+        process.join(max(0, deadline - scheduler.monotonic()))
+        status = OUTPUTRING.status(number)
+        if process.is_alive():
+            process.terminate()
+            msg = "Output process " + str(number + 1) + " did not finish in"
+            msg += " time; " + str(status["lag"]) + " sample(s) not output."
+            msg = format_msg(msg, 'warning')
+            print(msg)
+            logthis("info", msg)
+        msg = "Output process " + str(number + 1) + " (" + ", ".join(names)
+        msg += "): " + str(status["dropped"]) + " sample(s) dropped."
+        msg = format_msg(msg, 'sys')
+        print(msg)
+        logthis("info", msg)
+
+def report_profile(files):
+    """Print and log where profiling results have been written.
+
+    Args:
+        files: List of the paths of the files written.
+
+    """
+    for filename in files:
+        msg = "Profile written to " + filename
+        msg = format_msg(msg, 'info')
+        print(msg)
+        logthis("info", msg)
+
+def report_trace(filename):
+    """Print and log where the trace of the slowest samples has been
+    written.
+
+    Args:
+        filename: The path of the file written.
+
+    """
+    msg = "Trace of the " + str(TRACER.count()) + " slowest sample(s)"
+    msg += " written to " + filename
+    msg = format_msg(msg, 'info')
+    print(msg)
+    logthis("info", msg)
+
+def report_startup(phases):
+    """Print and log how long setup took.
+
+    The total and a summary of plugin setup are printed; the time taken
+    by each phase of setup, to import each plugin module and to set up
+    each plugin (slowest first) is logged.
+
+    Args:
+        phases: List of (phase name, seconds) tuples, in order.
+
+    """
+    total = sum([seconds for dummy, seconds in phases])
+    msg = "Setup took " + "%.2f" % total + "s."
+    inits = sorted(PLUGININITS.items(), key=lambda item: item[1][0],
+                    reverse=True)
+    if inits:
+        msg += " " + str(len(inits)) + " plugin(s) were set up; the slowest"
+        msg += " was " + inits[0][0] + " (" + "%.2f" % inits[0][1][0] + "s)."
+    msg = format_msg(msg, 'info')
+    print(msg)
+    logthis("info", msg)
+    timedout = [name for name, (dummy, late) in inits if late]
+    if timedout:
+        msg = "Gave up waiting for: " + ", ".join(timedout)
+        msg = format_msg(msg, 'warning')
+        print(msg)
+        logthis("info", msg)
+    for phase, seconds in phases:
+        logthis("info", "  " + phase.ljust(16) + "%.3f" % seconds + "s")
+    imports = sorted(PLUGINIMPORTS.items(), key=lambda item: item[1],
+                    reverse=True)
+    for name, seconds in imports:
+        logthis("info", "    import " + name + ": " + "%.3f" % seconds + "s")
+    for name, (seconds, late) in inits:
+        msg = "    init " + name + ": " + "%.3f" % seconds + "s"
+        if late:
+            msg += " (timed out)"
+        logthis("info", msg)
+
+def next_phase(phases, phase, started):
+    """Record the time taken by a phase of setup.
+
+    Args:
+        phases: List of (phase name, seconds) tuples to add to.
+        phase: The name of the phase which has just finished.
+        started: The time (from time.time()) when the phase started.
+
+    Returns:
+        float The time now, i.e. when the next phase starts.
+
+    """
+    now = time.time()
+    phases.append((phase, now - started))
+    return now
+
+def request_report(dummy, _):
+    """Ask for a report of the timings recorded so far.
+
+    Used as the handler for SIGUSR1 (e.g. from 'airpictl.sh stats').
+    The report itself is made by the sampling loop at the start of the
+    next tick: a signal handler can run between any two steps of the
+    main thread, including while it holds the metrics or logging locks,
+    so it mustn't take them itself.
+
+    """
+    global REPORTREQUESTED
+    REPORTREQUESTED = True
+
+def report_requested():
+    """Print and log the timings so far, if a report has been asked for.
+
+    See request_report().
+
+    """
+    global REPORTREQUESTED
+    if REPORTREQUESTED:
+        REPORTREQUESTED = False
+        report_metrics()
+
+def report_metrics():
+    """Print and log the timings recorded so far.
+
+    Print (and log) a report of the timings and counts recorded in
+    metrics.REGISTRY during the run. This is done when the run stops,
+    and whenever the process receives SIGUSR1 (see request_report()).
+
+    """
+    msg = format_msg("Timings (count, mean and percentiles):", 'sys')
+    print(msg)
+    logthis("info", msg)
+    lines = metrics.REGISTRY.report()
+    if SCHEDULER.skipped:
+        lines.append("ticks skipped: " + str(SCHEDULER.skipped))
+    for line in lines:
+        print("         " + line)
+        logthis("info", line)
+
+def control_commands():
+    """Get the commands understood by the control socket.
+
+    Returns:
+        dict The function which carries out each command, keyed by the
+             command's name (see control.py).
+
+    """
+    return {"help": control_help,
+            "stats": control_stats,
+            "outputs": control_outputs,
+            "reload": control_reload,
+            "enable": control_enable,
+            "disable": control_disable,
+            "trace": control_trace}
+
+def control_help(dummy):
+    """Control command: list the commands.
+
+    Args:
+        dummy: The words after the command (not used).
+
+    Returns:
+        list The lines of the reply.
+
+    """
+    return ["stats                 Live timings, counts and queues.",
+            "outputs               List output plugins and whether they're enabled.",
+            "reload calibration    Reload calibration functions from supports.cfg.",
+            "reload limits         Reload limits from supports.cfg.",
+            "disable OUTPUT        Stop sending samples to an output plugin.",
+            "enable OUTPUT         Start sending samples to an output plugin again,"
+            " or set up one which has since been enabled in outputs.cfg.",
+            "trace                 Write the trace of the slowest samples so far."]
+
+def control_stats(dummy):
+    """Control command: report live statistics.
+
+    Args:
+        dummy: The words after the command (not used).
+
+    Returns:
+        list The lines of the reply.
+
+    """
+    elapsed = datetime.datetime.utcnow() - STARTTIME
+    lines = ["Samples: " + str(samples) + " in " +
+                str(elapsed.days * 86400 + elapsed.seconds) + "s"]
+    lines.extend(metrics.REGISTRY.report())
+    if SCHEDULER.skipped:
+        lines.append("ticks skipped: " + str(SCHEDULER.skipped))
+    for name in sorted(OUTPUTWORKERS):
+        lines.append("Output queue " + OUTPUTWORKERS[name].stats())
+    for name in sorted(OUTPUTBATCHES):
+        lines.append("Output batches " + OUTPUTBATCHES[name].stats())
+    for number, (process, names) in enumerate(OUTPUTPROCESSES):
+        status = OUTPUTRING.status(number)
+        state = "running" if process.is_alive() else "stopped"
+        lines.append("Output process " + str(number + 1) + " (" +
+            ", ".join(names) + "): " + state + ", " + str(status["lag"]) +
+            " sample(s) behind, " + str(status["dropped"]) + " dropped")
+    if DISABLEDOUTPUTS:
+        lines.append("Disabled outputs: " + ", ".join(sorted(DISABLEDOUTPUTS)))
+    return lines
+
+def control_outputs(dummy):
+    """Control command: list the output plugins.
+
+    Args:
+        dummy: The words after the command (not used).
+
+    Returns:
+        list The lines of the reply.
+
+    """
+    if OUTPUTPROCESSES:
+        return ["Output process " + str(number + 1) + ": " + ", ".join(names)
+                for number, (dummy, names) in enumerate(OUTPUTPROCESSES)]
+    lines = []
+    for plugin in PLUGINSOUTPUTS:
+        state = "disabled" if plugin.name in DISABLEDOUTPUTS else "enabled"
+        lines.append(plugin.name + ": " + state + ", priority " +
+            str(plugin.params["priority"]))
+    return lines
+
+def control_reload(args):
+    """Control command: reload calibration or limits from supports.cfg.
+
+    Args:
+        args: List of the words after the command.
+
+    Returns:
+        list The lines of the reply.
+
+    """
+    if len(args) != 1 or args[0].lower() not in ["calibration", "limits"]:
+        raise control.ControlError("Use 'reload calibration' or 'reload limits'.")
+    name = args[0].lower()
+    plugin = PLUGINSSUPPORTS.get(name)
+    if not plugin:
+        raise control.ControlError("The " + name + " support plugin wasn't"
+            " enabled when sampling started.")
+    supportconfig = ConfigParser.SafeConfigParser()
+    supportconfig.read(CFGPATHS['supports'])
+    count = plugin.reload(supportconfig)
+    msg = "Reloaded " + name + " from " + CFGPATHS['supports'] + ": "
+    msg += str(count) + " in use."
+    msg = format_msg(msg, 'info')
+    print(msg)
+    logthis("info", msg)
+    lines = [msg.strip()]
+    if OUTPUTPROCESSES and name == "calibration":
+        lines.append("Output processes carry on with the calibration they"
+            " started with.")
+    return lines
+
+def find_output(name):
+    """Find an output plugin which has been set up, by name.
+
+    Args:
+        name: The name of the plugin (not case-sensitive).
+
+    Returns:
+        The plugin, or None if there isn't one with that name.
+
+    """
+    for plugin in PLUGINSOUTPUTS:
+        if plugin.name.lower() == name.lower():
+            return plugin
+    return None
+
+def check_output_args(args):
+    """Check the words after an 'enable' or 'disable' control command.
+
+    Args:
+        args: List of the words after the command.
+
+    Raises:
+        control.ControlError: The command can't be carried out.
+
+    """
+    if len(args) != 1:
+        raise control.ControlError("Give the name of one output plugin.")
+    if OUTPUTPROCESSES:
+        raise control.ControlError("Outputs are running in separate processes"
+            " ('outputprocesses'), so can't be changed while sampling.")
+
+def control_disable(args):
+    """Control command: stop sending samples to an output plugin.
+
+    Anything already in the plugin's queue or batch is still output.
+
+    Args:
+        args: List of the words after the command.
+
+    Returns:
+        list The lines of the reply.
+
+    """
+    global DISABLEDOUTPUTS
+    check_output_args(args)
+    plugin = find_output(args[0])
+    if plugin is None:
+        raise control.ControlError("There is no output plugin called '" +
+            args[0] + "' running.")
+    DISABLEDOUTPUTS = DISABLEDOUTPUTS | set([plugin.name])
+    msg = "Output plugin " + plugin.name + " disabled."
+    msg = format_msg(msg, 'info')
+    print(msg)
+    logthis("info", msg)
+    return [msg.strip()]
+
+def control_trace(dummy):
+    """Control command: write the trace of the slowest samples so far.
+
+    Args:
+        dummy: The words after the command (not used).
+
+    Returns:
+        list The lines of the reply.
+
+    """
+    if TRACER is None:
+        raise control.ControlError("Tracing is switched off; see 'trace'"
+            " in settings.cfg.")
+    filename = TRACER.dump()
+    return ["Trace of the " + str(TRACER.count()) + " slowest sample(s)"
+            " written to " + filename]
+
+def control_enable(args):
+    """Control command: start sending samples to an output plugin.
+
+    If the plugin was disabled using the control socket, it is simply
+    switched back on. Otherwise it is set up from outputs.cfg (where it
+    must be enabled), so that a new output plugin can be added without
+    stopping sampling.
+
+    Args:
+        args: List of the words after the command.
+
+    Returns:
+        list The lines of the reply.
+
+    """
+    global DISABLEDOUTPUTS, PLUGINSOUTPUTS, OUTPUTBATCHES, OUTPUTWORKERS
+    check_output_args(args)
+    plugin = find_output(args[0])
+    if plugin is not None:
+        if plugin.name not in DISABLEDOUTPUTS:
+            raise control.ControlError("Output plugin " + plugin.name +
+                " is already enabled.")
+        DISABLEDOUTPUTS = DISABLEDOUTPUTS - set([plugin.name])
+    else:
+        outputconfig = ConfigParser.SafeConfigParser()
+        outputconfig.read(CFGPATHS['outputs'])
+        names = [name for name in outputconfig.sections()
+                    if name.lower() == args[0].lower()]
+        plugins = set_up_outputs(names, required=False)
+        if not plugins:
+            raise control.ControlError("Could not set up output plugin '" +
+                args[0] + "'; check that it is in outputs.cfg, with"
+                " 'enabled = yes', and see the log.")
+        plugin = plugins[0]
+        output_metadata(plugins, METADATA)
+        batches = dict(OUTPUTBATCHES)
+        batches.update(set_up_output_batches(plugins))
+        OUTPUTBATCHES = batches
+        if SETTINGS['ASYNCOUTPUTS']:
+            workers = dict(OUTPUTWORKERS)
+            workers.update(set_up_output_workers(plugins))
+            OUTPUTWORKERS = workers
+        # The sampling thread may be going through the list
+        PLUGINSOUTPUTS = by_priority(PLUGINSOUTPUTS + plugins)
+    msg = "Output plugin " + plugin.name + " enabled."
+    msg = format_msg(msg, 'info')
+    print(msg)
+    logthis("info", msg)
+    return [msg.strip()]
+
+def start_control():
+    """Start listening for commands on the control socket.
+
+    Returns:
+        control.ControlServer The server, or None if the control socket
+                              is switched off or couldn't be created.
+
+    """
+    path = control_socket_path()
+    if path is None:
+        return None
+    try:
+        server = control.ControlServer(path, control_commands())
+    except EnvironmentError as excep:
+        msg = "Could not create control socket " + path + ": " + str(excep)
+        msg = format_msg(msg, 'warning')
+        print(msg)
+        logthis("info", msg)
+        return None
+    msg = "Listening for commands on " + path
+    msg += " (e.g. 'airpi.py --control stats')."
+    msg = format_msg(msg, 'info')
+    print(msg)
+    logthis("info", msg)
+    return server
+
+def stop_sampling(dummy, _):
+    """Stop a run.
+
+    Stop a run by shutting down the GPS controller, turning off LEDs and
+    then printing a summary of the run statistics. Note that this can be
+    run either programatically because we have completed the requested
+    number of samples, or manually because the user pressed Ctrl+C
+    (KeyboardInterrupt). If it is a KeyboardInterrupt, then the
+    two parameters are passed to this method automatically (see
+    https://docs.python.org/3/library/signal.html#signal.signal). They
+    are not actually used by our code; they're named 'dummy' and '_' so
+    that pylint ignores the fact that we don't ever use them (see Q4.5
+    on http://docs.pylint.org/faq.html)
+
+    """
+    print("")
+    msg = "Sampling stopping..."
+    msg = format_msg(msg, 'sys')
+    print(msg)
+    logthis("info", msg)
+    try:
+        if gpsplugininstance:
+            gpsplugininstance.stopcontroller()
+    except NameError:
+        # If GPS socket isn't set, gpsplugininstance won't exist. It
+        # raises it's own error and quits before here, but quit again
+        # just in case.
+        sys.exit(1)
+    if ledtimer is not None:
+        ledtimer.cancel()
+    if CONTROL is not None:
+        CONTROL.stop()
+    stop_output_workers(10)
+    stop_output_batches()
+    stop_output_processes(10)
+    if PROFILER is not None:
+        report_profile(PROFILER.stop())
+    if TRACER is not None:
+        report_trace(TRACER.dump())
+    report_metrics()
+    led_off(SETTINGS['GREENPIN'])
+    led_off(SETTINGS['REDPIN'])
+    timedelta = datetime.datetime.utcnow() - STARTTIME
+    hours, remainder = divmod(timedelta.seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    msg = "This run lasted " + str(hours) + "h " + str(minutes) + "m "
+    msg += str(seconds)  + "s, and consisted of " + str(samples) + " samples."
+    msg = format_msg(msg, 'sys')
+    print(msg)
+    logthis("info", msg)
+    if SCHEDULER.skipped:
+        msg = str(SCHEDULER.skipped) + " sample(s) were skipped because the"
+        msg += " requested sample frequency is too fast."
+        msg = format_msg(msg, 'sys')
+        print(msg)
+        logthis("info", msg)
+    msg = "Sampling stopped."
+    msg = format_msg(msg, 'sys')
+    print(msg)
+    logthis("info", msg)
     sys.exit(1)
 
 if __name__ == '__main__':
     # Set up and execute an AirPi sampling run.
 
+    STARTUPPHASES = []
+    PHASESTARTED = next_phase(STARTUPPHASES, "imports", IMPORTSTARTED)
+    PLUGINCLASSES = {}
+    PLUGINIMPORTS = {}
+    PLUGININITS = {}
+    ARGS = get_args()
     CFGPATHS = set_cfg_paths()
+    if ARGS.control:
+        sys.exit(send_control(" ".join(ARGS.control)))
 
     LOGGER = set_up_logger()
-    # For debugging / logging, preferably set "debug" to "yes" in
-    # the cfg/settings.cfg file. Alternatively, uncomment below:
-    #logging.basicConfig(level=logging.DEBUG)
+    # For debugging / logging, set "debug" to "yes" in the
+    # cfg/settings.cfg file.
 
 
     #Set variables
     gpsplugininstance = None
+    ledtimer = None
+    REPORTREQUESTED = False
     SETTINGS = set_settings()
+    if ARGS.profile is not None:
+        SETTINGS['PROFILE'] = ARGS.profile > 0
+        SETTINGS['PROFILETICKS'] = ARGS.profile
+    if ARGS.trace is not None:
+        SETTINGS['TRACE'] = ARGS.trace > 0
+        SETTINGS['TRACETICKS'] = ARGS.trace
+    if simulation.ACTIVE:
+        msg = "Simulating AirPi hardware (see cfg/simulation.cfg)."
+        msg = format_msg(msg, 'info')
+        print(msg)
+        logthis("info", msg)
+    PROFILER = None
+    if SETTINGS['PROFILE']:
+        PROFILER = profiler.Profiler(os.path.dirname(CFGPATHS['log']),
+                        SETTINGS['PROFILETICKS'])
+        msg = "Profiling setup and the first "
+        msg += str(SETTINGS['PROFILETICKS']) + " samples."
+        msg = format_msg(msg, 'info')
+        print(msg)
+        logthis("info", msg)
+        PROFILER.start("setup")
+    TRACER = None
+    if SETTINGS['TRACE']:
+        TRACER = tracer.Tracer(os.path.dirname(CFGPATHS['log']),
+                    SETTINGS['TRACETICKS'])
+        metrics.REGISTRY.tracer = TRACER
+        msg = "Tracing the slowest " + str(SETTINGS['TRACETICKS'])
+        msg += " samples."
+        msg = format_msg(msg, 'info')
+        print(msg)
+        logthis("info", msg)
+    SCHEDULER = scheduler.TickScheduler(SETTINGS['SAMPLEFREQ'])
     notificationsMade = {}
     samples = 0
     STARTTIME = datetime.datetime.utcnow()
+    PHASESTARTED = next_phase(STARTUPPHASES, "settings", PHASESTARTED)
 
-    # Add Git commit ref to debug output
-    p1 = subprocess.Popen(["git", "log"], stdout=subprocess.PIPE)
-    p2 = subprocess.Popen(["head", "-1"], stdin=p1.stdout, stdout=subprocess.PIPE)
-    p1.stdout.close()  # Allow p1 to receive a SIGPIPE if p2 exits.
-    commit,err = p2.communicate()
-    logthis('debug', "Git " + commit)
-    for theprocess in [p1, p2]:
-        if theprocess.stdin:
-            theprocess.stdin.close()
-        if theprocess.stdout:
-            theprocess.stdout.close()
-        if theprocess.stderr:
-            theprocess.stderr.close()
-        try:
-            theprocess.kill()
-        except OSError:
-            # can't kill a dead proc
-            pass
+    # Add Git commit ref to debug output (in the background, because it
+    # can take a while on a Raspberry Pi)
+    GITTHREAD = threading.Thread(target=log_git_commit)
+    GITTHREAD.daemon = True
+    GITTHREAD.start()
 
     #Set up plugins
     PLUGINSSUPPORTS = set_up_supports()
-    PLUGINSSENSORS = set_up_sensors()
-    PLUGINSOUTPUTS = set_up_outputs()
+    PHASESTARTED = next_phase(STARTUPPHASES, "supports", PHASESTARTED)
+    if ARGS.replay:
+        # Replayed samples don't come from the sensors
+        PLUGINSSENSORS = []
+    else:
+        PLUGINSSENSORS = set_up_sensors()
+    PHASESTARTED = next_phase(STARTUPPHASES, "sensors", PHASESTARTED)
+    SENSORSCHEDULE = scheduler.SensorSchedule(
+                        [plugin.interval for plugin in PLUGINSSENSORS],
+                        SETTINGS['SAMPLEFREQ'])
+    FRAMESCHEMA = sampleframe.FrameSchema(PLUGINSSENSORS, [gpsplugininstance])
+    SENSORPOOL = None
+    if SETTINGS['PARALLELREADS']:
+        SENSORPOOL = sensorpool.SensorPool(PLUGINSSENSORS,
+                        SETTINGS['READTHREADS'])
+        msg = "Reading sensors in parallel using " + str(len(SENSORPOOL.workers))
+        msg += " thread(s) for bus group(s): "
+        msg += ", ".join([str(bus) for bus in SENSORPOOL.buses])
+        msg = format_msg(msg, 'info')
+        print(msg)
+        logthis("info", msg)
+    if SETTINGS['HISTORYSIZE'] > 0:
+        history.STORE = history.History(FRAMESCHEMA, SETTINGS['HISTORYSIZE'])
+    OUTPUTRING = None
+    OUTPUTPROCESSES = []
+    DISABLEDOUTPUTS = frozenset()
+    CONTROL = None
+    if SETTINGS['OUTPUTPROCESSES'] > 0 and (ARGS.replay or
+            'AVERAGEFREQ' in SETTINGS):
+        msg = "Output processes can't be used with averaging or replay;"
+        msg += " running outputs in this process instead."
+        msg = format_msg(msg, 'warning')
+        print(msg)
+        logthis("info", msg)
+    elif SETTINGS['OUTPUTPROCESSES'] > 0:
+        # The output processes set up their own plugins
+        OUTPUTRING, OUTPUTPROCESSES = start_output_processes(
+                                        SETTINGS['OUTPUTPROCESSES'])
+        # Each output process keeps its own history
+        history.STORE = None
+    if OUTPUTRING is None:
+        PLUGINSOUTPUTS = set_up_outputs()
+    else:
+        PLUGINSOUTPUTS = []
+    PHASESTARTED = next_phase(STARTUPPHASES, "outputs", PHASESTARTED)
     PLUGINSNOTIFICATIONS = set_up_notifications()
+    PHASESTARTED = next_phase(STARTUPPHASES, "notifications", PHASESTARTED)
 
     # Set up metadata
     METADATA = set_metadata()
-    if any_plugins_enabled(PLUGINSOUTPUTS, 'output'):
+    if OUTPUTRING is None and any_plugins_enabled(PLUGINSOUTPUTS, 'output'):
         output_metadata(PLUGINSOUTPUTS, METADATA)
 
+    OUTPUTBATCHES = set_up_output_batches(PLUGINSOUTPUTS)
+    OUTPUTWORKERS = {}
+    if SETTINGS['ASYNCOUTPUTS']:
+        OUTPUTWORKERS = set_up_output_workers(PLUGINSOUTPUTS)
+
     led_setup(SETTINGS['REDPIN'], SETTINGS['GREENPIN'])
 
     # Register the Ctrl+C signal handler
     signal.signal(signal.SIGINT, stop_sampling)
+    # Print a report of timings on demand
+    signal.signal(signal.SIGUSR1, request_report)
+
+    PHASESTARTED = next_phase(STARTUPPHASES, "other", PHASESTARTED)
+
+    if PROFILER is not None:
+        report_profile(PROFILER.stop())
 
     print("==========================================================")
     print(format_msg("Setup complete.", 'success'))
+    report_startup(STARTUPPHASES)
+    CONTROL = start_control()
 
     # Do Help
     if SETTINGS["HELP"]:
         print("==========================================================")
         print(format_msg("HELP", 'loading'))
         print(format_msg("Your sensors are named as follows:", "help"))
-        for sensor in PLUGINSSENSORS:
-            print("         " + sensor.get_sensor_name())
-        for output in PLUGINSOUTPUTS:
-            if callable(getattr(output, "get_help", None)):
-                print(format_msg(output.get_help(), "help"))
-
-    # Wait until the start of the next minute
-    if SETTINGS["WAITTOSTART"]:
-        delay_start()
+        # (Not 'sensor' and 'output', which would hide the modules of
+        # the same name, still needed to set up plugins later on)
+        for sensorplugin in PLUGINSSENSORS:
+            print("         " + sensorplugin.get_sensor_name())
+        for outputplugin in PLUGINSOUTPUTS:
+            if callable(getattr(outputplugin, "get_help", None)):
+                print(format_msg(outputplugin.get_help(), "help"))
+
+    if ARGS.replay:
+        replay_log(ARGS.replay, ARGS.replay_speed)
+    else:
+        # Wait until the start of the next minute
+        if SETTINGS["WAITTOSTART"]:
+            delay_start()
 
-    if SETTINGS['DUMMYDURATION'] != 0:
-        dummy_runs(SETTINGS['DUMMYDURATION'])
+        if SETTINGS['DUMMYDURATION'] != 0:
+            dummy_runs(SETTINGS['DUMMYDURATION'])
 
-    # Sample!
-    sample()
+        # Sample!
+        sample()
@@ -70,6 +70,19 @@ case $1 in
             echo "[AirPi] Status: Not currently sampling."
         fi
         ;;
+    stats)
+        if `ps aux | grep -v "grep" | grep -q "sudo.*airpi.py"`; then
+            echo "[AirPi] Asking AirPi for timings so far."
+            echo "[AirPi] They will appear in the screen output and in the log at the next sample."
+            kill -USR1 `ps aux | grep -v "grep" | grep "sudo.*airpi.py" | awk '{print $2}'`
+        else
+            echo "[AirPi] Could not find any running processes."
+        fi
+        ;;
+    ctl)
+        shift
+        sudo python $DIR/airpi.py --control "$@"
+        ;;
     ver|version)
         # Can't do this directly because the line breaks are lost
         VER=`git log | head -3`
@@ -97,6 +110,9 @@ case $1 in
         echo "[AirPi] airpictl.sh unatt   <- Unattended; continues even after you log out."
         echo "[AirPi] airpictl.sh status  <- Shows whether AirPi is currently sampling or not."
         echo "[AirPi] sudo ./airpictl.sh stop  <- Stops any existing run."
+        echo "[AirPi] sudo ./airpictl.sh stats <- Shows timings for the current run."
+        echo "[AirPi] sudo ./airpictl.sh ctl help <- Lists commands for the current run"
+        echo "        (live stats, reload calibration or limits, enable or disable outputs)."
         echo "[AirPi] airpictl.sh ver     <- Show current version and upgrade instructions."
         ;;
 esac
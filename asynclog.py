@@ -0,0 +1,181 @@
+"""Write log messages on a background thread.
+
+Writing to the log file means a synchronous write to the SD card, which
+can take a long and unpredictable time on a Raspberry Pi, and rotating
+the file takes longer still. Logging is done from the sampling thread
+on every tick, so that time would be added to each sample.
+Instead, a QueueHandler is attached to the logger. It just puts each
+record on a queue, and a QueueListener thread takes records off the
+queue and passes them to the real handlers (e.g. the rotating log
+file). The sampling thread never waits for the disk: if the writer
+falls so far behind that the queue fills up, new records are dropped
+(and counted) rather than blocking.
+
+Python 3 has these classes in logging.handlers; these are simplified
+versions for Python 2.
+
+"""
+
+import logging
+import threading
+import Queue
+
+class QueueHandler(logging.Handler):
+    """Logging handler which puts records on a queue.
+
+    """
+
+    def __init__(self, queue):
+        """Initialise.
+
+        Args:
+            self: self.
+            queue: The Queue.Queue on which records should be put.
+
+        """
+        logging.Handler.__init__(self)
+        self.queue = queue
+        self.dropped = 0
+
+    def prepare(self, record):
+        """Get a record ready to be put on the queue.
+
+        The message is merged with its arguments here, on the thread
+        which logged it, in case the arguments change before the record
+        is written. This is only done for records which are actually
+        going to be written; debug messages cost nothing when the logger
+        is set to a higher level.
+
+        Args:
+            self: self.
+            record: The LogRecord.
+
+        Returns:
+            LogRecord The prepared record.
+
+        """
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks can't safely be kept until the writer gets to them
+            record.exc_text = logging.Formatter().formatException(
+                                record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        """Put a record on the queue, without waiting.
+
+        Args:
+            self: self.
+            record: The LogRecord.
+
+        """
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except Queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+class QueueListener(object):
+    """Take records off a queue and pass them to handlers, on a
+    background thread.
+
+    """
+
+    def __init__(self, queue, handlers, source=None):
+        """Initialise.
+
+        Args:
+            self: self.
+            queue: The Queue.Queue from which records should be taken.
+            handlers: List of handlers to which records should be passed.
+            source: The QueueHandler putting records on the queue, so that
+                    dropped records can be reported.
+
+        """
+        self.queue = queue
+        self.handlers = handlers
+        self.source = source
+        self.reported = 0
+        self.thread = None
+
+    def start(self):
+        """Start the background thread.
+
+        Args:
+            self: self.
+
+        """
+        self.thread = threading.Thread(target=self.work)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def work(self):
+        """Pass records on to the handlers until stopped.
+
+        Run by the background thread. A None on the queue means stop.
+
+        Args:
+            self: self.
+
+        """
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            self.report_dropped(record)
+            self.handle(record)
+
+    def handle(self, record):
+        """Pass a record to each of the handlers.
+
+        Args:
+            self: self.
+            record: The LogRecord.
+
+        """
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def report_dropped(self, record):
+        """Log a warning if any records have been dropped since the last
+        warning.
+
+        Args:
+            self: self.
+            record: The LogRecord which has just been taken off the queue
+                    (used for the logger name of the warning).
+
+        """
+        if self.source is None:
+            return
+        dropped = self.source.dropped
+        if dropped > self.reported:
+            msg = "  WARNING: " + str(dropped - self.reported)
+            msg += " log message(s) dropped because the log file couldn't"
+            msg += " keep up."
+            self.reported = dropped
+            self.handle(logging.LogRecord(record.name, logging.WARNING,
+                            __file__, 0, msg, None, None))
+
+    def stop(self, timeout=5):
+        """Write everything still on the queue, then stop the thread.
+
+        Args:
+            self: self.
+            timeout: How long to wait for the queue to be written (seconds).
+
+        """
+        if self.thread is None:
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except Queue.Full:
+            pass
+        self.thread.join(timeout)
+        self.thread = None
+        for handler in self.handlers:
+            handler.flush()
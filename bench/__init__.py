@@ -0,0 +1,16 @@
+"""Benchmark the AirPi sampling pipeline.
+
+Run the real sampling loop in airpi.py (sensor reads, limits,
+calibration, averaging and output plugins) against simulated hardware
+(see the 'simulation' package), for a range of scenarios: different
+numbers of sensors, mixes of output plugins, and with calibration and
+limits on or off. Each scenario reports sustained ticks per second,
+per-tick latency percentiles, allocations per tick and peak memory use
+as JSON, so that results from before and after a change can be
+compared.
+
+- run.py runs a set of scenarios and writes the results.
+- scenario.py runs one scenario (in its own process).
+- compare.py compares two sets of results.
+
+"""
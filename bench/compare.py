@@ -0,0 +1,86 @@
+"""Compare two sets of AirPi benchmark results.
+
+Compare the headline numbers for each scenario which appears in both
+sets of results (as written by run.py), e.g. from before and after a
+change:
+    python -m bench.compare before.json after.json
+Changes which are worse by more than the threshold (5% by default) are
+marked as regressions, and the exit status is 1 if there are any, so
+this can be used to fail a CI job.
+
+"""
+
+import argparse
+import json
+import sys
+
+# The numbers to compare: (label, how to get it, whether higher is better)
+METRICS = [
+    ("ticks/s", lambda result: result["ticks_per_second"], True),
+    ("p50 ms", lambda result: result["latency_ms"]["p50"], False),
+    ("p95 ms", lambda result: result["latency_ms"]["p95"], False),
+    ("p99 ms", lambda result: result["latency_ms"]["p99"], False),
+    ("allocs/tick", lambda result: result["allocations_per_tick"], False),
+    ("peak RSS kB", lambda result: result["peak_rss_kb"], False),
+]
+
+def compare(before, after, threshold):
+    """Compare two sets of results.
+
+    Args:
+        before: dict The results to compare against.
+        after: dict The new results.
+        threshold: How much worse (percent) a number must be to count as
+                   a regression.
+
+    Returns:
+        tuple Lines of the report (list), and the number of regressions.
+
+    """
+    old = dict((result["name"], result) for result in before["results"])
+    lines = []
+    regressions = 0
+    for result in after["results"]:
+        if result["name"] not in old:
+            lines.append(result["name"] + ": not in the earlier results")
+            continue
+        lines.append(result["name"])
+        for label, get, higherbetter in METRICS:
+            was, now = get(old[result["name"]]), get(result)
+            if was is None or now is None:
+                continue
+            if was:
+                change = (now - was) * 100.0 / was
+            else:
+                change = 0.0 if now == was else float("inf")
+            worse = -change if higherbetter else change
+            flag = ""
+            if worse > threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            lines.append("    %-12s %12.2f -> %12.2f  %+7.1f%%%s" % (label,
+                was, now, change, flag))
+    return lines, regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two sets of"
+        " AirPi benchmark results.")
+    parser.add_argument("before", help="results to compare against")
+    parser.add_argument("after", help="new results")
+    parser.add_argument("--threshold", type=float, default=5.0,
+        help="percentage change which counts as a regression (default: 5)")
+    args = parser.parse_args()
+    with open(args.before) as beforefile:
+        before = json.load(beforefile)
+    with open(args.after) as afterfile:
+        after = json.load(afterfile)
+    lines, regressions = compare(before, after, args.threshold)
+    print("Before: %s (%s)" % (before.get("commit"), before.get("created")))
+    print("After:  %s (%s)" % (after.get("commit"), after.get("created")))
+    for line in lines:
+        print(line)
+    print(str(regressions) + " regression(s)")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Run a set of AirPi benchmark scenarios.
+
+Run every combination of the requested sensor counts, output mixes,
+calibration and limits settings, each in its own process (see
+scenario.py), and write all of the results to one JSON file. A short
+summary of each scenario is printed as it finishes. For example:
+    python -m bench.run --sensors 8,64,500 --outputs Print \\
+        --outputs CSVOutput,JSONOutput --calibration both \\
+        --result before.json
+Results from two runs can be compared using compare.py.
+
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import scenario
+
+REPODIR = scenario.REPODIR
+
+def onoff(value):
+    """Turn an on/off/both option into the list of settings to try.
+
+    Args:
+        value: string 'on', 'off' or 'both'.
+
+    Returns:
+        list The settings (booleans).
+
+    """
+    return {"on": [True], "off": [False], "both": [False, True]}[value]
+
+def get_args():
+    """Get command line arguments.
+
+    Returns:
+        argparse.Namespace The arguments.
+
+    """
+    parser = argparse.ArgumentParser(description="Run AirPi benchmark"
+        " scenarios.")
+    parser.add_argument("--sensors", default="8,64,500",
+        help="comma-separated numbers of virtual analogue sensors"
+            " (default: 8,64,500)")
+    parser.add_argument("--outputs", action="append",
+        help="comma-separated output plugins (sections of outputs.cfg) to"
+            " run together; give more than once to try several mixes"
+            " (default: Print)")
+    parser.add_argument("--calibration", choices=["on", "off", "both"],
+        default="off", help="run with calibration on, off or both")
+    parser.add_argument("--limits", choices=["on", "off", "both"],
+        default="off", help="run with limits on, off or both")
+    parser.add_argument("--set", action="append", default=[],
+        metavar="SECTION.OPTION=VALUE",
+        help="change an option in settings.cfg for every scenario, e.g."
+            " Sampling.asyncoutputs=yes")
+    parser.add_argument("--ticks", type=int,
+        default=scenario.DEFAULTS["ticks"],
+        help="number of ticks to measure in each scenario")
+    parser.add_argument("--warmup", type=int,
+        default=scenario.DEFAULTS["warmup"],
+        help="number of ticks to run before measuring")
+    parser.add_argument("--result", help="file to write the results to"
+        " (standard output by default)")
+    parser.add_argument("--keep", action="store_true",
+        help="keep each scenario's scratch directory (including the"
+            " output from airpi.py)")
+    return parser.parse_args()
+
+def scenarios(args):
+    """Get every scenario to be run.
+
+    Args:
+        args: argparse.Namespace The command line arguments.
+
+    Returns:
+        list The scenarios (dicts).
+
+    """
+    settings = dict(option.split("=", 1) for option in args.set)
+    mixes = [[name for name in mix.split(",") if name]
+                for mix in (args.outputs or ["Print"])]
+    found = []
+    for sensors, outputs, calibration, limits in itertools.product(
+            [int(count) for count in args.sensors.split(",")], mixes,
+            onoff(args.calibration), onoff(args.limits)):
+        params = dict(scenario.DEFAULTS, sensors=sensors, outputs=outputs,
+            calibration=calibration, limits=limits, ticks=args.ticks,
+            warmup=args.warmup, settings=settings)
+        found.append(params)
+    return found
+
+def run_one(params, keep=False):
+    """Run a scenario in a separate process.
+
+    Args:
+        params: dict The scenario.
+        keep: Whether to keep the scratch directory afterwards.
+
+    Returns:
+        dict The results.
+
+    """
+    workdir = tempfile.mkdtemp(prefix="airpi-bench-")
+    resultpath = os.path.join(workdir, "result.json")
+    try:
+        code = subprocess.call([sys.executable, "-m", "bench.scenario",
+                    "--params", json.dumps(params), "--workdir", workdir,
+                    "--result", resultpath], cwd=REPODIR)
+        if code != 0 or not os.path.exists(resultpath):
+            msg = "Scenario failed: " + scenario.describe(params)
+            msg += " (see " + os.path.join(workdir, "airpi.out") + ")"
+            keep = True
+            raise RuntimeError(msg)
+        with open(resultpath) as resultfile:
+            return json.load(resultfile)
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+def get_commit():
+    """Get the git commit being benchmarked.
+
+    Returns:
+        string The (short) commit hash, or None if it isn't available.
+
+    """
+    try:
+        with open(os.devnull, "w") as devnull:
+            return subprocess.check_output(["git", "rev-parse", "--short",
+                        "HEAD"], cwd=REPODIR, stderr=devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    args = get_args()
+    results = []
+    for params in scenarios(args):
+        result = run_one(params, args.keep)
+        results.append(result)
+        sys.stderr.write("%s: %.1f ticks/s, p50 %.2fms, p99 %.2fms, "
+            "%.1f allocations/tick, peak RSS %d kB\n" % (result["name"],
+            result["ticks_per_second"], result["latency_ms"]["p50"],
+            result["latency_ms"]["p99"], result["allocations_per_tick"],
+            result["peak_rss_kb"]))
+    report = json.dumps({
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "results": results,
+    }, sort_keys=True, indent=2,
+        separators=(",", ": "))
+    if args.result:
+        with open(args.result, "w") as resultfile:
+            resultfile.write(report + "\n")
+    else:
+        print(report)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,403 @@
+"""Run one AirPi benchmark scenario.
+
+Set up a scratch AirPi directory (cfg, log and output directories) for
+the scenario, then run the real airpi.py in it, against simulated
+hardware, for a fixed number of ticks. Every tick is timed as it
+finishes, and the results are written as JSON.
+
+This is normally run by run.py, in a separate process for each scenario
+so that scenarios can't affect each other (or each other's peak memory
+use), but it can be run directly too:
+    python -m bench.scenario --sensors 64 --outputs Print,CSVOutput
+
+"""
+
+import argparse
+import ConfigParser
+import gc
+import json
+import os
+import resource
+import runpy
+import sys
+import tempfile
+
+REPODIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AIRPI = os.path.join(REPODIR, "airpi.py")
+
+# Default scenario
+DEFAULTS = {
+    "sensors": 8,
+    "outputs": ["Print"],
+    "calibration": False,
+    "limits": False,
+    "ticks": 200,
+    "warmup": 10,
+    "period": 0.0001,
+    "settings": {},
+}
+
+# Virtual sensors are copies of these analogue sensors from sensors.cfg,
+# spread across the eight ADC channels.
+TEMPLATES = ["LDR", "TGS2600", "MiCS-2710", "MiCS-5525", "Microphone"]
+
+# Calibration functions and limits for each measurement
+CALIBRATIONS = {
+    "Light_Level": "math.exp((math.log(x/1000)-4.125)/-0.6704),Lux",
+    "Air_Quality": "x*(0.024+0.0072*2+0.0246*2),Corrected Ohms",
+    "Nitrogen_Dioxide": "(-4*math.pow(10,(-17*(x*x))))+math.pow(10,(-8*x))+0.2015,ppm-uncalibrated",
+    "Carbon_Monoxide": "(969.6*(math.exp(-8.761*(x/999999999)))),pseudo-ppm",
+    "Volume": "x/1000,V",
+}
+LIMITS = {
+    "Light_Level": "10000,Ohms",
+    "Air_Quality": "70000,Ohms",
+    "Nitrogen_Dioxide": "25000,Ohms",
+    "Carbon_Monoxide": "55000,Ohms",
+    "Volume": "600,millvolts",
+}
+
+def describe(params):
+    """Get a short, unique name for a scenario.
+
+    Args:
+        params: dict The scenario.
+
+    Returns:
+        string The name.
+
+    """
+    name = "sensors=%d outputs=%s calibration=%s limits=%s" % (
+        params["sensors"], "+".join(params["outputs"]) or "none",
+        "on" if params["calibration"] else "off",
+        "on" if params["limits"] else "off")
+    for option, value in sorted(params["settings"].items()):
+        name += " %s=%s" % (option, value)
+    return name
+
+def load(filename):
+    """Load one of the standard cfg files.
+
+    Args:
+        filename: The name of the file in the cfg directory.
+
+    Returns:
+        RawConfigParser The contents of the file.
+
+    """
+    config = ConfigParser.RawConfigParser()
+    config.read(os.path.join(REPODIR, "cfg", filename))
+    return config
+
+def write_config(workdir, params):
+    """Write the cfg files for a scenario.
+
+    Start from the standard cfg files, then change whatever the scenario
+    needs: sample as quickly as possible, for a fixed number of ticks,
+    with simulated hardware, the requested number of virtual sensors,
+    outputs, calibration and limits.
+
+    Args:
+        workdir: The scratch AirPi directory.
+        params: dict The scenario.
+
+    """
+    cfgdir = os.path.join(workdir, "cfg")
+    outdir = os.path.join(workdir, "out")
+    for directory in [cfgdir, outdir, os.path.join(workdir, "log")]:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    settings = load("settings.cfg")
+    settings.set("Sampling", "samplefreq", str(params["period"]))
+    settings.set("Sampling", "stopafter",
+                str(params["warmup"] + params["ticks"]))
+    settings.set("Sampling", "averagefreq", "0")
+    settings.set("Sampling", "dummyduration", "0")
+    settings.set("Misc", "bootstart", "off")
+    settings.set("Misc", "help", "no")
+    settings.set("Debug", "debug", "no")
+    settings.set("Debug", "waittostart", "no")
+    settings.set("Debug", "profile", "no")
+    settings.set("Debug", "simulate", "yes")
+    for option, value in params["settings"].items():
+        section, option = option.split(".", 1)
+        settings.set(section, option, str(value))
+
+    sensors = ConfigParser.RawConfigParser()
+    templates = load("sensors.cfg")
+    sensors.add_section("MCP3008")
+    sensors.set("MCP3008", "filename", "mcp3008")
+    sensors.set("MCP3008", "enabled", "yes")
+    for index in range(params["sensors"]):
+        template = TEMPLATES[index % len(TEMPLATES)]
+        section = "Bench-" + str(index)
+        sensors.add_section(section)
+        for option, value in templates.items(template):
+            sensors.set(section, option, value)
+        sensors.set(section, "enabled", "yes")
+        sensors.set(section, "sensorname", section)
+        sensors.set(section, "adcpin", str(index % 8))
+
+    outputs = load("outputs.cfg")
+    for section in outputs.sections():
+        if not outputs.has_option(section, "enabled"):
+            continue
+        enabled = section in params["outputs"]
+        outputs.set(section, "enabled", "yes" if enabled else "no")
+        if enabled:
+            outputs.set(section, "calibration",
+                        "on" if params["calibration"] else "off")
+            outputs.set(section, "limits",
+                        "on" if params["limits"] else "off")
+            if outputs.has_option(section, "outputdir"):
+                outputs.set(section, "outputdir", outdir)
+
+    supports = ConfigParser.RawConfigParser()
+    supports.add_section("Calibration")
+    supports.set("Calibration", "filename", "calibration")
+    supports.set("Calibration", "enabled",
+                "yes" if params["calibration"] else "no")
+    for name, function in CALIBRATIONS.items():
+        supports.set("Calibration", "func_" + name, function)
+    supports.add_section("Limits")
+    supports.set("Limits", "filename", "limits")
+    supports.set("Limits", "enabled", "yes" if params["limits"] else "no")
+    for name, limit in LIMITS.items():
+        supports.set("Limits", "limit_" + name, limit)
+
+    configs = {"settings.cfg": settings, "sensors.cfg": sensors,
+                "outputs.cfg": outputs, "supports.cfg": supports,
+                "notifications.cfg": load("notifications.cfg"),
+                "simulation.cfg": load("simulation.cfg")}
+    for notification in configs["notifications.cfg"].sections():
+        if configs["notifications.cfg"].has_option(notification, "enabled"):
+            configs["notifications.cfg"].set(notification, "enabled", "no")
+    for filename, config in configs.items():
+        with open(os.path.join(cfgdir, filename), "w") as cfgfile:
+            config.write(cfgfile)
+
+class Recorder(object):
+    """Record the end of every tick of the sampling loop.
+
+    Hooks into metrics.REGISTRY, which the sampling loop tells about
+    each tick as it finishes, to record the time taken by the tick, when
+    it finished and how much had been allocated by then.
+    Allocations are measured using tracemalloc (bytes) if it is
+    available, or the garbage collector's count of container objects
+    if not. Either way, they are net allocations: what was allocated
+    during the tick and not freed by the end of it (i.e. garbage in
+    reference cycles, or anything the tick holds on to). To count
+    objects, automatic garbage collection is switched off and a
+    collection is run after each tick instead; the time this takes
+    isn't counted.
+
+    """
+
+    def __init__(self, registry, clock):
+        """Initialise.
+
+        Args:
+            self: self.
+            registry: metrics.Registry used by the sampling loop.
+            clock: Function returning the (monotonic) time.
+
+        """
+        self.registry = registry
+        self.clock = clock
+        self.latencies = []
+        self.finishes = []
+        self.allocations = []
+        self.paused = 0.0
+        try:
+            import tracemalloc
+            tracemalloc.start()
+            self.allocmethod = "tracemalloc (bytes)"
+            self.allocated = lambda: tracemalloc.get_traced_memory()[0]
+        except ImportError:
+            self.allocmethod = "gc (objects)"
+            self.allocated = lambda: gc.get_count()[0]
+            gc.disable()
+        self.observe = registry.observe
+        registry.observe = self.hook
+
+    def hook(self, name, seconds):
+        """Pass a timing on to the registry, recording it if it's a tick.
+
+        Args:
+            self: self.
+            name: The name of the histogram.
+            seconds: The timing.
+
+        """
+        self.observe(name, seconds)
+        if name == "tick":
+            finish = self.clock()
+            self.finishes.append(finish - self.paused)
+            self.latencies.append(seconds)
+            self.allocations.append(self.allocated())
+            if not gc.isenabled():
+                gc.collect()
+                self.paused += self.clock() - finish
+
+def percentile(ordered, percent):
+    """Get a percentile (by the nearest-rank method).
+
+    Args:
+        ordered: Sorted list of values.
+        percent: The percentile required (0 to 100).
+
+    Returns:
+        The value.
+
+    """
+    rank = int(round(percent / 100.0 * len(ordered) + 0.5)) - 1
+    return ordered[max(0, min(len(ordered) - 1, rank))]
+
+def summarise(params, recorder, registry):
+    """Work out the results of a scenario.
+
+    Args:
+        params: dict The scenario.
+        recorder: Recorder which watched the run.
+        registry: metrics.Registry used by the run.
+
+    Returns:
+        dict The results.
+
+    """
+    warmup = params["warmup"]
+    latencies = sorted(recorder.latencies[warmup:])
+    if len(latencies) < 2:
+        raise RuntimeError("Only " + str(len(recorder.latencies)) +
+                            " ticks were run")
+    elapsed = recorder.finishes[-1] - recorder.finishes[warmup - 1]
+    if recorder.allocmethod.startswith("gc"):
+        # The count goes back to zero after each collection
+        deltas = recorder.allocations[warmup:]
+    else:
+        allocations = recorder.allocations[warmup - 1:]
+        deltas = [after - before
+                    for before, after in zip(allocations, allocations[1:])]
+    timings = {}
+    for name, hist in registry.histograms.items():
+        if hist.count:
+            timings[name] = {"count": hist.count,
+                             "mean_ms": hist.mean() * 1000,
+                             "max_ms": hist.maximum * 1000}
+    return {
+        "name": describe(params),
+        "params": params,
+        "ticks": len(latencies),
+        "elapsed_s": elapsed,
+        "ticks_per_second": len(latencies) / elapsed,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) * 1000,
+            "p50": percentile(latencies, 50) * 1000,
+            "p90": percentile(latencies, 90) * 1000,
+            "p95": percentile(latencies, 95) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": latencies[-1] * 1000,
+        },
+        "allocations_per_tick": float(sum(deltas)) / len(deltas),
+        "allocation_method": recorder.allocmethod,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "timings": timings,
+    }
+
+def run(params, workdir):
+    """Run a scenario in this process.
+
+    The output from airpi.py goes to 'airpi.out' in the scratch
+    directory, so that it doesn't get mixed up with the results.
+
+    Args:
+        params: dict The scenario.
+        workdir: The scratch AirPi directory.
+
+    Returns:
+        dict The results.
+
+    """
+    write_config(workdir, params)
+    # airpi.py finds its plugins relative to sys.path[0], and its cfg
+    # files relative to the current directory
+    sys.path[0] = REPODIR
+    os.chdir(workdir)
+    os.environ["AIRPI_SIMULATE"] = "1"
+    sys.argv = [AIRPI]
+    import metrics
+    import scheduler
+    recorder = Recorder(metrics.REGISTRY, scheduler.monotonic)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    log = os.open(os.path.join(workdir, "airpi.out"),
+                os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    os.dup2(log, 1)
+    os.dup2(log, 2)
+    try:
+        runpy.run_path(AIRPI, run_name="__main__")
+    except SystemExit:
+        # airpi.py always exits once it has done 'stopafter' samples
+        pass
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+        os.close(log)
+    return summarise(params, recorder, metrics.REGISTRY)
+
+def get_args():
+    """Get command line arguments.
+
+    Returns:
+        argparse.Namespace The arguments.
+
+    """
+    parser = argparse.ArgumentParser(description="Run one AirPi benchmark"
+        " scenario.")
+    parser.add_argument("--params", help="the scenario, as JSON (as used by"
+        " run.py); overrides the other scenario options")
+    parser.add_argument("--sensors", type=int, default=DEFAULTS["sensors"],
+        help="number of virtual analogue sensors")
+    parser.add_argument("--outputs", default=",".join(DEFAULTS["outputs"]),
+        help="comma-separated output plugins (sections of outputs.cfg)")
+    parser.add_argument("--calibration", action="store_true",
+        help="switch calibration on")
+    parser.add_argument("--limits", action="store_true",
+        help="switch limits on")
+    parser.add_argument("--ticks", type=int, default=DEFAULTS["ticks"],
+        help="number of ticks to measure")
+    parser.add_argument("--warmup", type=int, default=DEFAULTS["warmup"],
+        help="number of ticks to run before measuring")
+    parser.add_argument("--workdir", help="scratch AirPi directory (a new"
+        " temporary directory by default)")
+    parser.add_argument("--result", help="file to write the results to"
+        " (standard output by default)")
+    return parser.parse_args()
+
+def main():
+    args = get_args()
+    if args.params:
+        params = dict(DEFAULTS)
+        params.update(json.loads(args.params))
+    else:
+        params = dict(DEFAULTS, sensors=args.sensors,
+            outputs=[name for name in args.outputs.split(",") if name],
+            calibration=args.calibration, limits=args.limits,
+            ticks=args.ticks, warmup=args.warmup)
+    params["warmup"] = max(1, params["warmup"])
+    workdir = args.workdir or tempfile.mkdtemp(prefix="airpi-bench-")
+    result = json.dumps(run(params, workdir), sort_keys=True, indent=2,
+        separators=(",", ": "))
+    if args.result:
+        with open(args.result, "w") as resultfile:
+            resultfile.write(result + "\n")
+    else:
+        print(result)
+
+if __name__ == '__main__':
+    main()
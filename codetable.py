@@ -0,0 +1,145 @@
+"""Look up the values of analogue readings from their ADC codes.
+
+The MCP3008 ADC gives one of only 1024 codes, so rather than work out
+the voltage and resistance of an analogue sensor for every reading, each
+Analogue sensor converts every possible code once, into a CodeTable, and
+each reading is then just a lookup. The table is registered in TABLES
+under the sensor's name, along with the code of its latest reading, so
+that the Calibration support can look up calibrated values in the same
+way: the calibration function is applied to every entry in the table
+(the first time it is needed, and again whenever the calibration
+functions are reloaded) instead of to every reading.
+Oversampled readings can fall between two codes; their values (and
+calibrated values) are interpolated between the entries for the codes
+either side. The conversions are smooth enough that the error this
+adds is always much smaller than the difference one code makes.
+Readings which didn't come from the table (e.g. averaged ones), and
+calibration functions which depend on other readings (i.e. which use
+findval()), are calibrated as usual.
+
+"""
+
+from array import array
+from math import isnan
+
+# Number of codes the ADC can give
+CODES = 1024
+
+# The CodeTable of each analogue sensor, keyed by sensor name
+TABLES = {}
+
+def tabulate(function):
+    """Apply a function to every code.
+
+    Codes for which the function fails (e.g. because it would divide by
+    zero) are given NaN.
+
+    Args:
+        function: The function; given a code, or an entry from another
+                  table.
+
+    Returns:
+        array The results, indexed by code.
+
+    """
+    values = array('d', [0.0]) * CODES
+    for code in xrange(CODES):
+        try:
+            values[code] = function(code)
+        except Exception:
+            values[code] = float("nan")
+    return values
+
+def interpolate(values, code):
+    """Get the entry for a code from a table, even if it is fractional.
+
+    Args:
+        values: array The table, indexed by code.
+        code: The code; if it falls between two codes, the result is
+              interpolated between their entries.
+
+    Returns:
+        float The entry (NaN if either of the entries used is NaN).
+
+    """
+    low = int(code)
+    fraction = code - low
+    if fraction == 0:
+        return values[low]
+    return values[low] + (values[low + 1] - values[low]) * fraction
+
+class CodeTable(object):
+    """The value of every ADC code for one analogue sensor."""
+
+    def __init__(self, convert, key):
+        """Initialise.
+
+        Args:
+            self: self.
+            convert: Function to convert a code to a value.
+            key: Whatever the conversion depends on (e.g. the sensor's
+                 resistor values), so that the sensor can tell when the
+                 table needs to be rebuilt.
+
+        """
+        self.key = key
+        self.convert = convert
+        self.values = tabulate(convert)
+        # Code and value of the latest reading, if it came from the table
+        self.lastcode = None
+        self.lastvalue = None
+        self.calibrated = None
+        self.calibration = None
+
+    def lookup(self, code):
+        """Get the value of a code, and remember it as the latest reading.
+
+        Args:
+            self: self.
+            code: The code (0 to 1023; may be fractional if oversampled).
+
+        Returns:
+            float The value.
+
+        """
+        value = interpolate(self.values, code)
+        if isnan(value) and code != int(code):
+            # Next to a code which can't be converted (e.g. 0), so
+            # convert this one directly instead
+            self.lastcode = None
+            return self.convert(code)
+        self.lastcode = code
+        self.lastvalue = value
+        return value
+
+    def calibrate(self, value, function, version):
+        """Calibrate a reading from this sensor.
+
+        If 'value' is the latest reading looked up from the table, the
+        calibrated value is looked up too; otherwise 'function' is just
+        applied to it.
+
+        Args:
+            self: self.
+            value: The (uncalibrated) value.
+            function: The calibration function.
+            version: The version of the calibration functions (see
+                     Calibration.reload()); the calibrated table is
+                     rebuilt when it or 'function' changes.
+
+        Returns:
+            The calibrated value.
+
+        """
+        code = self.lastcode
+        if code is None or value != self.lastvalue:
+            return function(value)
+        if self.calibration != (version, function):
+            values = self.values
+            self.calibrated = tabulate(lambda entry: function(values[entry]))
+            self.calibration = (version, function)
+        calibrated = interpolate(self.calibrated, code)
+        if isnan(calibrated):
+            # Let the function raise its error as usual
+            return function(value)
+        return calibrated
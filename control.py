@@ -0,0 +1,154 @@
+"""Control a running AirPi through a Unix socket.
+
+While sampling, airpi.py listens on a Unix socket (see 'controlsocket'
+in settings.cfg) so that it can be asked for live statistics, or told to
+reload calibration and limits or to enable or disable an output plugin,
+without stopping the run.
+Each connection carries one command: a single line of words, such as
+"disable Xively". The reply is any number of lines of text, after which
+the connection is closed. A reply whose first line starts with "ERROR:"
+means the command failed.
+The ControlServer runs in a background thread and handles one
+connection at a time; the functions which carry out the commands are
+provided by airpi.py. send() is used to send a command from another
+process (e.g. 'airpi.py --control stats').
+
+"""
+
+import os
+import socket
+import threading
+
+class ControlError(Exception):
+    """Exception raised by a command which could not be carried out.
+
+    The message is sent back as the reply.
+
+    """
+    pass
+
+class ControlServer(object):
+    """Listen for commands on a Unix socket, in a background thread.
+
+    """
+
+    def __init__(self, path, commands):
+        """Initialise.
+
+        Create the socket and start listening on it. Any file already at
+        'path' (e.g. left behind by a run which crashed) is removed first.
+
+        Args:
+            self: self.
+            path: The file name of the socket.
+            commands: dict Function to carry out each command, keyed by
+                      the command's name. Each is given a list of the
+                      words after the name, and returns a list of lines to
+                      reply with (or raises ControlError).
+
+        """
+        self.path = path
+        self.commands = commands
+        if os.path.exists(path):
+            os.remove(path)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.bind(path)
+        # Only the user running AirPi (normally root) may control it
+        os.chmod(path, 0600)
+        self.socket.listen(2)
+        self.thread = threading.Thread(target=self.serve, name="control")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def serve(self):
+        """Handle connections until the socket is closed.
+
+        Run by the background thread.
+
+        Args:
+            self: self.
+
+        """
+        while True:
+            try:
+                connection, dummy = self.socket.accept()
+            except socket.error:
+                # Closed by stop()
+                return
+            try:
+                connection.settimeout(5)
+                request = connection.makefile("r").readline()
+                connection.sendall("\n".join(self.handle(request)) + "\n")
+            except socket.error:
+                pass
+            finally:
+                connection.close()
+
+    def handle(self, request):
+        """Carry out one command.
+
+        Args:
+            self: self.
+            request: string The command line received.
+
+        Returns:
+            list The lines of the reply.
+
+        """
+        words = request.split()
+        if not words:
+            return ["ERROR: No command given. Try 'help'."]
+        name = words[0].lower()
+        if name not in self.commands:
+            return ["ERROR: Unknown command '" + words[0] + "'. Try 'help'."]
+        try:
+            return self.commands[name](words[1:])
+        except ControlError as excep:
+            return ["ERROR: " + str(excep)]
+        except Exception as excep:
+            return ["ERROR: " + type(excep).__name__ + ": " + str(excep)]
+
+    def stop(self):
+        """Stop listening and remove the socket.
+
+        Args:
+            self: self.
+
+        """
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self.socket.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def send(path, command, timeout=10):
+    """Send a command to a running AirPi.
+
+    Args:
+        path: The file name of the socket.
+        command: string The command (e.g. "stats").
+        timeout: How long to wait for the reply (seconds).
+
+    Returns:
+        string The reply.
+
+    Raises:
+        socket.error: AirPi isn't running, or isn't listening on 'path'.
+
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(path)
+        client.sendall(command + "\n")
+        reply = []
+        while True:
+            data = client.recv(4096)
+            if not data:
+                break
+            reply.append(data)
+    finally:
+        client.close()
+    return "".join(reply)
@@ -0,0 +1,213 @@
+"""Keep recent readings from all AirPi sensors in memory.
+
+Output plugins which show how readings have changed over time (e.g. the
+graphs served by the HTTP plugin, or the Plot plugin) need the recent
+history of each sensor. Rather than each of them keeping its own copy,
+airpi.py records every sample in one History, and plugins ask it for
+the readings from a sensor between two times.
+The History holds a fixed number of samples; once it is full, each new
+sample replaces the oldest, so its memory use never grows. Readings are
+held exactly as they were read (i.e. uncalibrated). Readings from
+sensors which return several values at once (i.e. the GPS) are not kept.
+
+The shared History is STORE, which is None if history is switched off
+('historysize' in settings.cfg) or before airpi.py has set it up.
+
+"""
+
+import threading
+import time
+from array import array
+
+STORE = None
+
+def timestamp(sampletime):
+    """Convert a sample time to a Unix time.
+
+    Args:
+        sampletime: datetime (local time) representing the time the
+                    sample was taken.
+
+    Returns:
+        float The time in seconds since the epoch.
+
+    """
+    return time.mktime(sampletime.timetuple()) + sampletime.microsecond / 1e6
+
+class History(object):
+    """A fixed-size history of readings from every sensor.
+
+    Samples are held in a ring: the time of each sample, then an array of
+    values and an array of 'valid' flags for each sensor, all indexed by
+    the sample's position in the ring.
+
+    """
+
+    def __init__(self, schema, size):
+        """Initialise.
+
+        Args:
+            self: self.
+            schema: The sampleframe.FrameSchema of the samples.
+            size: The maximum number of samples to keep.
+
+        """
+        self.schema = schema
+        self.size = max(1, int(size))
+        self.times = array('d', [0.0]) * self.size
+        self.values = [array('d', [0.0]) * self.size
+                        for dummy in range(schema.size)]
+        self.valid = [bytearray(self.size) for dummy in range(schema.size)]
+        self.count = 0
+        self.next = 0
+        # Samples are added by the sampling thread, but may be read by
+        # others (e.g. the HTTP plugin's server thread)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def add(self, frame, sampletime):
+        """Add a sample.
+
+        Args:
+            self: self.
+            frame: The sampleframe.SampleFrame holding the sample.
+            sampletime: datetime representing the time the sample was
+                        taken.
+
+        """
+        values = {}
+        for index in xrange(self.schema.size):
+            if frame.valid[index] and index not in self.schema.extras:
+                values[index] = frame.values[index]
+        self.add_values(sampletime, values)
+
+    def add_values(self, sampletime, values):
+        """Add a sample from individual values (e.g. loaded from a file).
+
+        Args:
+            self: self.
+            sampletime: datetime representing the time the sample was
+                        taken.
+            values: dict Each value, keyed by its position in the schema.
+                    Sensors not in the dict are recorded as not read.
+
+        """
+        when = timestamp(sampletime)
+        with self.lock:
+            position = self.next
+            self.times[position] = when
+            for index in xrange(self.schema.size):
+                if index in values:
+                    self.values[index][position] = values[index]
+                    self.valid[index][position] = 1
+                else:
+                    self.valid[index][position] = 0
+            self.next = (position + 1) % self.size
+            self.count = min(self.count + 1, self.size)
+
+    def find(self, name, sensor=None):
+        """Find a sensor's position in the schema.
+
+        Args:
+            self: self.
+            name: The name of the reading (e.g. "Nitrogen_Dioxide").
+            sensor: The name of the sensor (e.g. "MiCS-2710"), if there
+                    might be more than one sensor with the same reading
+                    name, or None for the first.
+
+        Returns:
+            int The position, or None if there is no such sensor.
+
+        """
+        for index, field in enumerate(self.schema.fields):
+            if field["name"] == name and (sensor is None or
+                                            field["sensor"] == sensor):
+                return index
+        return None
+
+    def span(self):
+        """Get the times of the oldest and newest samples.
+
+        Args:
+            self: self.
+
+        Returns:
+            tuple (oldest, newest) Unix times, or None if there are no
+                  samples yet.
+
+        """
+        with self.lock:
+            if not self.count:
+                return None
+            return (self.times[self.slot(0)],
+                    self.times[self.slot(self.count - 1)])
+
+    def slot(self, number):
+        """Get where a sample is in the ring.
+
+        Args:
+            self: self.
+            number: The number of the sample, from 0 for the oldest.
+
+        Returns:
+            int The position of the sample in the arrays.
+
+        """
+        return (self.next - self.count + number) % self.size
+
+    def first_after(self, when):
+        """Find the oldest sample taken at or after a given time.
+
+        Samples are in time order, so this is a binary search. Must be
+        called with the lock held.
+
+        Args:
+            self: self.
+            when: Unix time.
+
+        Returns:
+            int The number of the sample (see slot()); 'count' if there
+                isn't one.
+
+        """
+        low = 0
+        high = self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.times[self.slot(middle)] < when:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def query(self, index, start=None, end=None):
+        """Get a sensor's readings between two times.
+
+        Args:
+            self: self.
+            index: The sensor's position in the schema (see find()).
+            start: Unix time of the earliest reading wanted, or None for
+                   the oldest available.
+            end: Unix time of the latest reading wanted, or None for the
+                 newest available.
+
+        Returns:
+            list (time, value) tuples for each valid reading, oldest
+                 first. Times are Unix times.
+
+        """
+        values = self.values[index]
+        valid = self.valid[index]
+        readings = []
+        with self.lock:
+            first = 0 if start is None else self.first_after(start)
+            for number in xrange(first, self.count):
+                position = self.slot(number)
+                when = self.times[position]
+                if end is not None and when > end:
+                    break
+                if valid[position]:
+                    readings.append((when, values[position]))
+        return readings
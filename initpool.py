@@ -0,0 +1,150 @@
+"""Initialise AirPi plugins concurrently.
+
+Creating a plugin object can block for a long time: internet plugins
+check connectivity, and some sensors wait for their hardware (e.g. the
+GPS waits for gpsd). Doing this for one plugin after another means the
+delays add up before sampling can start. Instead, independent plugins
+are initialised at the same time, each in its own thread.
+Plugins which share something (e.g. sensors on the same bus, which also
+share objects such as the MCP3008 'sharedClass') are put in the same
+group, and are initialised one after another in the order given, so
+that they behave exactly as they would serially.
+Each plugin has a timeout. If it hasn't finished initialising by then,
+it is given up on (along with any others in its group which haven't
+started yet) and sampling goes ahead without it. Python threads can't be
+stopped, so it may carry on in the background, but its result is
+thrown away.
+
+"""
+
+import threading
+
+import scheduler
+
+class InitTimeout(Exception):
+    """Exception recorded for a plugin which didn't finish initialising
+    in time.
+
+    """
+    pass
+
+class InitJob(object):
+    """Initialisation of one plugin.
+
+    Once run() has returned, 'result' holds whatever 'function' returned
+    (e.g. the plugin object) and 'error' holds the exception it raised
+    (or an InitTimeout), if any. 'seconds' is how long it took.
+
+    """
+
+    def __init__(self, name, function, group, timeout):
+        """Initialise.
+
+        Args:
+            self: self.
+            name: The name of the plugin (for messages).
+            function: Function which initialises the plugin and returns
+                      the result.
+            group: Jobs with the same group are run one after another.
+            timeout: How long to wait for the job (seconds); 0 or less
+                     to wait for as long as it takes.
+
+        """
+        self.name = name
+        self.function = function
+        self.group = group
+        self.timeout = timeout
+        self.result = None
+        self.error = None
+        self.seconds = None
+        self.started = None
+        self.done = False
+
+def run(jobs):
+    """Run initialisation jobs, waiting until each has finished or timed
+    out.
+
+    Args:
+        jobs: List of InitJob objects.
+
+    Returns:
+        list The same jobs, in the same order, with results filled in.
+
+    """
+    lock = threading.Condition()
+    groups = []
+    bygroup = {}
+    for job in jobs:
+        if job.group not in bygroup:
+            bygroup[job.group] = []
+            groups.append(bygroup[job.group])
+        bygroup[job.group].append(job)
+
+    def work(group):
+        for job in group:
+            with lock:
+                if job.done:
+                    # Abandoned after an earlier job in the group timed out
+                    return
+                job.started = scheduler.monotonic()
+            result = None
+            error = None
+            try:
+                result = job.function()
+            except Exception as excep:
+                error = excep
+            with lock:
+                if not job.done:
+                    job.result = result
+                    job.error = error
+                    job.seconds = scheduler.monotonic() - job.started
+                    job.done = True
+                lock.notify_all()
+
+    for group in groups:
+        worker = threading.Thread(target=work, args=(group,))
+        worker.daemon = True
+        worker.start()
+
+    with lock:
+        while True:
+            now = scheduler.monotonic()
+            waitfor = None
+            for group in groups:
+                for position, job in enumerate(group):
+                    if job.done:
+                        continue
+                    if job.started is None or job.timeout <= 0:
+                        waitfor = 0.1 if waitfor is None else min(waitfor, 0.1)
+                    elif now - job.started >= job.timeout:
+                        abandon(group[position:], job, now)
+                    else:
+                        remaining = job.started + job.timeout - now
+                        waitfor = (remaining if waitfor is None
+                                    else min(waitfor, remaining))
+                    # Only the first unfinished job in a group is running
+                    break
+            if waitfor is None:
+                break
+            lock.wait(waitfor)
+    return jobs
+
+def abandon(jobs, stuck, now):
+    """Give up on a job which has timed out, and the jobs after it in its
+    group.
+
+    Args:
+        jobs: List of InitJob objects to give up on.
+        stuck: The InitJob which timed out.
+        now: The time now (from scheduler.monotonic()).
+
+    """
+    for job in jobs:
+        if job is stuck:
+            msg = "Timed out after " + str(job.timeout) + " seconds"
+            job.seconds = now - job.started
+        else:
+            msg = "Not started because " + stuck.name + " timed out"
+            job.seconds = 0.0
+        job.error = InitTimeout(msg)
+        job.done = True
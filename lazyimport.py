@@ -0,0 +1,100 @@
+"""Import heavyweight modules when they are first used.
+
+Some plugins depend on large third-party modules (numpy, requests,
+rrdtool, MySQLdb, twitter) which can take seconds to import on a slow
+Raspberry Pi. Importing them as LazyModules instead means that the
+import only happens when the module is first used (usually the first
+time the plugin outputs a sample), so startup isn't held up:
+
+    requests = lazyimport.LazyModule("requests")
+
+Whether the module is installed is still checked straight away (without
+importing it), so a plugin with a missing dependency fails to load as
+before. The time taken by each deferred import is recorded in the
+metrics registry as "import <module>".
+
+"""
+
+import imp
+import importlib
+import sys
+import threading
+
+import metrics
+import scheduler
+
+class LazyModule(object):
+    """A module which is only imported when one of its attributes is used.
+
+    """
+
+    def __init__(self, name):
+        """Initialise.
+
+        Args:
+            self: self.
+            name: The (possibly dotted) name of the module.
+
+        Raises:
+            ImportError: The module isn't installed.
+
+        """
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+        if name not in sys.modules:
+            imp.find_module(name.split(".")[0])
+
+    def load(self):
+        """Import the module, if that hasn't been done already.
+
+        Args:
+            self: self.
+
+        Returns:
+            module The imported module.
+
+        """
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    started = scheduler.monotonic()
+                    module = importlib.import_module(self._name)
+                    metrics.REGISTRY.observe("import " + self._name,
+                                    scheduler.monotonic() - started)
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        """Get an attribute of the module, importing it first if necessary.
+
+        Args:
+            self: self.
+            attr: The name of the attribute.
+
+        Returns:
+            The attribute.
+
+        Raises:
+            AttributeError: 'attr' is a special (double underscore) name;
+                            these are never looked up in the module, so
+                            that introspection (e.g. hasattr(module,
+                            "__bases__")) doesn't import it.
+
+        """
+        if attr.startswith("__") and attr.endswith("__"):
+            raise AttributeError(attr)
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        """Describe the module, and whether it has been imported yet.
+
+        Args:
+            self: self.
+
+        Returns:
+            string The description.
+
+        """
+        state = "imported" if self._module is not None else "not imported"
+        return "<lazy module '" + self._name + "' (" + state + ")>"
@@ -0,0 +1,200 @@
+"""Record timings and counts from the AirPi sampling loop.
+
+A lightweight registry of named histograms and counters. The sampling
+loop records how long each part of each tick takes (reading each sensor,
+outputting to each plugin, calibration, averaging and the tick as a
+whole), so that it's possible to see which part is too slow when the
+AirPi can't keep up with the requested sample frequency.
+Histograms have a fixed set of buckets, so recording a timing takes the
+same (small) amount of time and memory however long the run lasts.
+
+The shared registry is REGISTRY; a report can be obtained from it at any
+time using report().
+
+"""
+
+import bisect
+import threading
+
+# Upper bounds (seconds) of the histogram buckets. Anything slower than
+# the last bound goes in an extra, unbounded bucket.
+BOUNDS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+class Histogram(object):
+    """A fixed-bucket histogram of timings.
+
+    Count how many timings fall in each bucket, along with the total
+    count, sum and maximum, so that the mean can be calculated exactly
+    and percentiles can be estimated (to the nearest bucket).
+
+    """
+
+    def __init__(self, bounds=BOUNDS):
+        """Initialise.
+
+        Args:
+            self: self.
+            bounds: Sorted upper bounds of the buckets (seconds).
+
+        """
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        """Record one timing.
+
+        Args:
+            self: self.
+            seconds: The timing to be recorded.
+
+        """
+        bucket = bisect.bisect_left(self.bounds, seconds)
+        with self.lock:
+            self.buckets[bucket] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.maximum:
+                self.maximum = seconds
+
+    def mean(self):
+        """Get the mean timing.
+
+        Args:
+            self: self.
+
+        Returns:
+            float The mean (seconds), or 0 if nothing has been recorded.
+
+        """
+        if not self.count:
+            return 0.0
+        return self.total / self.count
+
+    def percentile(self, percent):
+        """Estimate a percentile.
+
+        Args:
+            self: self.
+            percent: The percentile required (0 to 100).
+
+        Returns:
+            float The upper bound of the bucket containing the requested
+                  percentile (or the maximum, for the last bucket).
+
+        """
+        target = self.count * percent / 100.0
+        running = 0
+        for index, count in enumerate(self.buckets):
+            running += count
+            if running >= target and running > 0:
+                if index < len(self.bounds):
+                    return min(self.bounds[index], self.maximum)
+                break
+        return self.maximum
+
+class Registry(object):
+    """A registry of named histograms and counters.
+
+    Histograms and counters are created the first time they are used,
+    so nothing needs to be declared in advance.
+
+    """
+
+    def __init__(self):
+        """Initialise.
+
+        Args:
+            self: self.
+
+        """
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        # A tracer.Tracer which is also given every timing, if tracing is
+        # switched on
+        self.tracer = None
+
+    def reset(self):
+        """Forget everything recorded so far.
+
+        Args:
+            self: self.
+
+        """
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+
+    def histogram(self, name):
+        """Get a histogram, creating it if necessary.
+
+        Args:
+            self: self.
+            name: The name of the histogram.
+
+        Returns:
+            Histogram The histogram.
+
+        """
+        try:
+            return self.histograms[name]
+        except KeyError:
+            with self.lock:
+                return self.histograms.setdefault(name, Histogram())
+
+    def observe(self, name, seconds):
+        """Record one timing in a histogram.
+
+        Args:
+            self: self.
+            name: The name of the histogram.
+            seconds: The timing to be recorded.
+
+        """
+        self.histogram(name).observe(seconds)
+        if self.tracer is not None:
+            self.tracer.span(name, seconds)
+
+    def increment(self, name, amount=1):
+        """Add to a counter.
+
+        Args:
+            self: self.
+            name: The name of the counter.
+            amount: How much to add.
+
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def report(self):
+        """Get a report of all histograms and counters.
+
+        Args:
+            self: self.
+
+        Returns:
+            list Lines of text, one per histogram or counter.
+
+        """
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        for name, hist in histograms:
+            if not hist.count:
+                continue
+            lines.append("%s: %d, mean %.1fms, p50 %.1fms, p95 %.1fms, "
+                "p99 %.1fms, max %.1fms" % (name, hist.count,
+                hist.mean() * 1000, hist.percentile(50) * 1000,
+                hist.percentile(95) * 1000, hist.percentile(99) * 1000,
+                hist.maximum * 1000))
+        for name, count in counters:
+            lines.append("%s: %d" % (name, count))
+        return lines
+
+REGISTRY = Registry()
@@ -0,0 +1,100 @@
+"""Look up network information once per run.
+
+Checking for internet connectivity means trying to connect to a website,
+which blocks for up to five seconds when offline, and looking up the
+hostname can mean a reverse DNS lookup. Both used to be done by every
+plugin which needed them, so a few internet plugins could hold up
+startup by half a minute. The results are now cached here, and shared by
+airpi.py and all plugins. Callers in different threads (see initpool.py)
+wait for a single lookup rather than each starting their own.
+
+"""
+
+import socket
+import threading
+import urllib2
+
+# Site to connect to when checking connectivity, and how long to wait
+PROBEURL = "http://www.google.com"
+PROBETIMEOUT = 5
+
+_lock = threading.Lock()
+_cache = {}
+
+def _cached(key, lookup):
+    """Get a cached value, looking it up if this is the first request.
+
+    Args:
+        key: The name of the value in the cache.
+        lookup: Function which gets the value.
+
+    Returns:
+        The value.
+
+    """
+    with _lock:
+        if key not in _cache:
+            _cache[key] = lookup()
+        return _cache[key]
+
+def _probe():
+    """Check internet connectivity by trying to connect to a website.
+
+    Returns:
+        boolean True if successfully connects to the site within
+                PROBETIMEOUT seconds.
+
+    """
+    try:
+        urllib2.urlopen(PROBEURL, timeout=PROBETIMEOUT)
+        return True
+    except (urllib2.URLError, socket.error):
+        pass
+    return False
+
+def _hostname():
+    """Look up the current hostname.
+
+    Returns:
+        string The hostname.
+
+    """
+    if socket.gethostname().find('.') >= 0:
+        return socket.gethostname()
+    else:
+        return socket.gethostbyaddr(socket.gethostname())[0]
+
+def check_conn():
+    """Check internet connectivity.
+
+    The connection is only checked the first time this is called in a
+    run (see forget()).
+
+    Returns:
+        boolean True if successfully connects to the site within five
+                seconds.
+        boolean False if fails to connect to the site within five
+                seconds.
+
+    """
+    return _cached("conn", _probe)
+
+def gethostname():
+    """Get current hostname.
+
+    Get the current hostname of the Raspberry Pi. This is only looked up
+    the first time it's needed in a run (see forget()).
+
+    Returns:
+        string The hostname.
+
+    """
+    return _cached("hostname", _hostname)
+
+def forget():
+    """Forget cached results, so they will be looked up again when next
+    needed.
+
+    """
+    with _lock:
+        _cache.clear()
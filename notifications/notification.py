@@ -6,7 +6,7 @@ sub-classed for specific Notifications. This is an abstract base class
 
 """
 from abc import ABCMeta, abstractmethod
-import socket
+import network
 
 class Notification():
     """Generic Notification plugin description (abstract) for
@@ -56,13 +56,11 @@ class Notification():
     def gethostname(self):
         """Get current hostname.
 
-        Get the current hostname of the Raspberry Pi.
+        Get the current hostname of the Raspberry Pi (looked up once per
+        run; see network.py).
 
         Returns:
             string The hostname.
 
         """
-        if socket.gethostname().find('.') >= 0:
-            return socket.gethostname()
-        else:
-            return socket.gethostbyaddr(socket.gethostname())[0]
+        return network.gethostname()
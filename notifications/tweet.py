@@ -6,7 +6,9 @@ Send an tweet notification when a particular event type occurs.
 import notification
 import os
 import time
-from twitter import *
+import lazyimport
+
+twitter = lazyimport.LazyModule("twitter")
 
 class Tweet(notification.Notification):
     """ Send an tweet notification.
@@ -38,12 +40,12 @@ class Tweet(notification.Notification):
 
         oauth_filename = os.path.join(os.path.expanduser("~"), ".twitterairpi_oauth")
         if not os.path.exists(oauth_filename):
-            oauth_dance("UoL AirPis", consumerkey, consumersecret, oauth_filename)
-        (oauth_token, oauth_token_secret) = read_token_file(oauth_filename)
+            twitter.oauth_dance("UoL AirPis", consumerkey, consumersecret, oauth_filename)
+        (oauth_token, oauth_token_secret) = twitter.read_token_file(oauth_filename)
 
         # Log in to Twitter
-        auth = OAuth(oauth_token, oauth_token_secret, consumerkey, consumersecret)
-        self.twitter = Twitter(auth=auth)
+        auth = twitter.OAuth(oauth_token, oauth_token_secret, consumerkey, consumersecret)
+        self.twitter = twitter.Twitter(auth=auth)
 
         # Set messages
         hostname = self.gethostname()
@@ -0,0 +1,131 @@
+"""Collect samples for an AirPi output plugin and output them in batches.
+
+Output plugins which send data to a remote service or a database spend
+most of their time on each request or transaction, rather than on the
+data itself. If 'batchsize' or 'batchage' is set for such a plugin in
+outputs.cfg, samples are collected in an OutputBatch and given to the
+plugin all at once: when 'batchsize' samples have been collected, or
+when the oldest collected sample is 'batchage' seconds old (checked as
+each sample arrives), and when sampling stops.
+Plugins with an output_batch() method are given the whole batch in one
+call. Other plugins are given each sample in the batch in turn, just as
+if there were no batching.
+
+"""
+
+import sampleframe
+import scheduler
+
+class OutputBatch(object):
+    """Collect samples for one output plugin and output them in batches.
+
+    Counters are kept of how many batches have been output and how many
+    of those failed. 'lastresult' is the outcome of the last batch
+    (samples still being collected are assumed to be fine).
+
+    """
+
+    def __init__(self, plugin, size, age):
+        """Initialise.
+
+        Args:
+            self: self.
+            plugin: The output plugin object.
+            size: The number of samples in a full batch; 0 or less for no
+                  limit.
+            age: How old the oldest sample in a batch can get (seconds)
+                 before the batch is output; 0 or less for no limit.
+
+        """
+        self.plugin = plugin
+        self.name = plugin.name
+        self.size = size
+        self.age = age
+        self.samples = []
+        self.started = None
+        self.batches = 0
+        self.failed = 0
+        self.lastresult = True
+
+    def add(self, data, sampletime):
+        """Add a sample to the batch, and output the batch if it is full
+        or old enough.
+
+        Args:
+            self: self.
+            data: SampleFrame or list The data to be output.
+            sampletime: datetime representing the time the sample was
+                        taken.
+
+        Returns:
+            boolean The outcome of the last batch output (including this
+                    one, if the batch was output now).
+
+        """
+        now = scheduler.monotonic()
+        if not self.samples:
+            self.started = now
+        if isinstance(data, sampleframe.SampleFrame):
+            # Only plugins without output_batch() could use the frame
+            # itself, and views are needed to make the batch
+            if callable(getattr(self.plugin, "output_batch", None)):
+                data = data.views()
+        self.samples.append((data, sampletime))
+        if ((self.size > 0 and len(self.samples) >= self.size) or
+                (self.age > 0 and now - self.started >= self.age)):
+            return self.flush()
+        return self.lastresult
+
+    def flush(self):
+        """Output whatever has been collected so far.
+
+        Args:
+            self: self.
+
+        Returns:
+            boolean True if the batch was output successfully (or there
+                    was nothing to output).
+
+        """
+        if not self.samples:
+            return self.lastresult
+        samples = self.samples
+        self.samples = []
+        self.started = None
+        if callable(getattr(self.plugin, "output_batch", None)):
+            result = self.plugin.output_batch(samples) != False
+        else:
+            result = True
+            for data, sampletime in samples:
+                if sampleframe.deliver(self.plugin, data, sampletime) == False:
+                    result = False
+        self.batches += 1
+        if not result:
+            self.failed += 1
+        self.lastresult = result
+        return result
+
+    def pending(self):
+        """Get the number of samples collected but not yet output.
+
+        Args:
+            self: self.
+
+        Returns:
+            int The number of samples.
+
+        """
+        return len(self.samples)
+
+    def stats(self):
+        """Get a one-line summary of the batch's counters.
+
+        Args:
+            self: self.
+
+        Returns:
+            string The summary.
+
+        """
+        return "%s: %d batch(es) output, %d failed, %d sample(s) pending" % (
+            self.name, self.batches, self.failed, self.pending())
@@ -0,0 +1,193 @@
+"""Run an AirPi output plugin behind its own queue and worker thread.
+
+When 'asyncoutputs' is switched on in settings.cfg, each enabled output
+plugin is wrapped in an OutputWorker. The sampling loop just puts each
+set of data on to the worker's queue and carries on; the worker thread
+takes data off the queue and passes it to the plugin's output_data()
+(or output_frame()) method. A slow or hung output (e.g. a web service
+which isn't responding) therefore only holds up itself, not sampling or
+any of the other outputs.
+
+"""
+
+import threading
+import Queue
+import sampleframe
+import metrics
+import scheduler
+
+class OutputWorker(object):
+    """Run an AirPi output plugin behind its own queue and worker thread.
+
+    Each worker has a bounded queue. What happens when data arrives and
+    the queue is already full is determined by the overflow policy:
+    - 'dropoldest' throws away the oldest queued data to make room.
+    - 'dropnewest' throws away the data which has just arrived.
+    - 'block' waits until there is room on the queue (which means that
+      a slow output *will* hold up sampling).
+    Counters are kept of how much data has been delivered, how many
+    deliveries failed and how much data was dropped.
+
+    """
+
+    policies = ["dropoldest", "dropnewest", "block"]
+
+    def __init__(self, plugin, size, policy, logger, batch=None):
+        """Initialise.
+
+        Initialise the worker and start its thread.
+
+        Args:
+            self: self.
+            plugin: The output plugin object to be wrapped.
+            size: The maximum number of sets of data to hold in the queue.
+            policy: The overflow policy (see the Class docstring).
+            logger: Logger to which errors from the plugin are written.
+            batch: outputbatch.OutputBatch through which data should be
+                   passed to the plugin, or None to pass each set of data
+                   straight to it.
+
+        """
+        if policy not in OutputWorker.policies:
+            raise ValueError("Unknown overflow policy '" + str(policy) + "'")
+        self.plugin = plugin
+        self.name = plugin.name
+        self.policy = policy
+        self.logger = logger
+        self.batch = batch
+        self.queue = Queue.Queue(maxsize=max(1, int(size)))
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.lastresult = True
+        self.thread = threading.Thread(target=self.work, name=self.name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, datapoints, sampletime):
+        """Queue data for output.
+
+        Add one set of data to the queue, applying the overflow policy
+        if the queue is full.
+
+        Args:
+            self: self.
+            datapoints: A list containing the data to be output.
+            sampletime: datetime representing the time the sample was
+                        taken.
+
+        """
+        item = (datapoints, sampletime)
+        if self.policy == "block":
+            self.queue.put(item)
+        elif self.policy == "dropnewest":
+            try:
+                self.queue.put_nowait(item)
+            except Queue.Full:
+                self.dropped += 1
+        else:
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    break
+                except Queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                        self.queue.task_done()
+                        self.dropped += 1
+                    except Queue.Empty:
+                        pass
+
+    def work(self):
+        """Pass queued data to the output plugin.
+
+        Run by the worker thread. Take each set of data off the queue in
+        turn and pass it to the plugin (or add it to the batch, if there
+        is one). Exceptions raised by the plugin are logged and counted
+        as failures, rather than killing the thread. A 'None' on the
+        queue outputs anything left in the batch, then stops the thread.
+
+        Args:
+            self: self.
+
+        """
+        while True:
+            item = self.queue.get()
+            if item is None:
+                if self.batch is not None:
+                    try:
+                        self.batch.flush()
+                    except Exception as excep:
+                        self.logger.error(" Exception during output to %s: %s",
+                            self.name, excep)
+                self.queue.task_done()
+                return
+            datapoints, sampletime = item
+            start = scheduler.monotonic()
+            try:
+                if self.batch is not None:
+                    result = self.batch.add(datapoints, sampletime)
+                else:
+                    result = sampleframe.deliver(self.plugin, datapoints,
+                                sampletime)
+            except Exception as excep:
+                self.logger.error(" Exception during output to %s: %s",
+                    self.name, excep)
+                result = False
+            metrics.REGISTRY.observe("output " + self.name,
+                scheduler.monotonic() - start)
+            if result == False:
+                self.failed += 1
+                self.lastresult = False
+            else:
+                self.delivered += 1
+                self.lastresult = True
+            self.queue.task_done()
+
+    def depth(self):
+        """Get the number of sets of data waiting in the queue.
+
+        Args:
+            self: self.
+
+        Returns:
+            int The current queue depth.
+
+        """
+        return self.queue.qsize()
+
+    def stop(self, timeout):
+        """Stop the worker once the queue has been emptied.
+
+        Ask the worker thread to stop once it has output everything
+        already in the queue, and wait (for up to 'timeout' seconds) for
+        it to do so.
+
+        Args:
+            self: self.
+            timeout: The maximum time to wait (seconds).
+
+        Returns:
+            boolean True if the worker stopped within the timeout.
+
+        """
+        try:
+            self.queue.put(None, timeout=timeout)
+        except Queue.Full:
+            return False
+        self.thread.join(timeout)
+        return not self.thread.isAlive()
+
+    def stats(self):
+        """Get a one-line summary of the worker's counters.
+
+        Args:
+            self: self.
+
+        Returns:
+            string The summary.
+
+        """
+        return "%s: %d delivered, %d failed, %d dropped, %d queued (%s)" % (
+            self.name, self.delivered, self.failed, self.dropped,
+            self.depth(), self.policy)
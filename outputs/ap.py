@@ -27,7 +27,10 @@ TODO:
     make a correct documentation
 """
 import math as _math
-import numpy as np
+import lazyimport
+
+# Only imported when a plot is drawn
+np = lazyimport.LazyModule("numpy")
 
 
 __version__ = 0.9
@@ -110,7 +110,7 @@ class CSVOutput(output.Output):
             else:
                 if self.header == False:
                     header += ",\"Latitude (deg)\",\"Longitude (deg)\","
-                    header += "Altitude (m)\",\"Exposure\",\"Disposition\""
+                    header += "\"Altitude (m)\",\"Exposure\",\"Disposition\""
                 props = ["latitude",
                             "longitude",
                             "altitude",
@@ -119,17 +119,89 @@ class CSVOutput(output.Output):
                 for prop in props:
                     line += "," + str(point[prop])
         if self.params["limits"] and breach:
-            line += "," + breach
-        line = line[:-1]
-        # If it's the first write of this instance do a header so we
-        # know what's what:
+            line += "," + breach[:-1]
         if self.header == False:
-            self.file.write(header + "\n")
+            self.write_line(header)
             self.header = True
+        self.write_line(line)
+        return True
+
+    def output_frame(self, frame, sampletime):
+        """Output a SampleFrame.
+
+        Output data in the same format as output_data(), but straight
+        from a SampleFrame, without creating a dict (or view) for each
+        reading. If calibration is required, the readings are passed to
+        output_data() instead so that they can be calibrated.
+
+        Args:
+            self: self.
+            frame: The SampleFrame containing the data to be output.
+            sampletime: datetime representing the time the sample was taken.
+
+        Returns:
+            boolean True if data successfully written to file.
+
+        """
+        if self.params["calibration"]:
+            return self.output_data(frame.views(), sampletime)
+
+        fields = frame.schema.fields
+        extras = frame.schema.extras
+        counts = frame.schema.counts
+        values = frame.values
+        valid = frame.valid
+        if self.header == False:
+            header = "\"Date and time\",\"Unix time\""
+            for index in xrange(frame.schema.size):
+                if not frame.present[index]:
+                    continue
+                if index in extras:
+                    header += ",\"Latitude (deg)\",\"Longitude (deg)\","
+                    header += "\"Altitude (m)\",\"Exposure\",\"Disposition\""
+                else:
+                    header = "%s,\"%s %s (%s) (%s)\"" % (header,
+                        fields[index]["sensor"],
+                        fields[index]["name"],
+                        fields[index]["symbol"],
+                        fields[index]["readingtype"])
+            self.write_line(header)
+            self.header = True
+
+        line = [sampletime.strftime("\"%Y-%m-%d %H:%M:%S,%f\""),
+                str(sampletime)]
+        breach = []
+        for index in xrange(frame.schema.size):
+            if not frame.present[index]:
+                continue
+            if index in extras:
+                point = frame.extras[index]
+                for prop in ["latitude", "longitude", "altitude",
+                                "exposure", "disposition"]:
+                    line.append(str(point[prop]))
+            elif index in counts:
+                # Written as whole numbers, as they always have been
+                line.append(str(frame.value(index)))
+            else:
+                line.append(str(values[index]) if valid[index] else "None")
+                if self.params["limits"] and frame.breach[index]:
+                    breach.append(fields[index]["name"])
+        if breach:
+            line.append("BREACHES: " + ";".join(breach))
+        self.write_line(",".join(line))
+        return True
+
+    def write_line(self, line):
+        """Write a line to the file.
+
+        Args:
+            self: self.
+            line: The line to be written (without a line ending).
+
+        """
         self.file.write(line + "\n")
         # Flush the file in case of power failure:
         self.file.flush()
-        return True
 
     def __del__(self):
         """ An exit hook to close the file nicely. """
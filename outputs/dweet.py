@@ -11,9 +11,11 @@ parent class (Output), i.e. always returns True.
 """
 
 import output
-import requests
+import lazyimport
 import datetime
 
+requests = lazyimport.LazyModule("requests")
+
 class Dweet(output.Output):
     """A module to output data to dweet.
 
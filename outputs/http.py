@@ -4,11 +4,11 @@ from datetime import datetime
 import time
 from threading import Thread
 from string import replace
-import numpy
 import re
 import csv
 import socket
 import output
+import history
 
 # useful resources:
 # http://unixunique.blogspot.co.uk/2011/06/simple-python-http-web-server.html
@@ -67,6 +67,11 @@ class HTTP(output.Output):
                     self.history = 1
             else:
                 self.history = 0
+        else:
+            self.history = 0
+        if history.STORE is None:
+            # 'historysize' is 0 in settings.cfg
+            self.history = 0
             
         if "historySize" in self.params:
             self.historySize = int(self.params["historySize"])
@@ -81,7 +86,6 @@ class HTTP(output.Output):
                 self.historyCalibrated = 1
             else:
                 self.historyCalibrated = 0
-                self.cal = []
         else:
             self.historyCalibrated = 0
         
@@ -103,12 +107,8 @@ class HTTP(output.Output):
         else:
             self.about = "An AirPi weather station."
 
-        self.sensorIds = []
-        self.readingtypes = dict()
-        self.historicData = []
-        self.historicAt = 0
-        self.tempHistory = []
-        self.tempHistoryAt = 0
+        self.data = []
+        self.lastUpdate = ""
 
         self.handler = requestHandler
         if "httpVersion" in self.params and self.params["httpVersion"] == "1.1":
@@ -127,130 +127,102 @@ class HTTP(output.Output):
                 print "Loading calibrated history from " + self.historyFile
             self.loadData()
 
-    def createSensorIds(self,dataPoints):
-        for i in dataPoints:
-            self.sensorIds.append(i["sensor"]+" "+i["name"])
-            self.readingtypes[len(self.sensorIds)-1] = i["readingtype"]
-        self.historicData = numpy.zeros([2, len(self.sensorIds)+1])
-        self.tempHistory = numpy.zeros([2, len(self.sensorIds)])
-
     def loadData(self):
-        with open(self.historyFile, "r") as csvfile:
-            # get file length
-            for flen, l in enumerate(csvfile):
-                pass
-            # assume 5 second interval
-            start = flen - (self.historyInterval / 5) * self.historySize
-            csvfile.seek(0)
+        """Load history from a file written by the CSVOutput plugin.
 
+        Readings are added to the shared history (history.STORE), which
+        holds uncalibrated readings, so a calibrated file can't be used.
+
+        """
+        if self.historyCalibrated:
+            print "Can't load calibrated history from " + self.historyFile
+            return
+        store = history.STORE
+        with open(self.historyFile, "r") as csvfile:
             reader = csv.reader(csvfile)
-            data = []
-            at = -1
+            columns = None
             for row in reader:
-                at += 1
-                if at > 0 and at < start:
+                if len(row) < 2:
+                    continue
+                if row[0] == "Date and time":
+                    # Header: "Date and time", "Unix time", then sensors
+                    columns = []
+                    for heading in row[2:]:
+                        r = re.match('([a-zA-Z0-9_-]*) ([a-zA-Z0-9_-]*) \(', heading)
+                        if r == None:
+                            columns.append(None)
+                        else:
+                            columns.append(store.find(r.group(2), r.group(1)))
+                    continue
+                if columns is None:
+                    # Metadata
                     continue
-                # Date & Time, Unix Time, then sensors
                 try:
-                    t = [w.replace('None', '0') for w in row[1:]]
-                    d = numpy.array(map(float, t))
-                    now = d[0]
-                    d = d[1:]
-                    for i, val in enumerate(d):
-                        data[i]["value"] = val
-                    if self.historyCalibrated == 0:
-                        dataPoints = self.cal.calibrate(data)
-                    else:
-                        dataPoints = data
-                    self.recordData(data, now)
+                    when = datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S,%f")
                 except ValueError:
-                    row = row[2:]
-                    data = []
-                    for i in row:
-                        sensor = {}
-                        r = re.match('([a-zA-Z0-9_-]*) ([a-zA-Z0-9_-]*) \(([a-zA-Z%_-]*)\) \(([a-zA-Z]*)\)', i)
-                        if r == None:
-                            print row
-                        sensor["sensor"] = r.group(1)
-                        sensor["name"] = r.group(2)
-                        sensor["symbol"] = r.group(3)
-                        sensor["readingtype"] = r.group(4)
-                        data.append(sensor)
-                    if len(self.historicData) == 0:
-                        self.createSensorIds(data)
-                    else:
-                        for i in data:
-                            name = i["sensor"]+" "+i["name"]
-                            self.getSensorId(name)
-
-    def getSensorId(self,name):
-        for i in range(0,len(self.sensorIds)):
-            if name == self.sensorIds[i]:
-                return i
-        # does not exist, add it
-        return self.addSensorId(name)
-
-    def addSensorId(self,name):
-        # (should only happen if the loaded history has different sensors)
-        self.sensorIds.append(name)
-        t = numpy.zeros([len(self.historicData), len(self.sensorIds)+1])
-        t[0:self.historicAt,0:len(self.sensorIds)] = self.historicData
-        self.historicData = t
-        self.tempHistory = numpy.zeros([2, len(self.sensorIds)])
-        return len(self.sensorIds)-1
-
-    def recordData(self,dataPoints,now=0):
-        t = numpy.zeros(len(self.sensorIds)+1)
-        if now == 0:
-            t[0] = time.time() - time.timezone
-        else:
-            t[0] = now
+                    continue
+                values = {}
+                for index, reading in zip(columns, row[2:]):
+                    if index is not None and reading != 'None':
+                        try:
+                            values[index] = float(reading)
+                        except ValueError:
+                            pass
+                store.add_values(when, values)
+
+    def getSensorId(self,name,sensor):
+        """Get the position of a sensor in the shared history."""
+        if history.STORE is None:
+            return None
+        return history.STORE.find(name, sensor)
+
+    def graphData(self,sensorId):
+        """Get the history for one sensor, for a graph.
+
+        Readings from the shared history are combined into one point
+        every 'historyInterval' seconds (the mean of samples, or the
+        total of pulse counts), for the last 'historySize' points.
+        Pulse counts are shown as a running total.
 
-        for i in dataPoints:
-            sid = self.getSensorId(i["sensor"]+" "+i["name"])
-            if i["value"] != None:
-                t[sid+1] = i["value"]
-            else:
-                t[sid+1] = 0
-            self.readingtypes[sid] = i["readingtype"] 
-
-        # put the readings into temporary history for averaging
-        self.tempHistory[self.tempHistoryAt] = t[1:]
-        self.tempHistoryAt += 1
-        if len(self.tempHistory) == self.tempHistoryAt:
-            t2 = numpy.zeros([self.tempHistoryAt * 2, len(self.sensorIds)])
-            t2[0:self.tempHistoryAt,:] = self.tempHistory
-            self.tempHistory = t2
-
-        # go no further if we're not saving
-        if (t[0] - self.historicData[self.historicAt-1,0]) < self.historyInterval:
-            return
+        Returns:
+            list (time, value) tuples; times are in milliseconds, in
+                 local time.
 
-        # take average reading etc
-        for i, r in enumerate(self.tempHistory[0]):
-            if self.readingtypes[i] == "sample":
-                t[i+1] = numpy.mean(self.tempHistory[:self.tempHistoryAt,i])
-            elif self.readingtypes[i] == "pulseCount":
-                t[i+1] = numpy.sum(self.tempHistory[:self.tempHistoryAt,i])
-        self.tempHistoryAt = 0 #reset
-
-        self.historicData[self.historicAt] = t
-        self.historicAt += 1
-
-        if len(self.historicData) == self.historicAt and self.historicAt < self.historySize: #grow
-            t = numpy.zeros([self.historicAt * 2, len(self.sensorIds)+1])
-            t[0:self.historicAt,:] = self.historicData
-            self.historicData = t
-        elif self.historicAt == self.historySize: # shift the end off the array
-            self.historicData[0:self.historicAt-1,:] = self.historicData[1:self.historicAt,:]
-            self.historicAt -= 1
+        """
+        store = history.STORE
+        if store is None or sensorId >= store.schema.size:
+            return []
+        field = store.schema.fields[sensorId]
+        pulses = field.get("readingtype") == "pulseCount"
+        span = store.span()
+        if span is None:
+            return []
+        start = span[1] - self.historySize * self.historyInterval
+        points = []
+        bucket = None
+        for when, value in store.query(sensorId, start):
+            if self.params["calibration"]:
+                value = self.cal.calibrate_value(field["name"], value)
+            if bucket is None or when - bucket[0] >= self.historyInterval:
+                bucket = [when, when, 0.0, 0]
+                points.append(bucket)
+            bucket[1] = when
+            bucket[2] += value
+            bucket[3] += 1
+        data = []
+        total = 0.0
+        for first, last, value, count in points:
+            if pulses:
+                total += value
+                value = total
+            else:
+                value = value / count
+            data.append(((last - time.timezone) * 1000, value))
+        return data
 
     def output_data(self,dataPoints, sampletime):
         if self.params["calibration"]:
             dataPoints = self.cal.calibrate(dataPoints[:])
-        if len(self.sensorIds) == 0:
-            self.createSensorIds(dataPoints)
-        self.recordData(dataPoints)
 
         self.data = dataPoints
         self.lastUpdate = time.strftime('%a, %d %b %Y %H:%M:%S %Z', time.localtime(time.time()))
@@ -295,7 +267,7 @@ class requestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
             rss = 1
         else:
             rss = 0
-        r = re.match('/graph_collapse-([0-9]).html', self.path)
+        r = re.match('/graph_collapse-([0-9]+).html', self.path)
         if r:
             graph = int(r.group(1))+1
             self.path = 'graph.html'
@@ -330,7 +302,7 @@ class requestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
                 else:
                     line = replace(line, "$reading$", 'None')
                 line = replace(line, "$units$", i["symbol"])
-                line = replace(line, "$sensorId$", str(self.server.httpoutput.getSensorId(i["sensor"]+" "+i["name"])))
+                line = replace(line, "$sensorId$", str(self.server.httpoutput.getSensorId(i["name"], i["sensor"])))
                 line = replace(line, "$sensorname$", i["sensor"])
                 line = replace(line, "$sensorText$", i["description"])
                 details += line
@@ -354,13 +326,9 @@ class requestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
                 items += line
             page = replace(page, "$items$", items)
         elif graph > 0 and response == 200 and self.server.httpoutput.history != 0:
-            x = self.server.httpoutput.historicData[0:self.server.httpoutput.historicAt,0]
-            y = self.server.httpoutput.historicData[0:self.server.httpoutput.historicAt,graph]
-            if self.server.httpoutput.readingtypes[graph-1] == "pulseCount":
-                y = numpy.cumsum(y)
             data = ''
-            for index, item in enumerate(x):
-                data += "[%i, %f]," % (item*1000, y[index])
+            for item, value in self.server.httpoutput.graphData(graph-1):
+                data += "[%i, %f]," % (item, value)
             page = replace(page, "$data$", data)
                 
 
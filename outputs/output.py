@@ -18,7 +18,9 @@ class Output(Plugin):
     """
 
     requiredGenericParams = ["target"]
-    optionalGenericParams = ["calibration", "metadata", "limits"]
+    optionalGenericParams = ["calibration", "metadata", "limits",
+                                "queuesize", "overflow", "statistic",
+                                "batchsize", "batchage", "priority"]
 
     def __init__(self, config):
         super(Output, self).__init__(config, "outputs")
@@ -41,6 +43,22 @@ class Output(Plugin):
         - 'sampletime' is a datetime representing the time the sample
            was taken.
 
+        Readings in 'data' are read-only dict-like views (see
+        sampleframe.ReadingView); use copy() to get a dict which can be
+        changed. Plugins can also define an optional method:
+        output_frame(self, frame, sampletime)
+        which, if present, is given each (unaveraged) sample as a
+        sampleframe.SampleFrame instead of calling output_data().
+        If 'batchsize' or 'batchage' is set for the plugin in
+        outputs.cfg, samples are collected and output in batches (see
+        outputbatch.py). Plugins which can output a whole batch at once
+        (e.g. in one request or transaction) can define:
+        output_batch(self, samples)
+        where 'samples' is a list of (data, sampletime) tuples, oldest
+        first, and 'data' is as for output_data(). It should return
+        False if the batch could not be output. Plugins without it are
+        given each sample in the batch in turn.
+
         In situations where the sub-class defines a support plugin (e.g.
         "calibration") the sub-class may not actually be able/designed
         to ouptput data; in such circumstances the method should just
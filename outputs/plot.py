@@ -9,6 +9,7 @@ include GPS data.
 import os
 import output
 import ap
+import history
 
 class Plot(output.Output):
     """A module to print AirPi data to screen as a graph.
@@ -23,11 +24,13 @@ class Plot(output.Output):
 
     def __init__(self, config):
         super(Plot, self).__init__(config)
-        self.history = []
+        if history.STORE is None:
+            raise RuntimeError("The plot needs 'historysize' in settings.cfg"
+                                " to be more than 0")
         self.metric = self.params["metric"]
         self.unit = None
 
-    def output_data(self, datapoints, dummy):
+    def output_data(self, datapoints, sampletime):
         """Output data.
 
         Output data in the format stipulated by the plugin. Calibration
@@ -38,13 +41,19 @@ class Plot(output.Output):
         units and symbols, while the latter presents a dict containing
         several readings such as latitude, longitude and altitude, but
         no units or symbols.
-        Because this particular plugin (plot) does not show time, the
-        third argument (normally called 'sampletime') is called 'dummy'
-        to facilitate compliance with pylint.
+        The latest point plotted is the reading given to this method
+        (averaged, if averaging is switched on, and calibrated as for
+        any other plugin). Earlier points are taken from the shared
+        history (history.STORE), which keeps every sample as it was read;
+        with averaging, they are therefore the individual samples rather
+        than the averages, and calibration functions which use findval()
+        are applied using the latest readings rather than those from the
+        same sample.
 
         Args:
             self: self.
             datapoints: A dict containing the data to be output.
+            sampletime: datetime representing the time the sample was taken.
 
         Returns:
             boolean True if data successfully printed to stdout.
@@ -53,16 +62,31 @@ class Plot(output.Output):
         if self.params["calibration"]:
             datapoints = self.cal.calibrate(datapoints)
 
+        latest = None
         for point in datapoints:
             if point["name"] == self.metric:
-                self.history.append(int(point["value"]))
+                latest = point["value"]
                 if self.unit is None:
                     self.unit = point["unit"]
+        if latest is None:
+            return True
 
-        x = range(0, len(self.history))
-        y = self.history
+        store = history.STORE
+        index = store.find(self.metric)
+        y = []
+        if index is not None:
+            # Everything before this sample, which is already in the
+            # history (uncalibrated and, with averaging, unaveraged)
+            end = history.timestamp(sampletime) - 0.000001
+            for dummy, value in store.query(index, end=end):
+                if self.params["calibration"]:
+                    value = self.cal.calibrate_value(self.metric, value)
+                y.append(int(value))
+        y.append(int(latest))
+
+        x = range(0, len(y))
         xlimits = [min(x), max(x)]
-        ylimits = [min(self.history)-(0.11*min(self.history)), max(self.history)+(0.1*max(self.history))]
+        ylimits = [min(y)-(0.11*min(y)), max(y)+(0.1*max(y))]
         p = ap.AFigure(margins=(0, 0), xlim=xlimits, ylim=ylimits)
         _ = p.plot(x, y, marker='_o', plot_slope=True)
         os.system("clear")
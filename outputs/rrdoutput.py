@@ -72,7 +72,9 @@ This module is based on code by Francois Guillier, with permission
 import output
 import datetime
 import time
-import rrdtool
+import lazyimport
+
+rrdtool = lazyimport.LazyModule("rrdtool")
 
 class RRDOutput(output.Output):
     """A module to output AirPi data to an RRD file.
@@ -112,20 +114,72 @@ class RRDOutput(output.Output):
             boolean True if data successfully written to file.
 
         """
-        if self.params["calibration"]:
-            datapoints = self.cal.calibrate(datapoints)
-        names = []
-        data = [str(int(time.time()))]
-        for point in datapoints:
-            if point["name"] != "Location":
-                names.append(point["name"].replace(' ', '_'))
-                data.append(str(point["value"]))
+        return self.output_batch([(datapoints, sampletime)])
+
+    def output_batch(self, samples):
+        """Output a batch of samples.
+
+        Write all of the samples to the RRD file in as few updates as
+        possible: one, unless the readings change part-way through the
+        batch, in which case a new update (with a new template) is
+        started for the rest of it. Calibration is carried out first if
+        required. Readings which couldn't be taken are written as
+        unknown ('U').
+
+        Args:
+            self: self.
+            samples: List of (datapoints, sampletime) tuples.
+
+        Returns:
+            boolean True if data successfully written to file.
+
+        """
+        result = True
+        names = None
+        updates = []
+        for datapoints, sampletime in samples:
+            if self.params["calibration"]:
+                datapoints = self.cal.calibrate(datapoints)
+            sample = []
+            data = [str(int(time.mktime(sampletime.timetuple())))]
+            for point in datapoints:
+                if point["name"] != "Location":
+                    sample.append(point["name"].replace(' ', '_'))
+                    if point["value"] is None:
+                        data.append("U")
+                    else:
+                        data.append(str(point["value"]))
+            if sample != names:
+                # The template applies to the whole update, so write
+                # what we have so far before starting a new one
+                if updates and not self.write_updates(names, updates):
+                    result = False
+                names = sample
+                updates = []
+            updates.append(":".join(data))
+        if updates and not self.write_updates(names, updates):
+            result = False
+        return result
+
+    def write_updates(self, names, updates):
+        """Write samples to the RRD file in a single update.
+
+        Args:
+            self: self.
+            names: List of the names of the readings in each sample.
+            updates: List of samples, each in RRD's update format.
+
+        Returns:
+            boolean True if data successfully written to file.
+
+        """
         #print("Data to be written is:")
-        #print(':'.join(names), ":".join(data))
+        #print(':'.join(names), updates)
         try:
             print("[" + time.strftime("%H:%M:%S") + "] Writing to RRD file...")
-            rrdtool.update(self.filename, '-t', ':'.join(names), ":".join(data))
+            rrdtool.update(self.filename, '-t', ':'.join(names), *updates)
             print(time.strftime("[%H:%M:%S]") + " ... RRD file written.")
         except Exception as theexception:
             print(str(theexception))
+            return False
         return True
@@ -11,7 +11,9 @@ There is no facility to include GPS data at this time.
 """
 
 import output
-import MySQLdb
+import lazyimport
+
+MySQLdb = lazyimport.LazyModule("MySQLdb")
 
 class sqlDatabase(output.Output):
     """A module to write AirPi data to a MySQL database.
@@ -40,25 +42,44 @@ class sqlDatabase(output.Output):
             sampletime: datetime representing the time the sample was taken.
 
         Returns:
-            boolean True if data successfully printed to stdout.
+            boolean True if data successfully written to the database.
+
+        """
+        return self.output_batch([(datapoints, sampletime)])
+
+    def output_batch(self, samples):
+        """Output a batch of samples.
+
+        Write every reading in every sample to the database in a single
+        connection and transaction. Calibration is carried out first if
+        required.
+
+        Args:
+            self: self.
+            samples: List of (datapoints, sampletime) tuples.
+
+        Returns:
+            boolean True if data successfully written to the database.
 
         """
-        if self.params["calibration"]:
-            datapoints = self.cal.calibrate(datapoints)
+        rows = []
+        for datapoints, sampletime in samples:
+            if self.params["calibration"]:
+                datapoints = self.cal.calibrate(datapoints)
+            for point in datapoints:
+                if point["name"] != "Location":
+                    rows.append((self.params["station"], str(sampletime),
+                                    point["name"], point["value"],
+                                    point["unit"]))
+                else:
+                    print("No provision for GPS data in sqlDatabase plugin at this time")
+        if not rows:
+            return True
         conn = MySQLdb.connect(host=self.params["host"],db=self.params["db"],user=self.params["user"],passwd=self.params["passwd"])
         curs = conn.cursor()
-        statement = "INSERT INTO obs (`Station`, `Sample_Time`, `Sensor`, `Value`, `Unit`) VALUES "
-        for point in datapoints:
-            if point["name"] != "Location":
-                statement += "(\"" + self.params["station"] + "\", \"" + str(sampletime) + "\", \"" + point["name"] + "\", " + str(point["value"]) + ", \"" + point["unit"] + "\")"
-            else:
-                print("No provision for GPS data in sqlDatabase plugin at this time")
-            if len(datapoints) > 1:
-                statement += ","
-        statement = statement[:-1]
-        statement += ";"
-        #print(statement)
-        curs.execute(statement)
+        statement = "INSERT INTO obs (`Station`, `Sample_Time`, `Sensor`, `Value`, `Unit`) VALUES (%s, %s, %s, %s, %s)"
+        # MySQLdb sends all of the rows in one multi-row INSERT
+        curs.executemany(statement, rows)
         if curs.rowcount == 0:
             print("I might have failed to save the data!")
         conn.commit()
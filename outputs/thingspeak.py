@@ -1,5 +1,7 @@
 import output
-import requests
+import lazyimport
+
+requests = lazyimport.LazyModule("requests")
 
 class Thingspeak(output.Output):
 
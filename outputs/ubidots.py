@@ -8,8 +8,11 @@ does NOT require you to have the Ubidots Python API installed.
 """
 
 import output
-import requests
+import lazyimport
 import json
+import time
+
+requests = lazyimport.LazyModule("requests")
 
 class Ubidots(output.Output):
     """A module to output data to Ubidots.
@@ -47,37 +50,57 @@ class Ubidots(output.Output):
                 if value:
                     self.ubivariables[key[3:]] = value
 
-    def output_data(self, datapoints, dummy):
+    def output_data(self, datapoints, sampletime):
         """Output data.
 
         Output data in the format stipulated by the plugin. Calibration
         is carried out first if required.
-        Because this particular plugin (ubidots) does not show time, the
-        third argument (normally called 'sampletime') is called 'dummy'
-        to facilitate compliance with pylint.
 
         Args:
             self: self.
             datapoints: A dict containing the data to be output.
-            dummy: datetime representing the time the sample was taken.
+            sampletime: datetime representing the time the sample was taken.
+
+        Returns:
+            boolean True if data successfully output to Ubidots; False if
+                not
+
+        """
+        return self.output_batch([(datapoints, sampletime)])
+
+    def output_batch(self, samples):
+        """Output a batch of samples.
+
+        Send every value in every sample to Ubidots in a single request,
+        each with the time its sample was taken. Calibration is carried
+        out first if required.
+
+        Args:
+            self: self.
+            samples: List of (datapoints, sampletime) tuples.
 
         Returns:
             boolean True if data successfully output to Ubidots; False if
                 not
 
         """
-        if self.params["calibration"]:
-            datapoints = self.cal.calibrate(datapoints)
         payload = []
-        for point in datapoints:
-            for ubivariablename, ubivariableid in self.ubivariables.iteritems():
-                if point["sensor"] == ubivariablename:
-                    if point["value"] is not None:
-                        thisvalue = {}
-                        thisvalue["variable"] = ubivariableid
-                        thisvalue["value"] = point["value"]
-                        payload.append(thisvalue)
-                        break
+        for datapoints, sampletime in samples:
+            if self.params["calibration"]:
+                datapoints = self.cal.calibrate(datapoints)
+            # Ubidots wants milliseconds since the epoch
+            timestamp = int(time.mktime(sampletime.timetuple()) * 1000)
+            timestamp += sampletime.microsecond // 1000
+            for point in datapoints:
+                for ubivariablename, ubivariableid in self.ubivariables.iteritems():
+                    if point["sensor"] == ubivariablename:
+                        if point["value"] is not None:
+                            thisvalue = {}
+                            thisvalue["variable"] = ubivariableid
+                            thisvalue["value"] = point["value"]
+                            thisvalue["timestamp"] = timestamp
+                            payload.append(thisvalue)
+                            break
         headers = {'Accept': 'application/json; indent=4', 'Content-Type': 'application/json', 'X-Auth-Token': self.token}
         url = "http://things.ubidots.com/api/v1.6/collections/values"
         req = None
@@ -1,7 +1,9 @@
 import output
-import requests
+import lazyimport
 import json
 
+requests = lazyimport.LazyModule("requests")
+
 class Xively(output.Output):
     """
     Proxy code courtesy of www.raynerd.co.uk:
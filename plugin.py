@@ -6,10 +6,9 @@ be instantiated directly.
 
 """
 from abc import ABCMeta, abstractmethod
-import socket
 import ConfigParser
 import os
-import urllib2
+import network
 
 class Plugin(object):
     """Generic AirPi plugin description (abstract) for sub-classing.
@@ -141,6 +140,8 @@ class Plugin(object):
         """Check internet connectivity.
 
         Check for internet connectivity by trying to connect to a website.
+        This is only done once per run, however many plugins ask (see
+        network.py).
 
         Returns:
             boolean True if successfully connects to the site within five
@@ -149,28 +150,20 @@ class Plugin(object):
                     seconds.
 
         """
-        try:
-            urllib2.urlopen("http://www.google.com", timeout=5)
-            return True
-        except urllib2.URLError:
-            pass
-        return False
+        return network.check_conn()
 
     @staticmethod
     def gethostname():
         """Get current hostname.
 
-        Get the current hostname of the Raspberry Pi.
+        Get the current hostname of the Raspberry Pi (looked up once per
+        run; see network.py).
 
         Returns:
             string The hostname.
 
         """
-        if socket.gethostname().find('.') >= 0:
-            host = socket.gethostname()
-        else:
-            host = socket.gethostbyaddr(socket.gethostname())[0]
-        return host
+        return network.gethostname()
 
     def getname(self):
         """Get Class name.
@@ -0,0 +1,111 @@
+"""Profile an AirPi run.
+
+When profiling is switched on (using 'profile' in settings.cfg, or the
+'--profile' command line option), the run is profiled using cProfile in
+two separate phases:
+- 'setup': setting up the support, sensor, output and notification
+  plugins, etc.
+- 'sample': the first N ticks of sampling.
+For each phase, a standard pstats file (which can be loaded using the
+pstats module, or tools such as SnakeViz) and a short text report of the
+functions with the highest cumulative time are written to the log
+directory. Sampling carries on as normal once the profile is written.
+
+Note that cProfile only profiles the thread which is running the
+profiler. Sensors read by the sensor pool ('parallelreads') and outputs
+run by output workers ('asyncoutputs') happen in other threads, so
+switch those options off to include them in the profile.
+
+"""
+
+import cProfile
+import os
+import pstats
+import time
+
+class Profiler(object):
+    """Profile setup and the first N ticks of sampling."""
+
+    def __init__(self, directory, ticks, top=25):
+        """Initialise.
+
+        Args:
+            self: self.
+            directory: The directory to which profiles should be written.
+            ticks: How many ticks of sampling should be profiled.
+            top: How many functions to include in the text reports.
+
+        """
+        self.directory = directory
+        self.ticks = ticks
+        self.top = top
+        self.stamp = time.strftime("%Y%m%d-%H%M%S")
+        self.phase = None
+        self.profile = None
+        self.count = 0
+        self.files = []
+
+    def start(self, phase):
+        """Start profiling a phase.
+
+        Args:
+            self: self.
+            phase: The name of the phase (used in the file names).
+
+        """
+        self.phase = phase
+        self.count = 0
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self):
+        """Stop profiling the current phase and write the results.
+
+        Does nothing if no phase is being profiled.
+
+        Args:
+            self: self.
+
+        Returns:
+            list The paths of the files written.
+
+        """
+        if self.profile is None:
+            return []
+        self.profile.disable()
+        base = os.path.join(self.directory,
+                    "profile-" + self.stamp + "-" + self.phase)
+        self.profile.dump_stats(base + ".pstats")
+        with open(base + ".txt", "w") as report:
+            report.write("AirPi profile: " + self.phase)
+            if self.phase == "sample":
+                report.write(" (" + str(self.count) + " ticks)")
+            report.write("\n")
+            stats = pstats.Stats(self.profile, stream=report)
+            stats.sort_stats("cumulative").print_stats(self.top)
+            stats.sort_stats("time").print_stats(self.top)
+        self.profile = None
+        written = [base + ".pstats", base + ".txt"]
+        self.files.extend(written)
+        return written
+
+    def tick(self):
+        """Count one tick of sampling.
+
+        Once the requested number of ticks have been profiled, stop
+        profiling and write the results.
+
+        Args:
+            self: self.
+
+        Returns:
+            list The paths of the files written (empty unless this was
+                 the last tick to be profiled).
+
+        """
+        if self.profile is None:
+            return []
+        self.count += 1
+        if self.count >= self.ticks:
+            return self.stop()
+        return []
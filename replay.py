@@ -0,0 +1,266 @@
+"""Read AirPi data logs back in, so that they can be replayed.
+
+Read the files written by the CSVOutput and JSONOutput plugins, one
+sample at a time, so that they can be passed through calibration,
+limits and the output plugins again (see 'airpi.py --replay'). The file
+is read as a stream, so logs of any size can be replayed.
+
+Neither format records everything about each reading:
+- CSV logs have the sensor, name, symbol and reading type of each
+  reading in the header line, but not the units, so the symbol is used
+  as the unit.
+- JSON logs only have the name of each reading, so that is used as the
+  sensor too, and the unit and symbol are left empty.
+Anything missing is only used for display by most output plugins, but
+note that limits are only checked if the unit matches the one given in
+supports.cfg. Breaches recorded in the log are ignored; limits are
+checked again as each sample is replayed.
+
+"""
+
+import csv
+import datetime
+import re
+
+from sampleframe import FrameSchema
+
+# Sensor name used for GPS readings (the logs don't record it)
+GPSSENSOR = "MTK3339"
+GPSPROPS = ["latitude", "longitude", "altitude", "exposure", "disposition"]
+
+class Column(object):
+    """A sensor (or rather, one column of readings) in a log.
+
+    Has the same attributes as a sensor plugin, as far as FrameSchema is
+    concerned.
+
+    """
+
+    def __init__(self, sensorname, valname, valsymbol="", valunit=None,
+                    readingtype="sample"):
+        """Initialise.
+
+        Args:
+            self: self.
+            sensorname: The name of the sensor.
+            valname: The name of the property measured.
+            valsymbol: The symbol for the units.
+            valunit: The units (the same as the symbol by default).
+            readingtype: The type of reading ('sample' or 'pulseCount').
+
+        """
+        self.sensorname = sensorname
+        self.valname = valname
+        self.valsymbol = valsymbol
+        self.valunit = valsymbol if valunit is None else valunit
+        self.readingtype = readingtype
+        self.description = "Replayed from a log."
+
+def to_value(text):
+    """Convert a value from a log.
+
+    Args:
+        text: string The value as written in the log.
+
+    Returns:
+        float The value, or None if there isn't one.
+
+    """
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+def to_gps(sensor, values):
+    """Convert GPS values from a log into a GPS reading.
+
+    Args:
+        sensor: The name of the GPS sensor.
+        values: dict The values, keyed by property (see GPSPROPS).
+
+    Returns:
+        dict The reading, as produced by read_gps() in airpi.py.
+
+    """
+    reading = {"name": "Location", "sensor": sensor}
+    for prop, value in values.items():
+        if prop in ["exposure", "disposition"]:
+            reading[prop] = value
+        else:
+            value = to_value(value)
+            if value is not None:
+                reading[prop] = value
+    return reading
+
+class ReplayLog(object):
+    """A CSV or JSON data log to be replayed.
+
+    Iterate over samples() to get each sample in turn. Logs can contain
+    several runs (output plugins append to existing files), which may not
+    all have the same sensors; each run gets a new FrameSchema.
+
+    """
+
+    # Heading of a CSV column in a log, e.g. "BMP085-temp Temperature-BMP (C) (sample)"
+    csvheading = re.compile(r"^(.*) (\S+) \((.*)\) \((\w+)\)$")
+    # One "key":"value" pair in a JSON log (which isn't always valid JSON)
+    jsonpair = re.compile(r'"([^"]+)":"?([^",}]*)"?')
+
+    def __init__(self, filename):
+        """Initialise.
+
+        Work out whether the log is CSV or JSON from its contents.
+
+        Args:
+            self: self.
+            filename: The name of the log file.
+
+        """
+        self.filename = filename
+        self.file = open(filename, "rb")
+        self.format = None
+        for line in self.file:
+            line = line.strip()
+            if line:
+                self.format = "json" if line.startswith("{") else "csv"
+                break
+        self.file.seek(0)
+        if self.format is None:
+            raise ValueError("No data in " + filename)
+
+    def close(self):
+        """Close the log file.
+
+        Args:
+            self: self.
+
+        """
+        self.file.close()
+
+    def samples(self):
+        """Get each sample from the log in turn.
+
+        Args:
+            self: self.
+
+        Returns:
+            generator Yields (sampletime, schema, readings) for each sample,
+                      where 'sampletime' is a datetime, 'schema' is the
+                      FrameSchema for the sample and 'readings' is a list
+                      of readings in the same order as the schema (a
+                      float, or None for a missing value, or a dict for
+                      GPS readings).
+
+        """
+        if self.format == "json":
+            return self.json_samples()
+        return self.csv_samples()
+
+    def csv_samples(self):
+        """Get each sample from a CSV log in turn (see samples()).
+
+        Args:
+            self: self.
+
+        """
+        schema = None
+        widths = []
+        for row in csv.reader(self.file):
+            if not row:
+                continue
+            if row[0] == "Date and time":
+                schema, widths = self.csv_schema(row[2:])
+                continue
+            if schema is None:
+                # Metadata
+                continue
+            try:
+                sampletime = datetime.datetime.strptime(row[0],
+                                "%Y-%m-%d %H:%M:%S,%f")
+            except ValueError:
+                continue
+            readings = []
+            position = 2
+            for index, width in enumerate(widths):
+                if index in schema.extras:
+                    values = dict(zip(GPSPROPS, row[position:position + width]))
+                    readings.append(to_gps(GPSSENSOR, values))
+                else:
+                    readings.append(to_value(row[position])
+                                    if position < len(row) else None)
+                position += width
+            yield sampletime, schema, readings
+
+    def csv_schema(self, headings):
+        """Work out the schema for a CSV log from its header line.
+
+        Args:
+            self: self.
+            headings: list The column headings (after the date and time).
+
+        Returns:
+            tuple The FrameSchema, and the number of fields taken up by
+                  each reading (1, or 5 for GPS readings).
+
+        """
+        columns = []
+        gps = []
+        widths = []
+        position = 0
+        while position < len(headings):
+            heading = headings[position]
+            if heading.startswith("Latitude"):
+                column = Column(GPSSENSOR, "Location")
+                gps.append(column)
+                width = len(GPSPROPS)
+            else:
+                match = self.csvheading.match(heading)
+                if match is None:
+                    raise ValueError("Can't understand column '" + heading +
+                                    "' in " + self.filename)
+                column = Column(match.group(1), match.group(2),
+                                match.group(3), readingtype=match.group(4))
+                width = 1
+            columns.append(column)
+            widths.append(width)
+            position += width
+        return FrameSchema(columns, gps), widths
+
+    def json_samples(self):
+        """Get each sample from a JSON log in turn (see samples()).
+
+        Args:
+            self: self.
+
+        """
+        schema = None
+        keys = None
+        for line in self.file:
+            if '"Date and time"' not in line:
+                # Metadata
+                continue
+            pairs = self.jsonpair.findall(line)
+            values = dict(pairs)
+            try:
+                sampletime = datetime.datetime.strptime(
+                                values["Date and time"], "%Y-%m-%d %H:%M:%S.%f")
+            except (KeyError, ValueError):
+                continue
+            names = [key for key, _ in pairs
+                        if key not in ["Date and time", "Unix time"] and
+                        key not in GPSPROPS]
+            hasgps = any(prop in values for prop in GPSPROPS)
+            if schema is None or (names, hasgps) != keys:
+                keys = (names, hasgps)
+                columns = [Column(name, name) for name in names]
+                gps = []
+                if hasgps:
+                    gps.append(Column(GPSSENSOR, "Location"))
+                    columns.extend(gps)
+                schema = FrameSchema(columns, gps)
+            readings = [to_value(values[name]) for name in names]
+            if hasgps:
+                readings.append(to_gps(GPSSENSOR,
+                    dict((prop, values[prop]) for prop in GPSPROPS
+                            if prop in values)))
+            yield sampletime, schema, readings
@@ -0,0 +1,290 @@
+"""Pass samples between processes through a ring buffer in shared memory.
+
+When 'outputprocesses' is set in settings.cfg, output plugins run in
+separate processes from the one which reads the sensors, so that they
+can use the other cores of a multi-core Raspberry Pi and can't hold up
+the timing-critical sensor reads. The sampling process writes each
+SampleFrame into a RingBuffer: a fixed number of fixed-size records in
+an anonymous shared memory map, which is inherited by the output
+processes when they are started. Each output process has a RingReader
+with its own cursor, so they all read every record independently.
+
+The sampling process never waits for the readers. If a reader falls so
+far behind that the records it hasn't read yet have been overwritten,
+it skips to the oldest record still in the buffer and counts the
+records it missed as dropped. Each record has a sequence number, which
+is written last (and cleared before the record is changed), so that a
+reader can tell if a record was overwritten while it was reading it.
+
+Layout of the memory map:
+- Header: number of records written so far, and a 'closed' flag.
+- One status block per reader, written only by that reader: its cursor,
+  how many records it dropped, its state and whether its last output
+  worked.
+- The records. Each has a sequence number, the sample time, the length
+  of the encoded extras, then the frame's values, 'present', 'valid'
+  and 'breach' flags, and its extras (i.e. GPS readings) as JSON.
+
+"""
+
+import datetime
+import json
+import mmap
+import struct
+from array import array
+
+from sampleframe import SampleFrame
+
+EPOCH = datetime.datetime(1970, 1, 1)
+# Space for the extras (e.g. a GPS reading) in each record, per extra
+EXTRASIZE = 256
+
+# States of a reader
+STARTING = 0
+READY = 1
+FAILED = 2
+STOPPED = 3
+
+HEADER = struct.Struct("=QB")
+STATUS = struct.Struct("=QQBB")
+RECORD = struct.Struct("=QqH")
+
+class RingBuffer(object):
+    """A ring buffer of SampleFrames in shared memory.
+
+    Create it before starting the processes which read from it; they
+    share the memory map with the process which writes to it.
+
+    """
+
+    def __init__(self, schema, capacity, readers):
+        """Initialise.
+
+        Args:
+            self: self.
+            schema: The FrameSchema of the frames to be written.
+            capacity: The number of records in the buffer.
+            readers: The number of readers.
+
+        """
+        self.schema = schema
+        self.capacity = max(1, int(capacity))
+        self.readers = readers
+        size = schema.size
+        self.valuesat = RECORD.size
+        self.presentat = self.valuesat + 8 * size
+        self.validat = self.presentat + size
+        self.breachat = self.validat + size
+        self.extrasat = self.breachat + size
+        self.extrasize = EXTRASIZE * len(schema.extras)
+        self.recordsize = self.extrasat + self.extrasize
+        self.recordsat = HEADER.size + STATUS.size * readers
+        self.map = mmap.mmap(-1, self.recordsat +
+                                self.recordsize * self.capacity)
+        self.count = 0
+
+    def record(self, seq):
+        """Get where a record is in the memory map.
+
+        Args:
+            self: self.
+            seq: The sequence number of the record (from 1).
+
+        Returns:
+            int The offset of the record.
+
+        """
+        return self.recordsat + self.recordsize * ((seq - 1) % self.capacity)
+
+    def write(self, frame, sampletime):
+        """Write a frame into the next record, overwriting the oldest one
+        if the buffer is full.
+
+        Args:
+            self: self.
+            frame: The SampleFrame.
+            sampletime: datetime representing the time the sample was
+                        taken.
+
+        Raises:
+            ValueError: The frame's extras are too big for a record.
+
+        """
+        extras = ""
+        if frame.extras:
+            extras = json.dumps(frame.extras.items())
+            if len(extras) > self.extrasize:
+                raise ValueError("Extra readings too big for the ring buffer")
+        delta = sampletime - EPOCH
+        micros = (delta.days * 86400 + delta.seconds) * 1000000
+        micros += delta.microseconds
+        seq = self.count + 1
+        offset = self.record(seq)
+        mem = self.map
+        # Mark the record as being changed, so readers ignore it
+        RECORD.pack_into(mem, offset, 0, micros, len(extras))
+        mem[offset + self.valuesat:offset + self.presentat] = frame.values.tostring()
+        mem[offset + self.presentat:offset + self.validat] = str(frame.present)
+        mem[offset + self.validat:offset + self.breachat] = str(frame.valid)
+        mem[offset + self.breachat:offset + self.extrasat] = str(frame.breach)
+        if extras:
+            mem[offset + self.extrasat:offset + self.extrasat + len(extras)] = extras
+        struct.pack_into("=Q", mem, offset, seq)
+        self.count = seq
+        struct.pack_into("=Q", mem, 0, seq)
+
+    def written(self):
+        """Get the number of records written so far.
+
+        Args:
+            self: self.
+
+        Returns:
+            int The number of records.
+
+        """
+        return struct.unpack_from("=Q", self.map, 0)[0]
+
+    def close(self):
+        """Tell the readers that nothing more will be written.
+
+        Args:
+            self: self.
+
+        """
+        struct.pack_into("=B", self.map, 8, 1)
+
+    def closed(self):
+        """Check whether close() has been called.
+
+        Args:
+            self: self.
+
+        Returns:
+            boolean True if nothing more will be written.
+
+        """
+        return struct.unpack_from("=B", self.map, 8)[0] == 1
+
+    def status(self, number):
+        """Get the status of a reader.
+
+        Args:
+            self: self.
+            number: The number of the reader (from 0).
+
+        Returns:
+            dict The reader's 'cursor' (the sequence number of the next
+                 record it will read), how many records it has 'dropped',
+                 its 'state', whether its last output worked ('ok') and
+                 how many records it has still to read ('lag').
+
+        """
+        cursor, dropped, state, ok = STATUS.unpack_from(self.map,
+                                        HEADER.size + STATUS.size * number)
+        return {"cursor": cursor, "dropped": dropped, "state": state,
+                "ok": ok == 1, "lag": self.written() + 1 - cursor}
+
+    def reader(self, number):
+        """Get a reader for the buffer.
+
+        Args:
+            self: self.
+            number: The number of the reader (from 0).
+
+        Returns:
+            RingReader The reader.
+
+        """
+        return RingReader(self, number)
+
+class RingReader(object):
+    """Read frames from a RingBuffer, in order, from another process.
+
+    """
+
+    def __init__(self, ring, number):
+        """Initialise.
+
+        Start at the next record to be written.
+
+        Args:
+            self: self.
+            ring: The RingBuffer.
+            number: The number of the reader (from 0).
+
+        """
+        self.ring = ring
+        self.statusat = HEADER.size + STATUS.size * number
+        self.cursor = ring.written() + 1
+        self.dropped = 0
+        self.state = STARTING
+        self.ok = True
+        self.publish()
+
+    def publish(self):
+        """Update the reader's status block in the memory map.
+
+        Args:
+            self: self.
+
+        """
+        STATUS.pack_into(self.ring.map, self.statusat, self.cursor,
+            self.dropped, self.state, 1 if self.ok else 0)
+
+    def set_state(self, state, ok=None):
+        """Set the state of the reader (and whether its last output
+        worked), for the writing process to see.
+
+        Args:
+            self: self.
+            state: The new state (e.g. READY).
+            ok: boolean Whether the last output worked, or None to leave
+                it unchanged.
+
+        """
+        self.state = state
+        if ok is not None:
+            self.ok = ok
+        self.publish()
+
+    def read(self):
+        """Read the next frame, if there is one.
+
+        Args:
+            self: self.
+
+        Returns:
+            tuple (frame, sampletime), or None if there is nothing new to
+                  read yet.
+
+        """
+        ring = self.ring
+        while True:
+            written = ring.written()
+            if self.cursor > written:
+                return None
+            oldest = written - ring.capacity + 1
+            if self.cursor < oldest:
+                self.dropped += oldest - self.cursor
+                self.cursor = oldest
+            seq = self.cursor
+            offset = ring.record(seq)
+            raw = ring.map[offset:offset + ring.recordsize]
+            # Make sure it wasn't overwritten while being copied
+            if (RECORD.unpack_from(raw, 0)[0] != seq or
+                    struct.unpack_from("=Q", ring.map, offset)[0] != seq):
+                continue
+            dummy, micros, extralength = RECORD.unpack_from(raw, 0)
+            frame = SampleFrame(ring.schema)
+            frame.values = array('d')
+            frame.values.fromstring(raw[ring.valuesat:ring.presentat])
+            frame.present = bytearray(raw[ring.presentat:ring.validat])
+            frame.valid = bytearray(raw[ring.validat:ring.breachat])
+            frame.breach = bytearray(raw[ring.breachat:ring.extrasat])
+            if extralength:
+                extras = raw[ring.extrasat:ring.extrasat + extralength]
+                frame.extras = dict(json.loads(extras))
+            self.cursor = seq + 1
+            self.publish()
+            return frame, EPOCH + datetime.timedelta(microseconds=micros)
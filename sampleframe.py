@@ -0,0 +1,302 @@
+"""Hold one sample from all AirPi sensors in a compact, fixed layout.
+
+Most of what describes a reading (the sensor name, units, symbol, etc.)
+never changes once the sensors have been set up; only the value and
+whether it breaches a limit change from one sample to the next. So the
+description of every sensor is held once in a FrameSchema, built at
+start-up, and each sample is a SampleFrame: an array of values plus
+flags to show which values are valid and which breach limits.
+
+Output plugins which have an output_frame() method are given the frame
+itself. Other plugins are given a list of ReadingViews instead, which
+behave like the dicts which output_data() methods have always been
+given, without copying anything.
+
+"""
+
+from array import array
+from collections import Mapping
+from math import isnan
+
+class FrameSchema(object):
+    """The description of every sensor in a SampleFrame.
+
+    Hold the fields which don't change from one sample to the next
+    (unit, symbol, name, sensor, description and reading type) for each
+    sensor, in the same order as the list of sensors. Sensors which
+    return several values at once (i.e. the GPS) are described by
+    'extras'; their readings are held as a dict rather than a value.
+    Sensors which count things (i.e. whose reading type is
+    "pulseCount") are listed in 'counts', so that their values can be
+    given back as whole numbers.
+
+    """
+
+    keys = ("value", "unit", "symbol", "name", "sensor", "description",
+            "readingtype", "breach")
+
+    def __init__(self, sensors, extras=None):
+        """Initialise.
+
+        Args:
+            self: self.
+            sensors: List of enabled sensor plugin objects.
+            extras: List of sensor plugin objects (also in 'sensors')
+                    which return a dict of several values rather than a
+                    single value.
+
+        """
+        self.size = len(sensors)
+        self.fields = []
+        self.extras = []
+        self.counts = []
+        for index, sensor in enumerate(sensors):
+            if extras and sensor in extras:
+                self.extras.append(index)
+                self.fields.append({"name": sensor.valname,
+                                    "sensor": sensor.sensorname})
+            else:
+                if sensor.readingtype == "pulseCount":
+                    self.counts.append(index)
+                self.fields.append({"unit": sensor.valunit,
+                                    "symbol": sensor.valsymbol,
+                                    "name": sensor.valname,
+                                    "sensor": sensor.sensorname,
+                                    "description": sensor.description,
+                                    "readingtype": sensor.readingtype})
+
+class SampleFrame(object):
+    """One sample from all sensors.
+
+    Values are held in an array of doubles in the same order as the
+    FrameSchema. The 'present' flag shows which sensors have been read
+    into the frame at all; a value which couldn't be read has its
+    'valid' flag cleared rather than being stored as None. Readings from
+    sensors in the schema's 'extras' are held as dicts in 'extras'.
+
+    """
+
+    def __init__(self, schema):
+        """Initialise.
+
+        Args:
+            self: self.
+            schema: The FrameSchema for the frame.
+
+        """
+        self.schema = schema
+        self.values = array('d', [0.0] * schema.size)
+        self.present = bytearray(schema.size)
+        self.valid = bytearray(schema.size)
+        self.breach = bytearray(schema.size)
+        self.extras = {}
+        self.viewcache = None
+
+    def set(self, index, value, breach=False):
+        """Set the reading for a sensor.
+
+        Args:
+            self: self.
+            index: Position of the sensor in the schema.
+            value: The value read from the sensor, or None if it couldn't
+                   be read.
+            breach: Whether the value breaches a limit.
+
+        """
+        if value is None:
+            self.valid[index] = 0
+        else:
+            self.values[index] = value
+            self.valid[index] = 1
+        self.present[index] = 1
+        self.breach[index] = 1 if breach else 0
+        self.viewcache = None
+
+    def setextra(self, index, reading):
+        """Set the reading for a sensor which returns several values.
+
+        Args:
+            self: self.
+            index: Position of the sensor in the schema.
+            reading: dict The reading from the sensor.
+
+        """
+        self.extras[index] = reading
+        self.present[index] = 1
+        self.viewcache = None
+
+    def value(self, index):
+        """Get the value for a sensor.
+
+        Args:
+            self: self.
+            index: Position of the sensor in the schema.
+
+        Returns:
+            float The value (or int, for sensors in the schema's
+                  'counts'), or None if it isn't valid.
+
+        """
+        if self.valid[index]:
+            value = self.values[index]
+            if index in self.schema.counts and value.is_integer():
+                return int(value)
+            return value
+        return None
+
+    def failed(self):
+        """Get the sensors whose readings can't be used.
+
+        A reading can't be used if it is missing, NaN or exactly zero.
+        Sensors in the schema's 'extras' are never counted as failed.
+
+        Args:
+            self: self.
+
+        Returns:
+            list The positions of the failed sensors in the schema.
+
+        """
+        failed = []
+        extras = self.schema.extras
+        for index in xrange(self.schema.size):
+            if index in extras:
+                continue
+            if (not self.valid[index] or isnan(self.values[index]) or
+                    self.values[index] == 0):
+                failed.append(index)
+        return failed
+
+    def __repr__(self):
+        return repr(self.views())
+
+    def copy(self):
+        """Copy the frame.
+
+        Args:
+            self: self.
+
+        Returns:
+            SampleFrame A copy of the frame, which won't change when
+                        this one does.
+
+        """
+        frame = SampleFrame.__new__(SampleFrame)
+        frame.schema = self.schema
+        frame.values = array('d', self.values)
+        frame.present = bytearray(self.present)
+        frame.valid = bytearray(self.valid)
+        frame.breach = bytearray(self.breach)
+        frame.extras = self.extras.copy()
+        frame.viewcache = None
+        return frame
+
+    def view(self, index):
+        """Get a dict-like view of the reading for one sensor.
+
+        Args:
+            self: self.
+            index: Position of the sensor in the schema.
+
+        Returns:
+            ReadingView The view (or the dict itself, for sensors in the
+                        schema's 'extras').
+
+        """
+        if index in self.extras:
+            return self.extras[index]
+        return ReadingView(self, index)
+
+    def views(self):
+        """Get dict-like views of all readings in the frame.
+
+        The list is kept and reused until the frame next changes.
+
+        Args:
+            self: self.
+
+        Returns:
+            list One view (see view()) for each sensor which has been
+                 read into the frame.
+
+        """
+        if self.viewcache is None:
+            self.viewcache = [self.view(index)
+                                for index in xrange(self.schema.size)
+                                if self.present[index]]
+        return self.viewcache
+
+class ReadingView(Mapping):
+    """A read-only, dict-like view of one reading in a SampleFrame.
+
+    Looks just like the dicts which output_data() methods used to get, with
+    'value', 'unit', 'symbol', 'name', 'sensor', 'description',
+    'readingtype' and 'breach' keys. Use copy() to get a real dict which
+    can be changed.
+
+    """
+
+    __slots__ = ("frame", "index")
+
+    def __init__(self, frame, index):
+        """Initialise.
+
+        Args:
+            self: self.
+            frame: The SampleFrame containing the reading.
+            index: Position of the sensor in the frame's schema.
+
+        """
+        self.frame = frame
+        self.index = index
+
+    def __getitem__(self, key):
+        if key == "value":
+            return self.frame.value(self.index)
+        if key == "breach":
+            return bool(self.frame.breach[self.index])
+        return self.frame.schema.fields[self.index][key]
+
+    def __iter__(self):
+        return iter(FrameSchema.keys)
+
+    def __len__(self):
+        return len(FrameSchema.keys)
+
+    def __repr__(self):
+        return repr(self.copy())
+
+    def copy(self):
+        """Get a copy of the reading as a real dict.
+
+        Args:
+            self: self.
+
+        Returns:
+            dict The reading.
+
+        """
+        return dict(self)
+
+def deliver(plugin, data, sampletime):
+    """Pass data to an output plugin.
+
+    Pass a SampleFrame to the plugin's output_frame() method if it has
+    one, or views of the readings in it to output_data() if not. Any
+    other data (e.g. averaged data, which is a list of dicts) always
+    goes to output_data().
+
+    Args:
+        plugin: The output plugin.
+        data: SampleFrame or list The data to be output.
+        sampletime: datetime representing the time the sample was taken.
+
+    Returns:
+        The result of the plugin's output method.
+
+    """
+    if isinstance(data, SampleFrame):
+        if callable(getattr(plugin, "output_frame", None)):
+            return plugin.output_frame(data, sampletime)
+        data = data.views()
+    return plugin.output_data(data, sampletime)
@@ -0,0 +1,217 @@
+"""Schedule AirPi sampling ticks against a monotonic clock.
+
+Sampling ticks are scheduled at fixed, absolute deadlines measured from
+the start of the run (tick N fires at start + N * period), using a clock
+which can never jump backwards or forwards when the system time changes
+(e.g. when NTP syncs after the Pi boots). Because each deadline is
+calculated from the start of the run rather than from the end of the
+previous tick, time spent doing the work in a tick never causes the
+phase to drift.
+
+"""
+
+import time
+
+try:
+    monotonic = time.monotonic
+except AttributeError:
+    # Python 2 doesn't have time.monotonic(), so go straight to
+    # clock_gettime() in librt, which is always present on Raspbian.
+    try:
+        import ctypes
+        import ctypes.util
+
+        class Timespec(ctypes.Structure):
+            """struct timespec, as used by clock_gettime()."""
+            _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+        CLOCK_MONOTONIC = 1
+        LIBRT = ctypes.CDLL(ctypes.util.find_library("rt") or "librt.so.1",
+                    use_errno=True)
+        LIBRT.clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(Timespec)]
+
+        def monotonic():
+            """Get the current time from the monotonic clock.
+
+            Returns:
+                float Seconds since an arbitrary (but fixed) point.
+
+            """
+            now = Timespec()
+            if LIBRT.clock_gettime(CLOCK_MONOTONIC, ctypes.pointer(now)) != 0:
+                raise OSError(ctypes.get_errno(), "clock_gettime() failed")
+            return now.tv_sec + now.tv_nsec * 1e-9
+    except (OSError, AttributeError):
+        # Not Linux; the wall clock is the best we can do.
+        monotonic = time.time
+
+class TickScheduler(object):
+    """Schedule sampling ticks at fixed, absolute deadlines.
+
+    Tick N is due at start + N * period, where 'start' is the time of
+    the first call to wait(). If a tick's work takes so long that one or
+    more later deadlines have already passed, those ticks are skipped
+    (and counted in 'skipped') so that the following tick still happens
+    at its proper time rather than everything running late from then on.
+
+    """
+
+    def __init__(self, period, tolerance=None):
+        """Initialise.
+
+        Args:
+            self: self.
+            period: Time between ticks (seconds).
+            tolerance: How late a tick can be and still be run, rather
+                       than skipped (seconds). Defaults to a tenth of
+                       the period.
+
+        """
+        self.period = float(period)
+        if tolerance is None:
+            tolerance = self.period / 10
+        self.tolerance = tolerance
+        self.start = None
+        self.tick = 0
+        self.skipped = 0
+        self.lateness = 0.0
+
+    def wait(self):
+        """Wait until the next tick is due.
+
+        Sleep until the deadline for the next tick. The first call
+        returns immediately and sets the start time for the run.
+
+        Args:
+            self: self.
+
+        Returns:
+            int The number of the tick which is now due.
+
+        """
+        now = monotonic()
+        if self.start is None:
+            self.start = now
+            self.tick = 0
+            return self.tick
+        nexttick = self.tick + 1
+        deadline = self.start + nexttick * self.period
+        if now - deadline > self.tolerance:
+            # Overran: skip any ticks whose deadlines have already gone
+            overdue = int((now - self.start) / self.period) + 1
+            self.skipped += overdue - nexttick
+            nexttick = overdue
+            deadline = self.start + nexttick * self.period
+        # A signal (e.g. SIGUSR1) can cut a sleep short, so keep going
+        # until the deadline really has passed
+        while deadline > now:
+            time.sleep(deadline - now)
+            now = monotonic()
+        self.tick = nexttick
+        self.lateness = max(0.0, monotonic() - deadline)
+        return self.tick
+
+    def deadline(self):
+        """Get the deadline for the current tick.
+
+        Args:
+            self: self.
+
+        Returns:
+            float The monotonic time at which the current tick was due.
+
+        """
+        return self.start + self.tick * self.period
+
+    def nextdeadline(self):
+        """Get the deadline for the next tick.
+
+        Args:
+            self: self.
+
+        Returns:
+            float The monotonic time at which the next tick is due, or
+                  now if sampling hasn't started yet.
+
+        """
+        if self.start is None:
+            return monotonic()
+        return self.start + (self.tick + 1) * self.period
+
+class SensorSchedule(object):
+    """Schedule reads of individual sensors at their own intervals.
+
+    Each sensor can be read at its own interval, rather than at every
+    sampling tick. Like TickScheduler, deadlines are fixed relative to
+    the start of the run (read M of a sensor with interval I is due at
+    start + M * I), so they don't drift; if a read is missed completely,
+    the sensor just becomes due again at its next deadline.
+    Sensors which don't have their own interval use the sampling
+    period, so they are read exactly once per tick.
+
+    """
+
+    def __init__(self, intervals, period):
+        """Initialise.
+
+        Args:
+            self: self.
+            intervals: List of the interval (seconds) for each sensor, or
+                       None for sensors which should use the sampling
+                       period.
+            period: The sampling period (seconds).
+
+        """
+        self.intervals = [float(interval or period) for interval in intervals]
+        self.start = None
+        self.nexttimes = []
+
+    def begin(self, start):
+        """Start the schedule.
+
+        Make every sensor due at the given start time.
+
+        Args:
+            self: self.
+            start: The monotonic time at which sampling started.
+
+        """
+        self.start = start
+        self.nexttimes = [start] * len(self.intervals)
+
+    def popdue(self, now, slack=0.001):
+        """Get the sensors which are due to be read.
+
+        Get the indices of all sensors which are due to be read at (or
+        before) 'now', and move each of them on to its next deadline.
+
+        Args:
+            self: self.
+            now: The current monotonic time.
+            slack: How early a sensor can be read (seconds), to allow
+                   for sleeps which finish slightly early.
+
+        Returns:
+            list The indices of the sensors which are due.
+
+        """
+        due = []
+        for index, nexttime in enumerate(self.nexttimes):
+            if nexttime <= now + slack:
+                due.append(index)
+                interval = self.intervals[index]
+                count = int((now + slack - self.start) / interval) + 1
+                self.nexttimes[index] = self.start + count * interval
+        return due
+
+    def nextdue(self):
+        """Get the time at which the next sensor is due.
+
+        Args:
+            self: self.
+
+        Returns:
+            float The earliest monotonic time at which any sensor is due.
+
+        """
+        return min(self.nexttimes)
@@ -0,0 +1,120 @@
+"""Read from AirPi sensors concurrently.
+
+A small, bounded pool of worker threads which reads from the enabled
+sensors at the same time, so that the time spent waiting on one sensor
+(e.g. the BMP085 conversion delay, or the DHT22 read thread) is not
+added to the time spent waiting on all of the others.
+Sensors which share a bus (I2C, SPI/GPIO, gpsd) are never read at the
+same time as each other; they are grouped together and read one after
+another by a single worker, so the per-bus behaviour is exactly the same
+as when reading serially.
+
+"""
+
+import threading
+import Queue
+
+class SensorPool(object):
+    """Read from AirPi sensors concurrently.
+
+    A small, bounded pool of worker threads which reads from the enabled
+    sensors at the same time. Sensors are grouped by the bus they use
+    (see the 'bus' attribute of sensor.Sensor); each group is read
+    serially by one worker, while separate groups are read in parallel.
+    Readings are always returned in the same order as the list of
+    sensors passed to __init__().
+
+    """
+
+    def __init__(self, sensors, maxthreads):
+        """Initialise.
+
+        Group the sensors by bus and start the worker threads. There is
+        never any point in having more workers than bus groups, so the
+        pool size is the smaller of the two.
+
+        Args:
+            self: self.
+            sensors: List of enabled sensor plugin objects, in the order
+                     in which readings should be returned.
+            maxthreads: The maximum number of worker threads to use.
+
+        """
+        self.size = len(sensors)
+        self.groups = []
+        buses = {}
+        for index, sensor in enumerate(sensors):
+            bus = getattr(sensor, "bus", None)
+            if bus not in buses:
+                buses[bus] = []
+                self.groups.append(buses[bus])
+            buses[bus].append((index, sensor))
+        self.buses = [getattr(group[0][1], "bus", None) for group in self.groups]
+        self.jobs = Queue.Queue()
+        self.done = Queue.Queue()
+        self.workers = []
+        for dummy in range(max(1, min(int(maxthreads), len(self.groups)))):
+            worker = threading.Thread(target=self.work)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def work(self):
+        """Read sensor groups as they are requested.
+
+        Run by each worker thread. Take one group of sensors at a time
+        from the job queue and read each of them in turn, storing the
+        readings at the correct position in the shared results list.
+        Any exception is passed back to the thread which requested the
+        reading rather than killing the worker.
+
+        Args:
+            self: self.
+
+        """
+        while True:
+            group, readfunc, results = self.jobs.get()
+            error = None
+            try:
+                for index, sensor in group:
+                    results[index] = readfunc(sensor)
+            except Exception as excep:
+                error = excep
+            self.done.put(error)
+
+    def read(self, readfunc, indices=None):
+        """Read from sensors in the pool.
+
+        Read from all sensors in the pool (or just some of them) and wait
+        for every group to finish. If reading any sensor raised an
+        exception, the first such exception is re-raised here once all
+        groups are finished, just as it would have been if the sensors
+        were read serially.
+
+        Args:
+            self: self.
+            readfunc: Function which takes a single sensor plugin and
+                      returns its reading (e.g. getval()).
+            indices: Positions of the sensors to read, or None to read
+                     all of them.
+
+        Returns:
+            list The readings, in the same order as the sensors were
+                 passed to __init__(). Sensors which weren't read have
+                 None in their place.
+
+        """
+        results = [None] * self.size
+        groups = self.groups
+        if indices is not None:
+            wanted = set(indices)
+            groups = [[(index, sensor) for index, sensor in group
+                        if index in wanted] for group in groups]
+            groups = [group for group in groups if group]
+        for group in groups:
+            self.jobs.put((group, readfunc, results))
+        errors = [self.done.get() for dummy in groups]
+        for error in errors:
+            if error is not None:
+                raise error
+        return results
@@ -1,3 +1,4 @@
+import gps as gpsmodule
 from gps import *
 from time import sleep
 import subprocess
@@ -17,9 +18,12 @@ class GpsController(threading.Thread):
         """Create new object if socket exists.
         
         Create a new GpsController object. Abort creation of the instance if the
-        GPS socket hasn't been set up at /var/run/gpsd.sock.
+        GPS socket hasn't been set up at /var/run/gpsd.sock. There is no
+        socket to check for if the GPS is being simulated.
 
         """
+        if getattr(gpsmodule, "SIMULATED", False):
+            return super(GpsController, cls).__new__(cls)
         if subprocess.call(['test', '-S', '/var/run/gpsd.sock']) != 1:
             return super(GpsController, cls).__new__(cls)
         else:
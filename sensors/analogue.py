@@ -3,18 +3,54 @@ Generic class to support analogue sensors.
 
 The MCP3008 ADC is used by this class, and output can be in
 either Ohms or millivolts depending on the exact sensor in question.
+Noisy sensors can be oversampled: the ADC converts their channel several
+times in a row, and the results are reduced to one (fractional) code,
+which gives extra resolution.
+The value for each possible code is worked out in advance, in a
+codetable.CodeTable, so each reading is just a lookup (or, for
+fractional codes, an interpolation between two entries).
 
 """
 import mcp3008
 import sensor
+import codetable
+
+def mean(codes):
+    """Reduce codes to their mean."""
+    return float(sum(codes)) / len(codes)
+
+def median(codes):
+    """Reduce codes to their median."""
+    ordered = sorted(codes)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return float(ordered[middle])
+    return (ordered[middle - 1] + ordered[middle]) / 2.0
+
+def trimmed(codes):
+    """Reduce codes to their mean, leaving out the lowest and highest
+    quarter (the interquartile mean).
+
+    """
+    ordered = sorted(codes)
+    cut = len(ordered) // 4
+    kept = ordered[cut:len(ordered) - cut]
+    return float(sum(kept)) / len(kept)
+
+# Ways of reducing oversampled codes, for the 'reduce' option
+REDUCTIONS = {"mean": mean, "median": median, "trimmed": trimmed}
 
 class Analogue(sensor.Sensor):
     """ The MCP3008 ADC is used by this class, and output can be in
     either Ohms or millivolts depending on the exact sensor in question.
 
     """
+    # SPI to the MCP3008 is bit-banged over GPIO, unless it uses the
+    # spidev backend (see __init__())
+    bus = "gpio"
     requiredData = ["adcpin", "measurement", "sensorname"]
-    optionalData = ["pullupResistance", "pulldownResistance", "sensorvoltage", "description"]
+    optionalData = ["pullupResistance", "pulldownResistance", "sensorvoltage",
+                    "description", "oversample", "reduce"]
 
     def __init__(self, data):
         """Initialise.
@@ -28,7 +64,16 @@ class Analogue(sensor.Sensor):
 
         """
         self.adc = mcp3008.MCP3008.sharedClass
+        self.bus = self.adc.bus
         self.adcpin = int(data["adcpin"])
+        self.oversample = int(data.get("oversample", 1))
+        reduction = data.get("reduce", "mean").lower()
+        if self.oversample < 1 or reduction not in REDUCTIONS:
+            msg = "'oversample' must be at least 1, and 'reduce' one of: "
+            msg += ", ".join(sorted(REDUCTIONS))
+            raise ValueError(msg)
+        self.reduction = REDUCTIONS[reduction]
+        self.adc.register(self.adcpin, self.oversample)
         self.valname = data["measurement"]
         self.sensorname = data["sensorname"]
         self.readingtype = "sample"
@@ -61,6 +106,45 @@ class Analogue(sensor.Sensor):
             self.description = data["description"]
         else:
             self.description = "An analogue sensor."
+        self.table = None
+        self.build_table()
+
+    def build_table(self):
+        """Work out the value for every ADC code.
+
+        The table is registered in codetable.TABLES so that calibration
+        can use it too. It is rebuilt by getval() if the resistor values
+        or the sensor voltage are changed.
+
+        Args:
+            self: self.
+
+        """
+        self.table = codetable.CodeTable(self.convert,
+                        (self.pullup, self.pulldown, self.sensorvoltage))
+        codetable.TABLES[self.sensorname] = self.table
+
+    def convert(self, code):
+        """Convert an ADC code to a value.
+
+        Args:
+            self: self.
+            code: The code (0 to 1023; may be fractional if oversampled).
+
+        Returns:
+            float The value, in either Ohms or millivolts depending on the
+                  exact sensor.
+
+        """
+        vout = float(code)/1023 * 3.3
+
+        if self.pulldown != None:
+            resout = (self.pulldown * self.sensorvoltage) / vout - self.pulldown
+        elif self.pullup != None:
+            resout = self.pullup / ((self.sensorvoltage / vout) - 1)
+        else:
+            resout = vout * 1000
+        return resout
 
     def getval(self):
         """Get the current sensor value.
@@ -77,14 +161,18 @@ class Analogue(sensor.Sensor):
             None If there is potentially an error with the data.
 
         """
-        result = self.adc.readadc(self.adcpin)
-        if result == 0:
+        codes = self.adc.read(self.adcpin)
+        if self.oversample > 1:
+            result = self.reduction(codes)
+        else:
+            result = codes[0]
+        if result <= 0:
             msg = "Error: Check wiring for the " + self.sensorname
             msg += " measurement, no voltage detected on ADC input "
             msg += str(self.adcpin)
             print(msg)
             return None
-        if result == 1023:
+        if result >= 1023:
             if self.sensorname == "LDR":
                 # Carrying on with 1023 gives divide by zero error below
                 result = 1022
@@ -94,12 +182,6 @@ class Analogue(sensor.Sensor):
                 msg += str(self.adcpin)
                 print(msg)
                 return None
-        vout = float(result)/1023 * 3.3
-
-        if self.pulldown != None:
-            resout = (self.pulldown * self.sensorvoltage) / vout - self.pulldown
-        elif self.pullup != None:
-            resout = self.pullup / ((self.sensorvoltage / vout) - 1)
-        else:
-            resout = vout * 1000
-        return resout
+        if self.table.key != (self.pullup, self.pulldown, self.sensorvoltage):
+            self.build_table()
+        return self.table.lookup(result)
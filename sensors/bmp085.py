@@ -4,9 +4,16 @@ A high-level Class to read data from the Bosch BMP085 sensor, which
 provides barometric (air pressure) and temperature readings. Requires
 the bmpBackend Class to read the raw data from the sensor.
 
+Temperature and pressure are measured together: the first instance to
+be read takes one combined measurement, and the others (including an
+altitude instance, if there is one) are given readings from it, so the
+temperature conversion isn't done twice.
+
 """
+import threading
 import sensor
 import bmpBackend
+import scheduler
 
 class BMP085(sensor.Sensor):
     """ Read data from BMP085 sensor.
@@ -17,9 +24,18 @@ class BMP085(sensor.Sensor):
 
     """
 
+    bus = "i2c"
     bmpClass = None
     requiredData = ["measurement", "i2cbus"]
-    optionalData = ["altitude", "mslp", "unit", "description"]
+    optionalData = ["altitude", "mslp", "unit", "description", "sealevel",
+                    "maxAge"]
+
+    # The latest combined measurement (temperature in C, pressure in Pa),
+    # when it was taken, and which instances have been given it
+    measurement = None
+    measured = None
+    consumed = set()
+    lock = threading.Lock()
 
     def __init__(self, data):
         """Initialise BMP085 sensor class.
@@ -28,7 +44,10 @@ class BMP085(sensor.Sensor):
         Instances of this class can be set to monitor either temperature
         ('temp') or pressure ('pres'). This is determined by the contents of
         'data' passed to this __init__ function. If you want to read both
-        properties, you'll need two instances of the class.
+        properties, you'll need two instances of the class (which share
+        one measurement). An instance can also be set to give the altitude
+        ('alt'), worked out from the pressure and data["sealevel"] (the
+        pressure at sea level, in Hectopascals; 1013.25 by default).
         When set to read temperature, self.valname is 'Temperature-BMP' to
         differentiate it from other temperature sensors on the AirPi (such as
         the DHT22). By default temperatures are read in Celsius; data["unit"]
@@ -71,6 +90,14 @@ class BMP085(sensor.Sensor):
                         msg += " (in m) for the BMP085 pressure module."
                         print(msg)
                         self.mslp = False
+        elif "alt" in data["measurement"].lower():
+            self.sensorname = "BMP085-alt"
+            self.valname = "Altitude"
+            self.valsymbol = "m"
+            self.valunit = "Metres"
+            self.sealevel = float(data.get("sealevel", 1013.25)) * 100
+        # How old a measurement can be before another is taken (seconds)
+        self.maxage = float(data.get("maxAge", 0.5))
         if "description" in data:
             self.description = data["description"]
         else:
@@ -79,10 +106,35 @@ class BMP085(sensor.Sensor):
             BMP085.bmpClass = bmpBackend.BMP085(bus=int(data["i2cbus"]))
         return
 
+    def measure(self):
+        """Get the latest combined temperature and pressure measurement.
+
+        A new measurement is taken if this instance has already been given
+        the latest one (i.e. it is being read for the next sample), or if
+        it is more than 'maxAge' seconds old.
+
+        Args:
+            self: self.
+
+        Returns:
+            tuple (temperature in Celsius, pressure in Pascals).
+
+        """
+        with BMP085.lock:
+            now = scheduler.monotonic()
+            if (BMP085.measurement is None or
+                    self in BMP085.consumed or
+                    now - BMP085.measured > self.maxage):
+                BMP085.measurement = BMP085.bmpClass.readall()
+                BMP085.measured = now
+                BMP085.consumed = set()
+            BMP085.consumed.add(self)
+            return BMP085.measurement
+
     def getval(self):
         """Get the current sensor value.
 
-        Get the current sensor value, for either temperature or pressure
+        Get the current sensor value, for temperature, pressure or altitude
         (whichever is appropriate to this instance of the class).
 
         Args:
@@ -92,8 +144,8 @@ class BMP085(sensor.Sensor):
             float The current value for the sensor.
 
         """
+        temp, pressure = self.measure()
         if self.valname == "Temperature-BMP":
-            temp = BMP085.bmpClass.readtemperature()
             if self.valunit == "Fahrenheit":
                 try:
                     temp = temp * 1.8 + 32
@@ -109,6 +161,9 @@ class BMP085(sensor.Sensor):
         elif self.valname == "Pressure":
             # Multiply by 0.01 to convert to Hectopascals
             if self.mslp:
-                return BMP085.bmpClass.readmslpressure(self.altitude) * 0.01
+                return bmpBackend.calculatemslpressure(pressure,
+                            self.altitude) * 0.01
             else:
-                return BMP085.bmpClass.readpressure() * 0.01
+                return pressure * 0.01
+        elif self.valname == "Altitude":
+            return bmpBackend.calculatealtitude(pressure, self.sealevel)
@@ -136,14 +136,23 @@ class BMP085:
 
     def readtemperature(self):
         "Gets the compensated temperature in degrees celcius"
-        UT = 0
+        # Read raw temp before aligning it with the calibration values
+        return self.compensatetemperature(self.readrawtemp())
+
+    def readall(self):
+        "Gets the compensated temperature (C) and pressure (Pa) from one measurement"
+        UT = self.readrawtemp()
+        UP = self.readrawpressure()
+        return (self.compensatetemperature(UT),
+                self.compensatepressure(UT, UP))
+
+    def compensatetemperature(self, UT):
+        "Calculates the temperature in degrees celcius from a raw temperature"
         X1 = 0
         X2 = 0
         B5 = 0
         temp = 0.0
 
-        # Read raw temp before aligning it with the calibration values
-        UT = self.readrawtemp()
         X1 = ((UT - self._cal_AC6) * self._cal_AC5) >> 15
         X2 = (self._cal_MC << 11) / (X1 + self._cal_MD)
         B5 = X1 + X2
@@ -154,8 +163,12 @@ class BMP085:
 
     def readpressure(self):
         "Gets the compensated pressure in pascal"
-        UT = 0
-        UP = 0
+        UT = self.readrawtemp()
+        UP = self.readrawpressure()
+        return self.compensatepressure(UT, UP)
+
+    def compensatepressure(self, UT, UP):
+        "Calculates the pressure in pascal from raw temperature and pressure"
         B3 = 0
         B5 = 0
         B6 = 0
@@ -166,9 +179,6 @@ class BMP085:
         B4 = 0
         B7 = 0
 
-        UT = self.readrawtemp()
-        UP = self.readrawpressure()
-
         # You can use the datasheet values to test the conversion results
         # dsvalues = True
         dsvalues = False
@@ -245,20 +255,24 @@ class BMP085:
 
     def readaltitude(self, sealevelpressure=101325):
         "Calculates the altitude in meters"
-        altitude = 0.0
-        pressure = float(self.readpressure())
-        altitude = 44330.0 * (1.0 - pow(pressure / sealevelpressure, 0.1903))
+        altitude = calculatealtitude(self.readpressure(), sealevelpressure)
         if self.debug:
             print("DBG: Altitude = %d" % (altitude))
         return altitude
 
     def readmslpressure(self, altitude):
         "Calculates the mean sea level pressure"
-        pressure = float(self.readpressure())
-        T0 = float(altitude) / 44330
-        T1 = math.pow(1 - T0, 5.255)
-        mslpressure = pressure / T1
-        return mslpressure
+        return calculatemslpressure(self.readpressure(), altitude)
+
+def calculatealtitude(pressure, sealevelpressure=101325):
+    "Calculates the altitude in meters from a pressure in pascal"
+    return 44330.0 * (1.0 - pow(float(pressure) / sealevelpressure, 0.1903))
+
+def calculatemslpressure(pressure, altitude):
+    "Calculates the mean sea level pressure from a pressure in pascal"
+    T0 = float(altitude) / 44330
+    T1 = math.pow(1 - T0, 5.255)
+    return float(pressure) / T1
 
 if __name__ == "__main__":
     bmp = BMP085()
@@ -22,6 +22,7 @@ class DHT22(sensor.Sensor):
     read the raw data from the sensor.
 
     """
+    bus = "gpio"
     requiredData = ["measurement", "pinnumber"]
     optionalData = ["unit", "description"]
 
@@ -1,11 +1,24 @@
 """ Read data from MCP3008 inputs.
 
 A low-level Class to read data from inputs to the MCP3008
-analogue-to-digital converter (ADC) chip. This communicates using SPI.
+analogue-to-digital converter (ADC) chip. This communicates using SPI,
+either bit-banged over GPIO pins (the default, and the way the chip is
+wired on the AirPi board) or using the Raspberry Pi's hardware SPI
+through the kernel's spidev driver ('backend = spidev' in sensors.cfg).
+
+Analogue sensors don't read their own channel directly: the first of
+them to be read converts every channel in use, one straight after
+another, and the rest are given their codes from that scan. So all the
+analogue readings in a sample are taken at (almost) the same moment.
+Channels used by sensors with 'oversample' set are converted that many
+times in a row in each scan.
 
 """
+import threading
+from array import array
 import RPi.GPIO as GPIO
 import sensor
+import scheduler
 
 class MCP3008(sensor.Sensor):
     """ Read data from MCP3008 inputs.
@@ -14,12 +27,42 @@ class MCP3008(sensor.Sensor):
     analogue-to-digital converter (ADC) chip. This communicates using SPI.
 
     """
+    # SPI is bit-banged over GPIO, unless the spidev backend is used
+    bus = "gpio"
     requiredData = []
-    optionalData = ["mosiPin", "misoPin", "csPin", "clkPin"]
+    optionalData = ["mosiPin", "misoPin", "csPin", "clkPin", "backend",
+                    "spiBus", "spiDevice", "spiSpeed", "maxAge"]
 
     sharedClass = None
 
     def __init__(self, data):
+        # Channels used by analogue sensors, and a buffer for each to hold
+        # the codes from each conversion in the last scan
+        self.channels = []
+        self.codes = {}
+        self.scannedchannels = set()
+        self.consumed = set()
+        self.scanned = None
+        self.maxage = float(data.get("maxAge", 0.5))
+        self.lock = threading.Lock()
+        self.spi = None
+        if data.get("backend", "gpio").lower() == "spidev":
+            self.spi = self.open_spidev(data)
+        if self.spi is not None:
+            self.bus = "spi"
+        else:
+            self.setup_gpio(data)
+        if MCP3008.sharedClass == None:
+            MCP3008.sharedClass = self
+
+    def setup_gpio(self, data):
+        """ Set up the GPIO pins used to bit-bang SPI.
+
+        Args:
+            self: self.
+            data: A dict containing the parameters to be used during setup.
+
+        """
         GPIO.setmode(GPIO.BCM)
         GPIO.setwarnings(False)
         # Default pins
@@ -40,14 +83,134 @@ class MCP3008(sensor.Sensor):
         GPIO.setup(self.SPIMISO, GPIO.IN)
         GPIO.setup(self.SPICLK, GPIO.OUT)
         GPIO.setup(self.SPICS, GPIO.OUT)
-        if MCP3008.sharedClass == None:
-            MCP3008.sharedClass = self
+
+    def open_spidev(self, data):
+        """ Open the kernel SPI device which the MCP3008 is connected to.
+
+        Args:
+            self: self.
+            data: A dict containing the parameters to be used during setup.
+
+        Returns:
+            spidev.SpiDev The open device, or None if it couldn't be
+                          opened (in which case SPI is bit-banged over
+                          GPIO instead).
+
+        """
+        spibus = int(data.get("spiBus", 0))
+        spidevice = int(data.get("spiDevice", 0))
+        try:
+            import spidev
+            spi = spidev.SpiDev()
+            spi.open(spibus, spidevice)
+        except (ImportError, IOError) as excep:
+            msg = "Could not open /dev/spidev" + str(spibus) + "."
+            msg += str(spidevice) + " for the MCP3008 (" + str(excep) + ");"
+            msg += " bit-banging SPI over GPIO instead."
+            print(msg)
+            return None
+        spi.mode = 0
+        spi.max_speed_hz = int(data.get("spiSpeed", 1000000))
+        return spi
+
+    def register(self, adcnum, conversions=1):
+        """ Add a channel to those converted by each scan.
+
+        Args:
+            self: self.
+            adcnum: The channel number (0 to 7).
+            conversions: How many times the channel should be converted in
+                         each scan. If it is registered more than once,
+                         the most conversions asked for are made.
+
+        Raises:
+            ValueError: The channel number is invalid.
+
+        """
+        if (adcnum > 7) or (adcnum < 0):
+            raise ValueError("MCP3008 channel must be 0 to 7, not " +
+                str(adcnum))
+        with self.lock:
+            if adcnum not in self.channels:
+                self.channels.append(adcnum)
+                self.channels.sort()
+            if len(self.codes.get(adcnum, ())) < conversions:
+                self.codes[adcnum] = array('H', [0]) * conversions
+                self.scannedchannels.discard(adcnum)
+
+    def read(self, adcnum):
+        """ Get a channel's codes from the latest scan of all channels.
+
+        A new scan is made if this channel has already been given the
+        codes from the latest one (i.e. it is being read for the next
+        sample), or if that scan is more than 'maxAge' seconds old.
+
+        Args:
+            self: self.
+            adcnum: The channel number (0 to 7).
+
+        Returns:
+            array The conversion result (0 to 1023) from each conversion
+                  of the channel in the scan, in the order they were
+                  made. It is reused by the next scan.
+
+        Raises:
+            ValueError: The channel number is invalid.
+
+        """
+        if adcnum not in self.codes:
+            self.register(adcnum)
+        with self.lock:
+            now = scheduler.monotonic()
+            if (adcnum in self.consumed or
+                    adcnum not in self.scannedchannels or
+                    now - self.scanned > self.maxage):
+                self.scan(now)
+            self.consumed.add(adcnum)
+            return self.codes[adcnum]
+
+    def scan(self, now):
+        """ Convert every channel in use, one straight after another.
+
+        Each channel is converted as many times as it was registered
+        for, in a tight burst. Must be called with the lock held.
+
+        Args:
+            self: self.
+            now: scheduler.monotonic() time of the scan.
+
+        """
+        readadc = self.readadc
+        for channel in self.channels:
+            codes = self.codes[channel]
+            for conversion in xrange(len(codes)):
+                codes[conversion] = readadc(channel)
+        self.scannedchannels = set(self.channels)
+        self.consumed = set()
+        self.scanned = now
+
+    def readadc_spidev(self, adcnum):
+        """ Read SPI data from MCP3008 using hardware SPI.
+
+        Used by readadc() when the spidev backend is in use. The result
+        is the same as that of the bit-banged readadc(). Three bytes are
+        exchanged: the start bit, then the single-ended bit and channel
+        number, then a dummy byte; the ten bits of the result are the
+        bottom two bits of the second byte back and all of the third.
+        """
+        if (adcnum > 7) or (adcnum < 0):
+            # Invalid pin number
+            return -1
+        reply = self.spi.xfer2([1, (8 + adcnum) << 4, 0])
+        return ((reply[1] & 3) << 8) + reply[2]
 
     def readadc(self, adcnum):
         """ Read SPI data from MCP3008.
 
         Read SPI data from MCP3008 chip. 8 possible adc's (0 thru 7).
         """
+        if self.spi is not None:
+            return self.readadc_spidev(adcnum)
         if (adcnum > 7) or (adcnum < 0):
             # Invalid pin number
             return -1
@@ -24,6 +24,7 @@ class Raingauge(sensor.Sensor):
     http://www.maplin.co.uk/p/maplin-replacement-rain-gauge-for-n25frn96fyn96gy-n77nf
 
     """
+    bus = "gpio"
     requiredData = ["pinnumber"]
     optionalData = ["description"]
 
@@ -74,7 +75,7 @@ class Raingauge(sensor.Sensor):
         self.rain = 0
         return rain
 
-    def buckettip(channel, self):
+    def buckettip(self, channel):
         """Record a bucket tip.
 
         Record a bucket tip. Note that "channel" must always be passed to this
@@ -21,6 +21,17 @@ class Sensor(object):
 
     __metaclass__ = ABCMeta
 
+    # The bus used to talk to the sensor hardware, e.g. "i2c", "gpio" or
+    # "gpsd". Sensors on the same bus are never read at the same time as
+    # each other when 'parallelreads' is switched on in settings.cfg.
+    # Sensors which don't say which bus they use are all read serially
+    # together, to be safe.
+    bus = None
+
+    # How often the sensor should be read (seconds), if not at every
+    # sampling tick. Set from the 'interval' option in sensors.cfg.
+    interval = None
+
     @abstractmethod
     def __init__(self, data):
         """Error if sub-class doesn't init itself.
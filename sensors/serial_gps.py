@@ -4,6 +4,7 @@ import GpsController
 gpsc = None # define gps data structure
 
 class serial_gps(sensor.Sensor):
+    bus = "gpsd"
     requiredData = []
     optionalData = []
 
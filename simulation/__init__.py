@@ -0,0 +1,174 @@
+"""Simulate the AirPi hardware.
+
+Stand-ins for the modules which talk to the AirPi hardware (RPi.GPIO,
+spidev, smbus, dhtreader and gps), so that the unmodified sampler, sensor and
+output plugins can be run, tested and benchmarked on an ordinary Linux
+machine with no AirPi board attached. The simulated devices are:
+- An MCP3008 ADC, read over (bit-banged) SPI on the usual GPIO pins, or
+  over hardware SPI using spidev.
+- A BMP085 temperature / pressure sensor on the I2C bus.
+- A DHT22 temperature / humidity sensor.
+- A GPS, in place of gpsd.
+- A rain gauge, which tips at random.
+Each produces a synthetic signal with noise (and, where appropriate,
+latency), as set in cfg/simulation.cfg; see signals.py for details.
+
+Simulation is switched on by setting 'simulate = yes' in the [Debug]
+section of settings.cfg, or by setting the AIRPI_SIMULATE environment
+variable (which overrides settings.cfg). It must be installed before any
+of the real modules are imported, i.e. before 'import RPi.GPIO'.
+
+"""
+
+import ConfigParser
+import os
+import sys
+
+# Whether simulation has been installed
+ACTIVE = False
+
+# Settings used for anything which isn't in cfg/simulation.cfg
+DEFAULTS = {
+    "MCP3008": {
+        "mosipin": "23",
+        "misopin": "24",
+        "clkpin": "18",
+        "cspin": "25",
+        # The /dev/spidev<bus>.<device> it is on, for the spidev backend
+        "spibus": "0",
+        "spidevice": "0",
+        "vref": "3.3",
+        # Volts on each channel: base, amplitude, period (s), noise
+        "channel0": "1.6, 0.8, 600, 0.01",
+        "channel1": "1.2, 0.2, 900, 0.02",
+        "channel2": "0.9, 0.1, 1200, 0.02",
+        "channel3": "2.1, 0.3, 1500, 0.02",
+        "channel4": "0.5, 0.3, 30, 0.05",
+        "channel5": "1.4, 0.2, 1800, 0.02",
+        "channel6": "1.65, 0, 0, 0.01",
+        "channel7": "1.65, 0, 0, 0.01",
+    },
+    "BMP085": {
+        # Temperature (Celsius) and pressure (Pa)
+        "temperature": "18, 4, 3600, 0.05",
+        "pressure": "101325, 300, 7200, 5",
+        # Extra time taken by each I2C transfer (s)
+        "latency": "0",
+    },
+    "DHT22": {
+        # Temperature (Celsius) and relative humidity (%)
+        "temperature": "18.5, 4, 3600, 0.1",
+        "humidity": "55, 10, 5400, 0.5",
+        # Time taken by each reading (s), and the fraction which fail
+        "latency": "0",
+        "failurerate": "0",
+    },
+    "GPS": {
+        "latitude": "53.381, 0.001, 600, 0.00001",
+        "longitude": "-1.486, 0.001, 600, 0.00001",
+        "altitude": "90, 2, 600, 0.5",
+        "speed": "0, 0, 0, 0",
+        # Time between fixes (s)
+        "interval": "1",
+    },
+    "Raingauge": {
+        "pinnumber": "17",
+        "tipsperhour": "20",
+    },
+}
+
+def basedir():
+    """Get the AirPi directory.
+
+    Work out the directory containing the 'cfg' directory in the same
+    way as airpi.py does.
+
+    Returns:
+        string The directory.
+
+    """
+    directory = os.path.abspath('.')
+    if directory == "/":
+        directory = "/home/pi/AirPi"
+    return directory
+
+def requested():
+    """Check whether simulation has been requested.
+
+    Check the AIRPI_SIMULATE environment variable first; if that isn't
+    set, check for 'simulate' in the [Debug] section of settings.cfg.
+
+    Returns:
+        boolean Whether simulation has been requested.
+
+    """
+    env = os.environ.get("AIRPI_SIMULATE")
+    if env is not None:
+        return env.strip().lower() not in ("", "0", "no", "off", "false")
+    settings = ConfigParser.SafeConfigParser()
+    settings.read(os.path.join(basedir(), "cfg", "settings.cfg"))
+    if settings.has_option("Debug", "simulate"):
+        return settings.getboolean("Debug", "simulate")
+    return False
+
+def load_config():
+    """Load the simulation settings.
+
+    Start with the defaults, then apply anything in cfg/simulation.cfg
+    (if it exists).
+
+    Returns:
+        ConfigParser The settings.
+
+    """
+    config = ConfigParser.SafeConfigParser()
+    for section, options in DEFAULTS.items():
+        config.add_section(section)
+        for option, value in options.items():
+            config.set(section, option, value)
+    config.read(os.path.join(basedir(), "cfg", "simulation.cfg"))
+    return config
+
+def install():
+    """Install the simulated hardware modules.
+
+    Put the simulated modules into sys.modules in place of the real
+    ones, so that they are used by any later imports.
+
+    """
+    global ACTIVE
+    import gpio
+    import spidev
+    import smbus
+    import dhtreader
+    import gps
+
+    config = load_config()
+    gpio.configure(config)
+    spidev.configure(config)
+    smbus.configure(config)
+    dhtreader.configure(config)
+    gps.configure(config)
+
+    rpi = type(sys)("RPi")
+    rpi.GPIO = gpio
+    sys.modules["RPi"] = rpi
+    sys.modules["RPi.GPIO"] = gpio
+    sys.modules["spidev"] = spidev
+    sys.modules["smbus"] = smbus
+    # The sensors import dhtreader relative to their own package
+    sys.modules["dhtreader"] = dhtreader
+    sys.modules["sensors.dhtreader"] = dhtreader
+    sys.modules["gps"] = gps
+    ACTIVE = True
+
+def install_if_requested():
+    """Install the simulated hardware modules if simulation is requested.
+
+    Returns:
+        boolean Whether simulation is active.
+
+    """
+    if not ACTIVE and requested():
+        install()
+    return ACTIVE
@@ -0,0 +1,53 @@
+"""Simulated dhtreader.
+
+A stand-in for the dhtreader shared object, installed in its place when
+the AirPi hardware is being simulated. Like the real thing, a reading
+takes a while and sometimes fails (raising an exception), as set in
+cfg/simulation.cfg.
+
+"""
+
+import random
+import time
+
+from signals import Signal, parse
+
+TEMPERATURE = Signal(18.5)
+HUMIDITY = Signal(55)
+LATENCY = 0.0
+FAILURERATE = 0.0
+
+def configure(config):
+    """Set up the simulated sensor.
+
+    Args:
+        config: ConfigParser containing cfg/simulation.cfg.
+
+    """
+    global TEMPERATURE, HUMIDITY, LATENCY, FAILURERATE
+    TEMPERATURE = parse(config.get("DHT22", "temperature"))
+    HUMIDITY = parse(config.get("DHT22", "humidity"))
+    LATENCY = config.getfloat("DHT22", "latency")
+    FAILURERATE = config.getfloat("DHT22", "failurerate")
+
+def init():
+    pass
+
+def read(sensortype, pin):
+    """Read the temperature and humidity.
+
+    Args:
+        sensortype: The type of sensor (11, 22 or 2302).
+        pin: The GPIO pin to which the sensor is connected.
+
+    Returns:
+        tuple The temperature (Celsius) and relative humidity (%).
+
+    """
+    if LATENCY:
+        time.sleep(LATENCY)
+    if FAILURERATE and random.random() < FAILURERATE:
+        raise Exception("Failed to read from DHT" + str(sensortype) +
+                        " on pin " + str(pin))
+    humidity = max(0.0, min(100.0, HUMIDITY.value()))
+    return round(TEMPERATURE.value(), 1), round(humidity, 1)
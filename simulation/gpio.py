@@ -0,0 +1,218 @@
+"""Simulated RPi.GPIO.
+
+A stand-in for the RPi.GPIO module, installed in its place when the
+AirPi hardware is being simulated. Pin state is just remembered, except
+for pins which are wired to a simulated device:
+- An MCP3008 ADC, which is read by bit-banging SPI over four pins (see
+  sensors/mcp3008.py). The simulated chip follows the same protocol as
+  the real one: on each rising clock edge while CS is low it shifts in
+  a command bit (start, single-ended, D2, D1, D0); once all five have
+  arrived it shifts out a null bit followed by the ten bits (B9 first)
+  of the conversion result.
+- A rain gauge, which 'tips' at random at a configured average rate,
+  calling any callback registered with add_event_detect().
+
+"""
+
+import random
+import threading
+import time
+
+from signals import parse
+
+# Constants, with the same values as the real RPi.GPIO
+BOARD = 10
+BCM = 11
+OUT = 0
+IN = 1
+LOW = 0
+HIGH = 1
+PUD_OFF = 20
+PUD_DOWN = 21
+PUD_UP = 22
+RISING = 31
+FALLING = 32
+BOTH = 33
+VERSION = "simulated"
+RPI_REVISION = 2
+
+LEVELS = {}
+DEVICES = {}
+# The simulated MCP3008 (also read by the simulated spidev)
+ADC = None
+
+class MCP3008(object):
+    """A simulated MCP3008 ADC, read by bit-banging SPI."""
+
+    def __init__(self, mosi, miso, clk, cs, channels, vref=3.3):
+        """Initialise.
+
+        Args:
+            self: self.
+            mosi: The pin number for MOSI (data in to the chip).
+            miso: The pin number for MISO (data out from the chip).
+            clk: The pin number for the SPI clock.
+            cs: The pin number for chip select.
+            channels: List of eight Signals (volts), one per channel.
+            vref: The reference voltage (volts).
+
+        """
+        self.mosi, self.miso, self.clk, self.cs = mosi, miso, clk, cs
+        self.channels = channels
+        self.vref = vref
+        self.selected = False
+        self.clock = 0
+        self.command = 0
+        self.bits = []
+
+    def code(self, channel):
+        """Get the 10-bit conversion result for a channel.
+
+        Args:
+            self: self.
+            channel: The channel number (0 to 7).
+
+        Returns:
+            int The conversion result (0 to 1023).
+
+        """
+        volts = self.channels[channel].value()
+        return max(0, min(1023, int(round(volts / self.vref * 1023))))
+
+    def output(self, pin, value):
+        """React to a pin being set by the Pi.
+
+        Args:
+            self: self.
+            pin: The pin number.
+            value: The new level of the pin.
+
+        """
+        if pin == self.cs:
+            if not value and not self.selected:
+                # CS falling: start a new transfer
+                self.clock = 0
+                self.command = 0
+                self.bits = []
+            self.selected = not value
+        elif pin == self.clk and self.selected:
+            if value and not LEVELS.get(self.clk):
+                self.clock += 1
+                if self.clock <= 5:
+                    self.command = (self.command << 1) | (1 if LEVELS.get(self.mosi) else 0)
+                    if self.clock == 5:
+                        result = self.code(self.command & 0x07)
+                        self.bits = [0] + [(result >> bit) & 1 for bit in range(9, -1, -1)]
+
+    def input(self, pin):
+        """Get the level of a pin driven by the chip.
+
+        Args:
+            self: self.
+            pin: The pin number.
+
+        Returns:
+            int The level of the pin.
+
+        """
+        position = self.clock - 6
+        if self.selected and 0 <= position < len(self.bits):
+            return self.bits[position]
+        return LOW
+
+class RainGauge(threading.Thread):
+    """A simulated rain gauge, which tips at random."""
+
+    def __init__(self, pin, tipsperhour):
+        """Initialise.
+
+        Args:
+            self: self.
+            pin: The pin number to which the gauge is connected.
+            tipsperhour: The average number of tips per hour.
+
+        """
+        threading.Thread.__init__(self, name="Simulated rain gauge")
+        self.daemon = True
+        self.pin = pin
+        self.rate = tipsperhour / 3600.0
+        self.callbacks = []
+
+    def output(self, pin, value):
+        pass
+
+    def input(self, pin):
+        return HIGH
+
+    def run(self):
+        """Tip the bucket at random intervals (a Poisson process)."""
+        while True:
+            time.sleep(random.expovariate(self.rate))
+            for callback in list(self.callbacks):
+                callback(self.pin)
+
+def configure(config):
+    """Wire up simulated devices.
+
+    Args:
+        config: ConfigParser containing cfg/simulation.cfg.
+
+    """
+    global ADC
+    pins = dict((name, config.getint("MCP3008", name))
+                for name in ["mosipin", "misopin", "clkpin", "cspin"])
+    channels = [parse(config.get("MCP3008", "channel" + str(channel)))
+                for channel in range(8)]
+    adc = MCP3008(pins["mosipin"], pins["misopin"], pins["clkpin"],
+                pins["cspin"], channels, config.getfloat("MCP3008", "vref"))
+    for pin in pins.values():
+        DEVICES[pin] = adc
+    ADC = adc
+    gauge = RainGauge(config.getint("Raingauge", "pinnumber"),
+                config.getfloat("Raingauge", "tipsperhour"))
+    DEVICES[gauge.pin] = gauge
+
+def setmode(mode):
+    pass
+
+def getmode():
+    return BCM
+
+def setwarnings(flag):
+    pass
+
+def setup(channel, direction, pull_up_down=PUD_OFF, initial=None):
+    if initial is not None:
+        LEVELS[channel] = initial
+
+def output(channel, value):
+    value = HIGH if value else LOW
+    if channel in DEVICES:
+        DEVICES[channel].output(channel, value)
+    LEVELS[channel] = value
+
+def input(channel):
+    if channel in DEVICES:
+        return DEVICES[channel].input(channel)
+    return LEVELS.get(channel, LOW)
+
+def add_event_detect(channel, edge, callback=None, bouncetime=None):
+    device = DEVICES.get(channel)
+    if isinstance(device, RainGauge):
+        if callback is not None:
+            device.callbacks.append(callback)
+        if not device.isAlive():
+            device.start()
+
+def add_event_callback(channel, callback):
+    device = DEVICES.get(channel)
+    if isinstance(device, RainGauge):
+        device.callbacks.append(callback)
+
+def remove_event_detect(channel):
+    device = DEVICES.get(channel)
+    if isinstance(device, RainGauge):
+        device.callbacks = []
+
+def cleanup(channel=None):
+    LEVELS.clear()
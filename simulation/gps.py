@@ -0,0 +1,78 @@
+"""Simulated gps.
+
+A stand-in for the gps module (the Python client for gpsd), installed in
+its place when the AirPi hardware is being simulated. Gives a new fix
+every 'interval' seconds, as set in cfg/simulation.cfg.
+
+"""
+
+import time
+
+from signals import Signal, parse
+
+# Lets GpsController know that there is no gpsd socket to look for
+SIMULATED = True
+
+WATCH_ENABLE = 0x000001
+WATCH_DISABLE = 0x000000
+MODE_NO_FIX = 1
+MODE_2D = 2
+MODE_3D = 3
+
+SIGNALS = {"latitude": Signal(53.381), "longitude": Signal(-1.486),
+            "altitude": Signal(90), "speed": Signal(0)}
+INTERVAL = 1.0
+
+def configure(config):
+    """Set up the simulated GPS.
+
+    Args:
+        config: ConfigParser containing cfg/simulation.cfg.
+
+    """
+    global INTERVAL
+    for name in SIGNALS:
+        SIGNALS[name] = parse(config.get("GPS", name))
+    INTERVAL = config.getfloat("GPS", "interval")
+
+class gpsfix(object):
+    """A GPS fix, with the same fields as the real gps module's."""
+
+    def __init__(self):
+        self.mode = MODE_NO_FIX
+        self.time = float("nan")
+        self.ept = float("nan")
+        self.latitude = self.longitude = 0.0
+        self.epx = self.epy = self.epv = float("nan")
+        self.altitude = float("nan")
+        self.track = self.speed = self.climb = float("nan")
+        self.epd = self.eps = self.epc = float("nan")
+
+class gps(object):
+    """A simulated gpsd session."""
+
+    def __init__(self, host="127.0.0.1", port="2947", verbose=0, mode=0):
+        self.fix = gpsfix()
+        self.utc = ""
+        self.satellites = []
+
+    def next(self):
+        """Wait for, then record, the next fix."""
+        time.sleep(INTERVAL)
+        now = time.time()
+        self.fix.mode = MODE_3D
+        self.fix.time = now
+        self.fix.latitude = SIGNALS["latitude"].value()
+        self.fix.longitude = SIGNALS["longitude"].value()
+        self.fix.altitude = SIGNALS["altitude"].value()
+        self.fix.speed = max(0.0, SIGNALS["speed"].value())
+        self.fix.climb = 0.0
+        self.fix.track = 0.0
+        self.utc = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(now))
+        self.satellites = [None] * 8
+
+    def stream(self, flags=0, devpath=None):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,68 @@
+"""Generate synthetic signals for simulated AirPi hardware.
+
+Each simulated measurement (an ADC channel voltage, a temperature, etc.)
+is a Signal: a base value plus an optional slow sine wave and random
+noise. Signals are defined in cfg/simulation.cfg as a comma-separated
+list:
+    base, amplitude, period, noise
+where 'period' is in seconds and 'noise' is the standard deviation of
+the (Gaussian) noise. Trailing items can be left out, in which case
+they are zero.
+
+"""
+
+import math
+import random
+import time
+
+# All signals share the same start time, so that they stay in phase
+START = time.time()
+
+class Signal(object):
+    """A synthetic signal: base + amplitude * sin(2*pi*t/period) + noise."""
+
+    def __init__(self, base, amplitude=0.0, period=0.0, noise=0.0):
+        """Initialise.
+
+        Args:
+            self: self.
+            base: The mean value of the signal.
+            amplitude: The amplitude of the sine wave.
+            period: The period of the sine wave (seconds); zero for none.
+            noise: The standard deviation of the noise.
+
+        """
+        self.base = float(base)
+        self.amplitude = float(amplitude)
+        self.period = float(period)
+        self.noise = float(noise)
+
+    def value(self):
+        """Get the current value of the signal.
+
+        Args:
+            self: self.
+
+        Returns:
+            float The value.
+
+        """
+        value = self.base
+        if self.amplitude and self.period:
+            phase = 2 * math.pi * (time.time() - START) / self.period
+            value += self.amplitude * math.sin(phase)
+        if self.noise:
+            value += random.gauss(0, self.noise)
+        return value
+
+def parse(spec):
+    """Create a Signal from its definition in cfg/simulation.cfg.
+
+    Args:
+        spec: string The definition, e.g. "1.2, 0.3, 600, 0.02".
+
+    Returns:
+        Signal The signal.
+
+    """
+    return Signal(*[float(item) for item in spec.split(",") if item.strip()])
@@ -0,0 +1,228 @@
+"""Simulated smbus.
+
+A stand-in for the smbus module, installed in its place when the AirPi
+hardware is being simulated. Any bus has a simulated BMP085 at address
+0x77; anything else on the bus raises IOError, as a missing device
+would.
+
+The BMP085 holds the example calibration data from its datasheet. When
+asked for a raw temperature or pressure measurement it works backwards
+from the configured signal to find the raw value which the datasheet
+compensation algorithm (as used by sensors/bmpBackend.py) turns into
+that temperature or pressure, so the readings come out right without
+having to simulate the sensor's physics.
+
+"""
+
+import struct
+import time
+
+from signals import parse
+
+BMP085_ADDRESS = 0x77
+
+# Datasheet example calibration data, in register order from 0xAA
+CALIBRATION = (408, -72, -14383, 32741, 32757, 23153, 6190, 4, -32768,
+               -8711, 2868)
+
+class BMP085(object):
+    """A simulated BMP085 temperature / pressure sensor."""
+
+    def __init__(self, temperature, pressure, latency=0):
+        """Initialise.
+
+        Args:
+            self: self.
+            temperature: Signal for the temperature (Celsius).
+            pressure: Signal for the pressure (Pa).
+            latency: Extra time taken by each transfer (seconds).
+
+        """
+        self.temperature = temperature
+        self.pressure = pressure
+        self.latency = latency
+        (self.ac1, self.ac2, self.ac3, self.ac4, self.ac5, self.ac6,
+            self.b1, self.b2, self.mb, self.mc, self.md) = CALIBRATION
+        self.registers = bytearray(256)
+        packed = struct.pack(">hhhHHHhhhhh", *CALIBRATION)
+        self.registers[0xAA:0xAA + len(packed)] = packed
+        self.ut = self.find_ut(self.temperature.value())
+
+    def b5(self, ut):
+        """Calculate B5 (from the datasheet algorithm) for a raw temperature.
+
+        Args:
+            self: self.
+            ut: The raw temperature.
+
+        Returns:
+            int B5.
+
+        """
+        x1 = ((ut - self.ac6) * self.ac5) >> 15
+        x2 = (self.mc << 11) // (x1 + self.md)
+        return x1 + x2
+
+    def compensate(self, up, oss):
+        """Calculate the pressure (from the datasheet algorithm).
+
+        Args:
+            self: self.
+            up: The raw pressure.
+            oss: The oversampling setting (0 to 3).
+
+        Returns:
+            int The pressure (Pa).
+
+        """
+        b6 = self.b5(self.ut) - 4000
+        x1 = (self.b2 * ((b6 * b6) >> 12)) >> 11
+        x2 = (self.ac2 * b6) >> 11
+        b3 = (((self.ac1 * 4 + x1 + x2) << oss) + 2) // 4
+        x1 = (self.ac3 * b6) >> 13
+        x2 = (self.b1 * ((b6 * b6) >> 12)) >> 16
+        x3 = ((x1 + x2) + 2) >> 2
+        b4 = (self.ac4 * (x3 + 32768)) >> 15
+        b7 = (up - b3) * (50000 >> oss)
+        if b7 < 0x80000000:
+            p = (b7 * 2) // b4
+        else:
+            p = (b7 // b4) * 2
+        x1 = ((p >> 8) * (p >> 8) * 3038) >> 16
+        x2 = (-7357 * p) >> 16
+        return p + ((x1 + x2 + 3791) >> 4)
+
+    @staticmethod
+    def search(function, target, low, high):
+        """Find the smallest input for which a rising function reaches a target.
+
+        Args:
+            function: The function, which must never decrease.
+            target: The target value.
+            low: The smallest possible input.
+            high: The largest possible input.
+
+        Returns:
+            int The input.
+
+        """
+        while low < high:
+            middle = (low + high) // 2
+            if function(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find_ut(self, celsius):
+        """Find the raw temperature for a temperature.
+
+        Args:
+            self: self.
+            celsius: The temperature.
+
+        Returns:
+            int The raw temperature.
+
+        """
+        target = int(round(celsius * 10))
+        # Below this, the algorithm divides by zero (or a negative number)
+        low = self.search(lambda ut: ((ut - self.ac6) * self.ac5 >> 15) +
+                    self.md, 1, 0, 0xFFFF)
+        return self.search(lambda ut: (self.b5(ut) + 8) >> 4, target,
+                    low, 0xFFFF)
+
+    def find_up(self, pascals, oss):
+        """Find the raw pressure for a pressure.
+
+        Args:
+            self: self.
+            pascals: The pressure.
+            oss: The oversampling setting (0 to 3).
+
+        Returns:
+            int The raw pressure.
+
+        """
+        return self.search(lambda up: self.compensate(up, oss),
+                    int(round(pascals)), 0, (1 << (16 + oss)) - 1)
+
+    def write(self, register, value):
+        """Write to a register.
+
+        Writing a measurement command to the control register puts the
+        result of the measurement in the data registers.
+
+        Args:
+            self: self.
+            register: The register address.
+            value: The byte to write.
+
+        """
+        self.registers[register] = value & 0xFF
+        if register != 0xF4:
+            return
+        if value == 0x2E:
+            self.ut = self.find_ut(self.temperature.value())
+            self.registers[0xF6:0xF8] = struct.pack(">H", self.ut)
+        elif value & 0x3F == 0x34:
+            oss = value >> 6
+            raw = self.find_up(self.pressure.value(), oss) << (8 - oss)
+            self.registers[0xF6:0xF9] = struct.pack(">I", raw)[1:]
+
+    def read(self, register):
+        """Read from a register.
+
+        Args:
+            self: self.
+            register: The register address.
+
+        Returns:
+            int The byte read.
+
+        """
+        return self.registers[register]
+
+DEVICES = {}
+
+def configure(config):
+    """Set up the simulated devices.
+
+    Args:
+        config: ConfigParser containing cfg/simulation.cfg.
+
+    """
+    DEVICES[BMP085_ADDRESS] = BMP085(
+                    parse(config.get("BMP085", "temperature")),
+                    parse(config.get("BMP085", "pressure")),
+                    config.getfloat("BMP085", "latency"))
+
+class SMBus(object):
+    """A simulated I2C bus."""
+
+    def __init__(self, bus=None):
+        self.bus = bus
+
+    def device(self, address):
+        try:
+            device = DEVICES[address]
+        except KeyError:
+            raise IOError(121, "Remote I/O error")
+        if device.latency:
+            time.sleep(device.latency)
+        return device
+
+    def read_byte_data(self, address, register):
+        return self.device(address).read(register)
+
+    def write_byte_data(self, address, register, value):
+        self.device(address).write(register, value)
+
+    def read_i2c_block_data(self, address, register, length=32):
+        device = self.device(address)
+        return [device.read(register + offset) for offset in range(length)]
+
+    def write_i2c_block_data(self, address, register, values):
+        device = self.device(address)
+        for offset, value in enumerate(values):
+            device.write(register + offset, value)
@@ -0,0 +1,67 @@
+"""Simulated spidev.
+
+A stand-in for the spidev module, installed in its place when the AirPi
+hardware is being simulated. The simulated MCP3008 (see gpio.py) can
+also be read through hardware SPI, on the bus and device set in
+cfg/simulation.cfg; opening any other device raises IOError, as a
+missing /dev/spidev* file would. Each transfer is decoded as the real
+chip would: the start bit, then the single-ended bit and channel number,
+with the ten bits of the result clocked out in the last two bytes.
+
+"""
+
+import errno
+
+import gpio
+
+DEVICE = (0, 0)
+
+class SpiDev(object):
+    """A simulated SPI device."""
+
+    def __init__(self):
+        self.mode = 0
+        self.max_speed_hz = 500000
+        self.bits_per_word = 8
+        self.device = None
+
+    def open(self, bus, device):
+        if (bus, device) != DEVICE:
+            raise IOError(errno.ENOENT, "No such file or directory")
+        self.device = (bus, device)
+
+    def close(self):
+        self.device = None
+
+    def xfer2(self, data):
+        """Exchange bytes with the simulated MCP3008.
+
+        Args:
+            self: self.
+            data: List of the bytes to send.
+
+        Returns:
+            list The bytes received (as many as were sent).
+
+        """
+        if self.device is None:
+            raise IOError(errno.EBADF, "Bad file descriptor")
+        reply = [0] * len(data)
+        if len(data) >= 3 and data[0] & 0x01 and data[1] & 0x80:
+            code = gpio.ADC.code((data[1] >> 4) & 0x07)
+            reply[1] = (code >> 8) & 0x03
+            reply[2] = code & 0xFF
+        return reply
+
+    xfer = xfer2
+
+def configure(config):
+    """Set which SPI device the simulated MCP3008 is on.
+
+    Args:
+        config: ConfigParser containing cfg/simulation.cfg.
+
+    """
+    global DEVICE
+    DEVICE = (config.getint("MCP3008", "spibus"),
+              config.getint("MCP3008", "spidevice"))
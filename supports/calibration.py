@@ -7,7 +7,11 @@ settings config file (usually AirPi/settings.cfg).
 """
 
 import math
+import threading
 import support
+import metrics
+import scheduler
+import codetable
 
 class Calibration(support.Support):
     """A class to calibrate sensor data.
@@ -48,18 +52,68 @@ class Calibration(support.Support):
 
         """
         super(Calibration, self).__init__(config)
-        self.calibrations = []
+        # Output plugins may be running in their own threads
+        self.lock = threading.Lock()
+        # Changed whenever the calibration functions are reloaded
+        self.version = 0
+        self.calibrations = self.parse_calibrations()
         self.calibrated = []
         self.lastuncalibrated = []
+        if Calibration.sharedClass == None:
+            Calibration.sharedClass = self
+
+    def parse_calibrations(self):
+        """Get the calibration functions from the plugin's parameters.
+
+        Args:
+            self: self.
+
+        Returns:
+            list A dict for each function, with its 'name', 'function'
+                 and 'symbol', and whether its results can be looked up
+                 from analogue sensors' code tables ('tabulate'; not if
+                 it depends on other readings).
+
+        """
+        calibrations = []
         temp = dict((k.lower(), v) for k,v in self.params.iteritems())
         for name, detail in temp.iteritems():
             if name.startswith('func_') and detail is not False:
                 [func, symb] = detail.rsplit(',', 1)
-                self.calibrations.append({'name': name[5:],
-                                        'function': eval("lambda x: " + func),
-                                        'symbol': symb})
-        if Calibration.sharedClass == None:
-            Calibration.sharedClass = self
+                calibrations.append({'name': name[5:],
+                                    'function': eval("lambda x: " + func),
+                                    'symbol': symb,
+                                    'tabulate': "findval" not in func})
+        return calibrations
+
+    def reload(self, config):
+        """Reload the calibration functions while sampling.
+
+        The new functions are all parsed before any of them are used, so
+        if any of them are invalid, the old ones are kept.
+
+        Args:
+            self: self.
+            config: ConfigParser object containing supports.cfg.
+
+        Returns:
+            int The number of calibration functions now in use.
+
+        """
+        params = self.params
+        self.params = {}
+        try:
+            self.setallparams(config)
+            calibrations = self.parse_calibrations()
+        except Exception:
+            self.params = params
+            raise
+        with self.lock:
+            self.calibrations = calibrations
+            self.calibrated = []
+            self.lastuncalibrated = []
+            self.version += 1
+        return len(calibrations)
 
     def calibrate(self, datapoints):
         """Calibrate a set of data points.
@@ -73,6 +127,24 @@ class Calibration(support.Support):
                         a dict containing another dict for each
                         property.
 
+        """
+        with self.lock:
+            start = scheduler.monotonic()
+            calibrated = self.calibrate_unlocked(datapoints)
+            metrics.REGISTRY.observe("calibration",
+                scheduler.monotonic() - start)
+            return calibrated
+
+    def calibrate_unlocked(self, datapoints):
+        """Calibrate a set of data points (without locking).
+
+        Does the actual work for calibrate(), which makes sure that only
+        one thread at a time gets here.
+
+        Args:
+            self: self.
+            datapoints: The datapoints to be calibrated.
+
         """
         if datapoints == self.lastuncalibrated:
             # The same datapoints object, so the calculations would turn
@@ -87,13 +159,47 @@ class Calibration(support.Support):
             for j in self.calibrations:
                 if self.calibrated[i]["name"].lower() == j["name"]:
                     if self.calibrated[i]["value"] != None:
-                        self.calibrated[i]["value"] = \
-                            j["function"](self.calibrated[i]["value"])
+                        value = self.calibrated[i]["value"]
+                        table = codetable.TABLES.get(
+                                    self.calibrated[i].get("sensor"))
+                        if table is not None and j["tabulate"]:
+                            # Analogue reading: look it up
+                            value = table.calibrate(value, j["function"],
+                                        self.version)
+                        else:
+                            value = j["function"](value)
+                        self.calibrated[i]["value"] = value
                         self.calibrated[i]["symbol"] = j["symbol"]
         # Update which object we last worked on:
         self.lastuncalibrated = datapoints
         return self.calibrated
 
+    def calibrate_value(self, name, value):
+        """Calibrate a single value.
+
+        Used for values which aren't in a set of data points, such as
+        readings from history.STORE. Functions which use findval() are
+        given the values from the latest set of data points calibrated,
+        not those from the same sample as 'value'.
+
+        Args:
+            self: self.
+            name: string The name of the property which was measured.
+            value: The (uncalibrated) value.
+
+        Returns:
+            The calibrated value (or 'value' itself, if there is no
+            calibration function for the property).
+
+        """
+        if value is None:
+            return None
+        with self.lock:
+            for calibration in self.calibrations:
+                if name.lower() == calibration["name"]:
+                    return calibration["function"](value)
+        return value
+
     def findval(self, key):
         """Find (calibrated) data value for a given key.
 
@@ -53,15 +53,45 @@ class Limits(support.Support):
         """
         super(Limits, self).__init__(config)
         #TODO: What about the fact that the limits are already in self.params? Do we want to use them? Do we even care?
-        self.limits = {}
+        self.limits = self.parse_limits(config)
+
+    @staticmethod
+    def parse_limits(config):
+        """Get the limits from supports.cfg.
+
+        Args:
+            config: ConfigParser object containing supports.cfg.
+
+        Returns:
+            dict The 'value' and 'units' of each limit, keyed by the
+                 (lower case) name of the phenomenon. Empty if the
+                 Limits plugin isn't enabled.
+
+        """
+        limits = {}
         if config.has_section("Limits") and config.has_option("Limits", "enabled") and config.getboolean("Limits", "enabled"):
             for phenomena, limit in config.items("Limits"):
                 if phenomena.startswith("limit_"):
                     [value, units] = limit.split(',', 1)
                     name = phenomena[6:].lower()
-                    self.limits[name] = {}
-                    self.limits[name]["value"] = value
-                    self.limits[name]["units"] = units
+                    limits[name] = {}
+                    limits[name]["value"] = value
+                    limits[name]["units"] = units
+        return limits
+
+    def reload(self, config):
+        """Reload the limits while sampling.
+
+        Args:
+            self: self.
+            config: ConfigParser object containing supports.cfg.
+
+        Returns:
+            int The number of limits now in use.
+
+        """
+        self.limits = self.parse_limits(config)
+        return len(self.limits)
 
     def isbreach(self, samplename, samplevalue, sampleunit):
         """Check whether a data point breaches a limit.
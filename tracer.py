@@ -0,0 +1,160 @@
+"""Trace where the time goes in the slowest AirPi ticks.
+
+metrics.py shows how long each part of a tick takes on average, but not
+what happened during one particular slow tick. When tracing is switched
+on (using 'trace' in settings.cfg, or the '--trace' command line
+option), every timing recorded in metrics.REGISTRY during a tick (sensor
+reads, calibration, averaging, each output, notifications, LEDs and the
+tick as a whole) is also kept as a span: a name, a start time and a
+duration, along with the thread it happened in.
+Only the slowest N ticks are kept, so memory use doesn't grow however
+long the run lasts. They are written to the log directory as JSON in
+the Chrome trace event format, which can be loaded into a trace viewer
+such as chrome://tracing or https://ui.perfetto.dev, when sampling stops
+and whenever the 'trace' control command is sent.
+Timings recorded between ticks (e.g. by output workers which are still
+busy with an earlier sample) are ignored.
+
+"""
+
+import heapq
+import json
+import os
+import threading
+import time
+import scheduler
+
+class Tracer(object):
+    """Record spans during each tick and keep the slowest ticks."""
+
+    def __init__(self, directory, keep):
+        """Initialise.
+
+        Args:
+            self: self.
+            directory: The directory to which traces should be written.
+            keep: How many of the slowest ticks to keep.
+
+        """
+        self.directory = directory
+        self.keep = max(1, int(keep))
+        self.filename = os.path.join(directory,
+                            "trace-" + time.strftime("%Y%m%d-%H%M%S") + ".json")
+        self.lock = threading.Lock()
+        self.tick = None
+        self.started = None
+        self.spans = None
+        # Min-heap of (duration, tick number, started, spans), so the
+        # fastest tick kept is the first to go
+        self.slowest = []
+        self.threads = {}
+
+    def begin_tick(self, number, started):
+        """Start recording spans for a tick.
+
+        Args:
+            self: self.
+            number: The number of the tick.
+            started: scheduler.monotonic() time at which the tick was due
+                     to start.
+
+        """
+        with self.lock:
+            self.tick = number
+            self.started = started
+            self.spans = []
+
+    def span(self, name, seconds):
+        """Record a span which has just finished.
+
+        Called by metrics.REGISTRY for every timing it records.
+
+        Args:
+            self: self.
+            name: The name of the span (e.g. "sensor BMP085-temp").
+            seconds: How long it took.
+
+        """
+        end = scheduler.monotonic()
+        thread = threading.current_thread()
+        with self.lock:
+            if self.spans is None:
+                return
+            self.threads[thread.ident] = thread.name
+            self.spans.append((name, end - seconds, seconds, thread.ident))
+
+    def end_tick(self):
+        """Stop recording spans for the current tick, and keep it if it is
+        one of the slowest so far.
+
+        Args:
+            self: self.
+
+        """
+        with self.lock:
+            if self.spans is None:
+                return
+            duration = scheduler.monotonic() - self.started
+            entry = (duration, self.tick, self.started, self.spans)
+            if len(self.slowest) < self.keep:
+                heapq.heappush(self.slowest, entry)
+            elif duration > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+            self.spans = None
+
+    def events(self):
+        """Get the kept ticks as trace events.
+
+        Args:
+            self: self.
+
+        Returns:
+            list Trace events (dicts), with times in microseconds.
+
+        """
+        pid = os.getpid()
+        with self.lock:
+            ticks = sorted(self.slowest, key=lambda entry: entry[1])
+            threads = dict(self.threads)
+        events = []
+        for ident, name in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid,
+                           "tid": ident, "args": {"name": name}})
+        for duration, number, started, spans in ticks:
+            args = {"tick": number, "duration_ms": round(duration * 1000, 3)}
+            for name, start, seconds, ident in spans:
+                events.append({"name": name, "cat": name.split()[0],
+                               "ph": "X", "pid": pid, "tid": ident,
+                               "ts": int(start * 1e6),
+                               "dur": int(seconds * 1e6), "args": args})
+        return events
+
+    def dump(self):
+        """Write the kept ticks to the trace file.
+
+        The file is replaced each time, so it always holds the slowest
+        ticks so far.
+
+        Args:
+            self: self.
+
+        Returns:
+            string The path of the file written.
+
+        """
+        with open(self.filename, "w") as trace:
+            json.dump({"traceEvents": self.events(),
+                       "displayTimeUnit": "ms"}, trace)
+        return self.filename
+
+    def count(self):
+        """Get the number of ticks kept.
+
+        Args:
+            self: self.
+
+        Returns:
+            int The number of ticks.
+
+        """
+        return len(self.slowest)